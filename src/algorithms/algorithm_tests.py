@@ -1,5 +1,9 @@
-from typing import Dict
+from typing import Dict, List, Tuple
+from tempfile import TemporaryDirectory
 from time import time
+import glob
+import os
+import random
 from main import Program
 from .algorithm import PathPart
 from .graph_searcher import GraphSearcher
@@ -8,6 +12,20 @@ from .dijkstras_algorithm import DijkstrasAlgorithm
 from .bellman_fords_algorithm_dp import BellmanFordsAlgorithmDP
 from core.graph import Graph
 from core.node import Node
+from tubemap.core.tubemap_graph import TubemapGraph
+from tubemap.core.tubemap_compressed_graph import CompressedTubemapGraph
+from tubemap.algorithms.tubemap_dijkstras_algorithm import TubemapDijkstrasAlgorithm
+from tubemap.algorithms.tubemap_bellman_fords_algorithm_dp import TubemapBellmanFordsAlgorithmDP
+from tubemap.algorithms.tubemap_interchange_dijkstras_algorithm import TubemapInterchangeDijkstrasAlgorithm
+from tubemap.algorithms.tubemap_dynamic_shortest_paths import TubemapDynamicShortestPaths
+from tubemap.algorithms.tubemap_k_shortest_paths import TubemapKShortestPaths
+from tubemap.algorithms.tubemap_isochrone_searcher import TubemapIsochroneSearcher
+from tubemap.algorithms.tubemap_graph_searcher import TubemapGraphSearcher
+from tubemap.algorithms.tubemap_connectivity import TubemapComponentIndex, TubemapBridgeIndex
+from tubemap.algorithms.tubemap_closure_impact import TubemapClosureImpactAnalyser
+from tubemap.algorithms.tubemap_all_pairs_store import TubemapAllPairsStore
+from tubemap.algorithms.tubemap_algorithm_step import TubemapAlgorithmStep
+from tubemap.core.tubemap_scenario import TubemapScenario
 
 class _TestHelpers:
     @staticmethod
@@ -29,6 +47,49 @@ class _TestHelpers:
         Program.print(("Test passed: ", 'cyan'), (str(test_passed), 'green' if test_passed else 'red'), end=", ")
         Program.print((f"Duration: {duration * 1000}ms", 'black'))
 
+    @staticmethod
+    def evaluate_result(expected_result: object, actual_result: object) -> None:
+        test_passed = expected_result == actual_result
+        Program.print((f"Expected result: {str(expected_result)}", 'yellow'), end=", ")
+        Program.print((f"Actual result: {str(actual_result)}", 'magenta'), end=", ")
+        Program.print(("Test passed: ", 'cyan'), (str(test_passed), 'green' if test_passed else 'red'))
+
+    @staticmethod
+    def build_random_tubemap_graph(seed: int, node_count: int = 60, line_length: int = 18, closed_fraction: float = 0.1) -> TubemapGraph:
+        """
+        A random graph laid out like the tube map, each line runs through a random sequence of stations, so there are chains of pass-through stations,
+        interchanges and (where a line is doubled up) parallel edges, and some edges are closed. The same seed always gives the same graph.
+        """
+        generator = random.Random(seed)
+        graph = TubemapGraph()
+        for i in range(node_count):
+            graph.add_node(i + 1).label = f"Station {i + 1}"
+        node_ids = list(graph.nodes.keys())
+        for line in ["Red", "Green", "Blue", "Yellow", "Purple"]:
+            stations = generator.sample(node_ids, line_length)
+            for node1_id, node2_id in zip(stations, stations[1:]):
+                for _ in range(2 if generator.random() < 0.1 else 1):
+                    edge = graph.add_edge(graph.nodes[node1_id], graph.nodes[node2_id], generator.randint(1, 9), len(graph.edge_list) + 1)
+                    edge.label = line
+                    edge.closed = generator.random() < closed_fraction
+        return graph
+
+    @staticmethod
+    def get_path_weight(path: List[PathPart]) -> int:
+        return sum(part.edge.weight for part in path[:-1])
+
+    @staticmethod
+    def get_baseline_weights(graph: TubemapGraph, pairs: List[Tuple[int, int]]) -> Dict[Tuple[int, int], int | None]:
+        """The journey time of each pair with the baseline Dijkstra, or None if there is no route."""
+        weights: Dict[Tuple[int, int], int | None] = {}
+        for start_id, end_id in pairs:
+            start_node, end_node = graph.nodes[start_id], graph.nodes[end_id]
+            if not TubemapGraphSearcher.is_path_available(graph, start_node, end_node):
+                weights[(start_id, end_id)] = None
+                continue
+            weights[(start_id, end_id)] = _TestHelpers.get_path_weight(TubemapDijkstrasAlgorithm.find_shortest_path(graph, start_node, end_node))
+        return weights
+
     @staticmethod
     def algorithm_test1(algorithm: AAlgorithm) -> None:
         print(_TestHelpers.algorithm_test1.__name__)
@@ -225,9 +286,353 @@ class _BellmanFordsAlgorithmTests:
         _TestHelpers.algorithm_test1(BellmanFordsAlgorithmDP)
         _TestHelpers.algorithm_test2(BellmanFordsAlgorithmDP)
 
+class _TubemapEngineTests:
+    """The faster route engines must find routes exactly as quick as the baseline Dijkstra, on random graphs with closures and parallel lines."""
+    SEEDS = [1, 2, 3]
+
+    @staticmethod
+    def run() -> None:
+        print(_TubemapEngineTests.__name__)
+        for seed in _TubemapEngineTests.SEEDS:
+            _TubemapEngineTests._test_static_engines(seed)
+            _TubemapEngineTests._test_dynamic_engines(seed)
+            _TubemapEngineTests._test_k_shortest_paths(seed)
+            _TubemapEngineTests._test_isochrone(seed)
+            _TubemapEngineTests._test_iterate_steps(seed)
+
+    @staticmethod
+    def __get_pairs(graph: TubemapGraph, seed: int, count: int = 150) -> List[Tuple[int, int]]:
+        generator = random.Random(seed)
+        node_ids = list(graph.nodes.keys())
+        pairs = [(generator.choice(node_ids), generator.choice(node_ids)) for _ in range(count)]
+        return [(start_id, end_id) for start_id, end_id in pairs if start_id != end_id]
+
+    @staticmethod
+    def _test_static_engines(seed: int) -> None:
+        print(f"{_TubemapEngineTests._test_static_engines.__name__} (seed {seed})")
+        graph = _TestHelpers.build_random_tubemap_graph(seed)
+        pairs = _TubemapEngineTests.__get_pairs(graph, seed)
+        baseline_weights = _TestHelpers.get_baseline_weights(graph, pairs)
+        routed_pairs = [pair for pair in pairs if baseline_weights[pair] is not None]
+
+        #Without a penalty, changing lines is free, so the interchange search must give the same times as Dijkstra.
+        engines = {
+            "Bellman Ford DP": TubemapBellmanFordsAlgorithmDP.find_shortest_path,
+            "Dijkstra Interchange (no penalty)": lambda graph, start_node, end_node: TubemapInterchangeDijkstrasAlgorithm.find_shortest_path(graph, start_node, end_node, 0)
+        }
+        for name, find_shortest_path in engines.items():
+            mismatches = sum(_TestHelpers.get_path_weight(find_shortest_path(graph, graph.nodes[start_id], graph.nodes[end_id])) != baseline_weights[(start_id, end_id)] for start_id, end_id in routed_pairs)
+            print(name)
+            _TestHelpers.evaluate_result(f"0/{len(routed_pairs)} mismatches", f"{mismatches}/{len(routed_pairs)} mismatches")
+
+    @staticmethod
+    def _test_dynamic_engines(seed: int) -> None:
+        """The engines that keep state between queries, checked again after every batch of changes has been passed to them."""
+        print(f"{_TubemapEngineTests._test_dynamic_engines.__name__} (seed {seed})")
+        graph = _TestHelpers.build_random_tubemap_graph(seed)
+        pairs = _TubemapEngineTests.__get_pairs(graph, seed, 60)
+        shortest_paths = TubemapDynamicShortestPaths(graph)
+        compressed_graph = CompressedTubemapGraph.compress(graph)
+        generator = random.Random(seed)
+
+        dynamic_mismatches = compressed_mismatches = checks = 0
+        for _ in range(5):
+            baseline_weights = _TestHelpers.get_baseline_weights(graph, pairs)
+            for start_id, end_id in pairs:
+                start_node, end_node = graph.nodes[start_id], graph.nodes[end_id]
+                dynamic_mismatches += shortest_paths.distance(start_node, end_node) != baseline_weights[(start_id, end_id)]
+                if baseline_weights[(start_id, end_id)] is not None:
+                    compressed_mismatches += _TestHelpers.get_path_weight(compressed_graph.find_shortest_path(TubemapDijkstrasAlgorithm, start_node, end_node)) != baseline_weights[(start_id, end_id)]
+                checks += 1
+
+            #Close, open and reweight some edges, which the cached trees and the compressed chains have to be repaired for.
+            for _, _, edge in generator.sample(list(graph.edge_list.values()), 8):
+                if generator.random() < 0.5:
+                    edge.closed = not edge.closed
+                else:
+                    edge.weight = generator.randint(1, 9)
+                shortest_paths.update_edge(edge)
+                compressed_graph.update_edge(edge)
+
+        print("Dynamic Dijkstra")
+        _TestHelpers.evaluate_result(f"0/{checks} mismatches", f"{dynamic_mismatches}/{checks} mismatches")
+        print("Compressed graph")
+        _TestHelpers.evaluate_result(f"0/{checks} mismatches", f"{compressed_mismatches}/{checks} mismatches")
+
+    @staticmethod
+    def _test_k_shortest_paths(seed: int) -> None:
+        """The first route must be the quickest, and each route after it can't be any quicker than the one before."""
+        print(f"{_TubemapEngineTests._test_k_shortest_paths.__name__} (seed {seed})")
+        graph = _TestHelpers.build_random_tubemap_graph(seed)
+        pairs = _TubemapEngineTests.__get_pairs(graph, seed, 30)
+        baseline_weights = _TestHelpers.get_baseline_weights(graph, pairs)
+
+        failures = 0
+        for start_id, end_id in pairs:
+            durations = [duration for duration, _ in zip((duration for duration, _ in TubemapKShortestPaths.iterate_shortest_paths(graph, graph.nodes[start_id], graph.nodes[end_id])), range(4))]
+            if baseline_weights[(start_id, end_id)] is None:
+                failures += len(durations) != 0
+            else:
+                failures += len(durations) == 0 or durations[0] != baseline_weights[(start_id, end_id)] or durations != sorted(durations)
+        _TestHelpers.evaluate_result(f"0/{len(pairs)} failures", f"{failures}/{len(pairs)} failures")
+
+    @staticmethod
+    def _test_isochrone(seed: int) -> None:
+        """Every station within the time limit must be reached at its Dijkstra journey time, and no other station may be."""
+        print(f"{_TubemapEngineTests._test_isochrone.__name__} (seed {seed})")
+        graph = _TestHelpers.build_random_tubemap_graph(seed)
+        MAX_MINUTES = 15
+        node_ids = list(graph.nodes.keys())
+
+        failures = 0
+        for start_id in random.Random(seed).sample(node_ids, 10):
+            baseline_weights = _TestHelpers.get_baseline_weights(graph, [(start_id, end_id) for end_id in node_ids if end_id != start_id])
+            expected = {end_id: weight for (_, end_id), weight in baseline_weights.items() if weight is not None and weight <= MAX_MINUTES}
+            expected[start_id] = 0
+            actual = {node.id: arrival_time for node, arrival_time in TubemapIsochroneSearcher.iterate_reachable(graph, graph.nodes[start_id], MAX_MINUTES)}
+            failures += expected != actual
+        _TestHelpers.evaluate_result("0/10 failures", f"{failures}/10 failures")
+
+    @staticmethod
+    def _test_iterate_steps(seed: int) -> None:
+        """The steps shown by the visualiser must describe a valid search that ends with the same journey time as the baseline Dijkstra."""
+        print(f"{_TubemapEngineTests._test_iterate_steps.__name__} (seed {seed})")
+        graph = _TestHelpers.build_random_tubemap_graph(seed)
+        #Bellman-Ford yields a step for every edge on every pass, so fewer pairs are checked than for the other engines.
+        pairs = _TubemapEngineTests.__get_pairs(graph, seed, 40)
+        baseline_weights = _TestHelpers.get_baseline_weights(graph, pairs)
+        routed_pairs = [pair for pair in pairs if baseline_weights[pair] is not None]
+
+        engines = {
+            "Dijkstra": TubemapDijkstrasAlgorithm.iterate_steps,
+            "Bellman Ford DP": TubemapBellmanFordsAlgorithmDP.iterate_steps
+        }
+        for name, iterate_steps in engines.items():
+            path_mismatches = 0
+            unrelaxed_updates = 0
+            reboxed_nodes = 0
+            for start_id, end_id in routed_pairs:
+                steps = list(iterate_steps(graph, graph.nodes[start_id], graph.nodes[end_id]))
+                path_step = steps[-1]
+                path_mismatches += path_step.type != TubemapAlgorithmStep.PATH or path_step.path_weight != baseline_weights[(start_id, end_id)] or (path_step.path[0][0], path_step.path[-1][0]) != (start_id, end_id)
+                for previous_step, step in zip(steps, steps[1:]):
+                    if step.type == TubemapAlgorithmStep.UPDATE:
+                        unrelaxed_updates += previous_step.type != TubemapAlgorithmStep.RELAX or (previous_step.node_id, previous_step.neighbour_id, previous_step.edge_id, previous_step.path_weight) != (step.node_id, step.neighbour_id, step.edge_id, step.path_weight)
+                boxed_node_ids = [step.node_id for step in steps if step.type == TubemapAlgorithmStep.BOX]
+                reboxed_nodes += len(boxed_node_ids) - len(set(boxed_node_ids))
+            print(name)
+            _TestHelpers.evaluate_result(f"0/{len(routed_pairs)} mismatches", f"{path_mismatches}/{len(routed_pairs)} mismatches")
+            _TestHelpers.evaluate_result("0 updates without a relax", f"{unrelaxed_updates} updates without a relax")
+            _TestHelpers.evaluate_result("0 nodes boxed twice", f"{reboxed_nodes} nodes boxed twice")
+
+class _TubemapConnectivityTests:
+    """The connectivity indexes must agree with a search over the open edges, which is slow but obviously correct."""
+    SEEDS = [1, 2, 3, 4]
+
+    @staticmethod
+    def run() -> None:
+        print(_TubemapConnectivityTests.__name__)
+        for seed in _TubemapConnectivityTests.SEEDS:
+            _TubemapConnectivityTests._test_component_index(seed)
+            _TubemapConnectivityTests._test_bridge_index(seed)
+
+    @staticmethod
+    def __count_components(graph: TubemapGraph) -> int:
+        visited_ids = set()
+        component_count = 0
+        for node_id in graph.nodes.keys():
+            if node_id in visited_ids:
+                continue
+            component_count += 1
+            visited_ids.add(node_id)
+            queue = [node_id]
+            while len(queue) > 0:
+                for neighbouring_node_id, edges in graph.nodes[queue.pop()].adjacency_dict.items():
+                    if neighbouring_node_id not in visited_ids and any(not edge.closed for edge in edges.values()):
+                        visited_ids.add(neighbouring_node_id)
+                        queue.append(neighbouring_node_id)
+        return component_count
+
+    @staticmethod
+    def _test_component_index(seed: int) -> None:
+        print(f"{_TubemapConnectivityTests._test_component_index.__name__} (seed {seed})")
+        graph = _TestHelpers.build_random_tubemap_graph(seed, closed_fraction=0.3)
+        component_index = TubemapComponentIndex.build(graph)
+        _TestHelpers.evaluate_result(_TubemapConnectivityTests.__count_components(graph), component_index.component_count)
+
+        node_ids = list(graph.nodes.keys())
+        mismatches = sum(component_index.is_path_available(graph.nodes[start_id], graph.nodes[end_id]) != TubemapGraphSearcher.is_path_available(graph, graph.nodes[start_id], graph.nodes[end_id]) for start_id in node_ids[::6] for end_id in node_ids)
+        _TestHelpers.evaluate_result("0 mismatches", f"{mismatches} mismatches")
+
+    @staticmethod
+    def _test_bridge_index(seed: int) -> None:
+        """An open edge is a bridge exactly when closing it splits a component in two."""
+        print(f"{_TubemapConnectivityTests._test_bridge_index.__name__} (seed {seed})")
+        graph = _TestHelpers.build_random_tubemap_graph(seed)
+        bridge_index = TubemapBridgeIndex.build(graph)
+
+        component_count = _TubemapConnectivityTests.__count_components(graph)
+        expected_bridge_ids = set()
+        for _, _, edge in graph.edge_list.values():
+            if edge.closed:
+                continue
+            edge.closed = True
+            if _TubemapConnectivityTests.__count_components(graph) > component_count:
+                expected_bridge_ids.add(edge.id)
+            edge.closed = False
+        actual_bridge_ids = set(edge.id for _, _, edge in graph.edge_list.values() if bridge_index.is_bridge(edge))
+        _TestHelpers.evaluate_result(sorted(expected_bridge_ids), sorted(actual_bridge_ids))
+
+class _TubemapClosureImpactTests:
+    """The impact found from the cached trees must match building every tree again on a copy of the graph with the edge closed."""
+    SEEDS = [1, 2, 3]
+
+    @staticmethod
+    def run() -> None:
+        print(_TubemapClosureImpactTests.__name__)
+        for seed in _TubemapClosureImpactTests.SEEDS:
+            _TubemapClosureImpactTests._test_analyse_edge_on_scenario(seed)
+
+    @staticmethod
+    def _test_analyse_edge_on_scenario(seed: int) -> None:
+        print(f"{_TubemapClosureImpactTests._test_analyse_edge_on_scenario.__name__} (seed {seed})")
+        graph = _TestHelpers.build_random_tubemap_graph(seed)
+        shortest_paths = TubemapDynamicShortestPaths(graph)
+        all_pairs = {node_id: dict(weights) for node_id, weights in shortest_paths.all_pairs().items()}
+        fingerprint = graph.fingerprint
+
+        mismatches = 0
+        for _, _, edge in list(graph.edge_list.values())[::7]:
+            if edge.closed:
+                continue
+            impact = TubemapClosureImpactAnalyser.analyse_edge_on_scenario(TubemapScenario(graph), edge, shortest_paths)
+            closed_graph = TubemapScenario(graph).to_graph()
+            closed_graph.edge_list[edge.id][2].closed = True
+            closed_all_pairs = TubemapDynamicShortestPaths(closed_graph).all_pairs()
+            expected = [0, 0, 0, 0]
+            for start_id, weights in all_pairs.items():
+                for end_id, weight in weights.items():
+                    if end_id <= start_id:
+                        continue
+                    new_weight = closed_all_pairs[start_id].get(end_id)
+                    if new_weight is None:
+                        expected[3] += 1
+                    elif new_weight > weight:
+                        expected[0] += 1
+                        expected[1] += new_weight - weight
+                        expected[2] = max(expected[2], new_weight - weight)
+            mismatches += expected != [impact.slower_pairs, impact.total_delay, impact.max_delay, impact.disconnected_pairs]
+        _TestHelpers.evaluate_result("0 mismatches", f"{mismatches} mismatches")
+        #The cached trees and the graph are only read.
+        _TestHelpers.evaluate_result("Unchanged", "Unchanged" if (fingerprint, all_pairs) == (graph.fingerprint, shortest_paths.all_pairs()) else "Changed")
+
+class _TubemapAllPairsStoreTests:
+    """The stored journey times must match the cached shortest path trees, however many rows have been searched and however often the store is reopened."""
+    SEED = 4
+
+    @staticmethod
+    def run() -> None:
+        print(_TubemapAllPairsStoreTests.__name__)
+        _TubemapAllPairsStoreTests._test_triangle()
+        _TubemapAllPairsStoreTests._test_lazy_rows()
+        _TubemapAllPairsStoreTests._test_reopen()
+        _TubemapAllPairsStoreTests._test_eviction()
+        _TubemapAllPairsStoreTests._test_too_long()
+
+    @staticmethod
+    def __evaluate_triangle(graph: TubemapGraph, store: TubemapAllPairsStore) -> None:
+        """Compares the whole stored triangle with the upper triangle of the all pairs matrix, row i holds (i, i + 1) ... (i, n - 1)."""
+        all_pairs = TubemapDynamicShortestPaths(graph).all_pairs()
+        node_ids = list(graph.nodes.keys())
+        expected_triangle = [all_pairs[node_ids[i]].get(node_ids[j], TubemapAllPairsStore.UNREACHABLE) for i in range(len(node_ids)) for j in range(i + 1, len(node_ids))]
+        triangle = store.get_all_journey_times().tolist()
+        mismatches = abs(len(expected_triangle) - len(triangle)) + sum(expected != actual for expected, actual in zip(expected_triangle, triangle))
+        _TestHelpers.evaluate_result("0 mismatches", f"{mismatches} mismatches")
+
+    @staticmethod
+    def _test_triangle() -> None:
+        print(_TubemapAllPairsStoreTests._test_triangle.__name__)
+        graph = _TestHelpers.build_random_tubemap_graph(_TubemapAllPairsStoreTests.SEED)
+        with TemporaryDirectory() as directory, TubemapAllPairsStore(graph, directory) as store:
+            _TubemapAllPairsStoreTests.__evaluate_triangle(graph, store)
+            #The last station's row is empty, so it is never searched itself.
+            _TestHelpers.evaluate_result(len(graph.nodes) - 1, store.searched_count)
+
+    @staticmethod
+    def _test_lazy_rows() -> None:
+        """Only the stations asked about are searched, and a pair is answered from either station's search."""
+        print(_TubemapAllPairsStoreTests._test_lazy_rows.__name__)
+        graph = _TestHelpers.build_random_tubemap_graph(_TubemapAllPairsStoreTests.SEED)
+        all_pairs = TubemapDynamicShortestPaths(graph).all_pairs()
+        nodes = list(graph.nodes.values())
+        with TemporaryDirectory() as directory, TubemapAllPairsStore(graph, directory) as store:
+            _TestHelpers.evaluate_result(0, store.searched_count)
+            middle_node = nodes[len(nodes) // 2]
+            _TestHelpers.evaluate_result(all_pairs[middle_node.id], store.get_journey_times(middle_node))
+            _TestHelpers.evaluate_result(1, store.searched_count)
+            #Pairs before and after the searched station are in its column and its row.
+            journey_times = [store.get_journey_time(node, middle_node) for node in nodes]
+            _TestHelpers.evaluate_result([all_pairs[node.id].get(middle_node.id) for node in nodes], journey_times)
+            _TestHelpers.evaluate_result(1, store.searched_count)
+            _TestHelpers.evaluate_result(all_pairs[nodes[0].id].get(nodes[-1].id), store.get_journey_time(nodes[-1], nodes[0]))
+            _TestHelpers.evaluate_result(2, store.searched_count)
+
+    @staticmethod
+    def _test_reopen() -> None:
+        """Reopening the store for the same graph uses the same file and the rows already searched."""
+        print(_TubemapAllPairsStoreTests._test_reopen.__name__)
+        graph = _TestHelpers.build_random_tubemap_graph(_TubemapAllPairsStoreTests.SEED)
+        nodes = list(graph.nodes.values())
+        with TemporaryDirectory() as directory:
+            with TubemapAllPairsStore(graph, directory) as store:
+                for node in nodes[:5]:
+                    store.get_journey_times(node)
+                file_path = store.file_path
+            with TubemapAllPairsStore(_TestHelpers.build_random_tubemap_graph(_TubemapAllPairsStoreTests.SEED), directory) as store:
+                _TestHelpers.evaluate_result((file_path, 5), (store.file_path, store.searched_count))
+                _TubemapAllPairsStoreTests.__evaluate_triangle(graph, store)
+            _TestHelpers.evaluate_result([file_path], glob.glob(os.path.join(directory, "*")))
+
+    @staticmethod
+    def _test_eviction() -> None:
+        """Each closure gets its own file and only the most recently used ones are kept."""
+        print(_TubemapAllPairsStoreTests._test_eviction.__name__)
+        graph = _TestHelpers.build_random_tubemap_graph(_TubemapAllPairsStoreTests.SEED)
+        open_edges = [edge for _, _, edge in graph.edge_list.values() if not edge.closed]
+        file_paths: List[str] = []
+        with TemporaryDirectory() as directory:
+            for edge in open_edges[:TubemapAllPairsStore.MAX_FILES + 2]:
+                with TubemapAllPairsStore(graph, directory) as store:
+                    file_paths.append(store.file_path)
+                    _TubemapAllPairsStoreTests.__evaluate_triangle(graph, store)
+                edge.closed = True
+                #So that the order of use doesn't depend on the file system's timestamp resolution.
+                os.utime(file_paths[-1], (len(file_paths), len(file_paths)))
+            _TestHelpers.evaluate_result(sorted(file_paths[-TubemapAllPairsStore.MAX_FILES:]), sorted(glob.glob(os.path.join(directory, "*.allpairs"))))
+
+    @staticmethod
+    def _test_too_long() -> None:
+        """A journey too long to be stored is an error, and the station is left unsearched."""
+        print(_TubemapAllPairsStoreTests._test_too_long.__name__)
+        graph = TubemapGraph()
+        node1 = graph.add_node(1)
+        node2 = graph.add_node(2)
+        graph.add_edge(node1, node2, TubemapAllPairsStore.UNREACHABLE, 1)
+        with TemporaryDirectory() as directory, TubemapAllPairsStore(graph, directory) as store:
+            try:
+                store.get_journey_times(node1)
+                error_type = None
+            except ValueError as error:
+                error_type = type(error).__name__
+            _TestHelpers.evaluate_result(("ValueError", 0), (error_type, store.searched_count))
+
 class AlgorithmTests:
     @staticmethod
     def run() -> None:
         _GraphSearcherTests.run()
         _DijkstrasAlgorithmTests.run()
         _BellmanFordsAlgorithmTests.run()
+        _TubemapEngineTests.run()
+        _TubemapConnectivityTests.run()
+        _TubemapClosureImpactTests.run()
+        _TubemapAllPairsStoreTests.run()
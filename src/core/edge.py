@@ -1,4 +1,4 @@
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
 
 class SerializedEdge:
     def __init__(self) -> None:
@@ -13,6 +13,11 @@ class SerializedEdge:
         return edge
 
 class Edge:
+    #The fields that are part of a graph's fingerprint (see Graph.fingerprint).
+    _FINGERPRINT_FIELDS: Tuple[str, ...] = ("weight",)
+    #The graphs whose fingerprints include this edge, they are told when one of the fields above changes.
+    _fingerprint_owners: Tuple[Any, ...] = ()
+
     #Public get, private set.
     @property
     def id(self) -> int:
@@ -20,8 +25,23 @@ class Edge:
         return self.__id
 
     def __init__(self, id: int, weight: int = 1):
-        self.__id: int = id
-        self.weight: int = weight
+        #A new edge can't be part of a fingerprint yet, so its fields are written straight into __dict__ to skip __setattr__, which keeps building large graphs fast.
+        fields = self.__dict__
+        fields["_Edge__id"] = id
+        fields["weight"] = weight
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        #Fields are plain attributes rather than properties so that reading them (which the algorithms do constantly) stays fast, only setting them pays for this check.
+        if not self._fingerprint_owners or name not in self._FINGERPRINT_FIELDS:
+            object.__setattr__(self, name, value)
+            return
+        owners = [owner for owner in self._fingerprint_owners if owner._remove_edge_fingerprint(self)]
+        object.__setattr__(self, name, value)
+        for owner in owners:
+            owner._add_edge_fingerprint(self)
+
+    def _get_fingerprint_values(self) -> Tuple[int, ...]:
+        return (self.weight,)
 
     def serialize(self) -> SerializedEdge:
         serialized_edge = SerializedEdge()
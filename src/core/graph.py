@@ -1,10 +1,30 @@
-from typing import Dict, List
+from typing import Dict, List, Tuple
 import json
 from sys import maxsize as INT_MAX
 import random
 from .node import Node, SerializedNode, NODE_NOT_FOUND_ERROR
 from .node import Edge
 
+_FINGERPRINT_MASK = (1 << 64) - 1
+
+def _mix_fingerprint(values: Tuple[int, ...]) -> int:
+    """Mixes the values into a well spread 64 bit hash (splitmix64's finaliser after each value), unlike hash() this is the same in every process and Python version."""
+    result = 0
+    for value in values:
+        result = ((result ^ value) + 0x9E3779B97F4A7C15) & _FINGERPRINT_MASK
+        result = ((result ^ (result >> 30)) * 0xBF58476D1CE4E5B9) & _FINGERPRINT_MASK
+        result = ((result ^ (result >> 27)) * 0x94D049BB133111EB) & _FINGERPRINT_MASK
+        result ^= result >> 31
+    return result
+
+def _get_node_fingerprint(node: Node) -> int:
+    return _mix_fingerprint((1, node.id & _FINGERPRINT_MASK))
+
+def _get_edge_fingerprint(node1: Node, node2: Node, edge: Edge) -> int:
+    #The end points are ordered so that the edge hashes the same whichever way round it was added.
+    low_id, high_id = (node1.id, node2.id) if node1.id <= node2.id else (node2.id, node1.id)
+    return _mix_fingerprint((2, edge.id & _FINGERPRINT_MASK, low_id & _FINGERPRINT_MASK, high_id & _FINGERPRINT_MASK, *edge._get_fingerprint_values()))
+
 class SerializedGraph:
     def __init__(self) -> None:
         self.nodes: List[SerializedNode] = []
@@ -41,18 +61,75 @@ class Graph:
         """The edges on the graph."""
         return self.__edge_list
 
+    @property
+    def fingerprint(self) -> int:
+        """
+        A 64 bit hash of the graph's content (nodes, edges and their weights), for checking that a cache or a file built from the graph still matches it.
+        It is the sum of a hash of every node and edge, so it doesn't depend on the order they were added in and can be updated in O(1) per change.
+        The whole graph is hashed the first time this is read, after that the add/remove methods and setting an edge's weight keep it up to date,
+        so nodes and edges must not be put into (or taken out of) nodes and edge_list directly once it has been read.
+        """
+        if self.__fingerprint is None:
+            self.__fingerprint = self._calculate_fingerprint()
+            for _, _, edge in self.edge_list.values():
+                edge._fingerprint_owners = (*edge._fingerprint_owners, self)
+        return self.__fingerprint
+
     def __init__(self) -> None:
         self.__nodes: Dict[int, Node] = {}
         self.__edge_list: Dict[int, tuple[Node, Node, Edge]] = {}
-
-    def add_node(self) -> Node:
+        #Not calculated until it is first needed, as most graphs are built in bulk and never asked for it.
+        self.__fingerprint: int | None = None
+
+    def _calculate_fingerprint(self) -> int:
+        """Hashes the whole graph (see fingerprint)."""
+        fingerprint = 0
+        for node in self.nodes.values():
+            fingerprint += _get_node_fingerprint(node)
+        for node1, node2, edge in self.edge_list.values():
+            fingerprint += _get_edge_fingerprint(node1, node2, edge)
+        return fingerprint & _FINGERPRINT_MASK
+
+    def _set_fingerprint(self, fingerprint: int) -> None:
+        """Sets the fingerprint without hashing the graph, for a graph read from a file that holds the fingerprint of its content (see TubemapSnapshot)."""
+        self.__fingerprint = fingerprint & _FINGERPRINT_MASK
+        for _, _, edge in self.edge_list.values():
+            edge._fingerprint_owners = (*edge._fingerprint_owners, self)
+
+    def _add_node_fingerprint(self, node: Node) -> None:
+        """Must be called after a node has been added to the graph."""
+        if self.__fingerprint is not None:
+            self.__fingerprint = (self.__fingerprint + _get_node_fingerprint(node)) & _FINGERPRINT_MASK
+
+    def _add_edge_fingerprint(self, edge: Edge) -> None:
+        """Must be called after an edge has been added to the graph or one of its fingerprinted fields has changed."""
+        if self.__fingerprint is None:
+            return
+        node1, node2, _ = self.edge_list[edge.id]
+        self.__fingerprint = (self.__fingerprint + _get_edge_fingerprint(node1, node2, edge)) & _FINGERPRINT_MASK
+        if self not in edge._fingerprint_owners:
+            edge._fingerprint_owners = (*edge._fingerprint_owners, self)
+
+    def _remove_edge_fingerprint(self, edge: Edge) -> bool:
+        """Must be called before an edge is removed from the graph or one of its fingerprinted fields changes, returns False if the edge isn't part of the fingerprint."""
+        entry = self.edge_list.get(edge.id)
+        if self.__fingerprint is None or entry is None or entry[2] is not edge:
+            return False
+        self.__fingerprint = (self.__fingerprint - _get_edge_fingerprint(*entry)) & _FINGERPRINT_MASK
+        return True
+
+    def add_node(self, id: int | None = None) -> Node:
         """Adds a node to the graph."""
-        id = 0
-        while id == 0 or id in self.__nodes:
-            id = random.randint(0, INT_MAX)
+        if id is None:
+            id = 0
+            while id == 0 or id in self.__nodes:
+                id = random.randint(0, INT_MAX)
+        elif id in self.__nodes:
+            raise KeyError(f"Node with ID {id} already exists.")
 
         node = Node(id)
         self.__nodes[id] = node
+        self._add_node_fingerprint(node)
 
         return node
 
@@ -63,8 +140,12 @@ class Graph:
 
         for neighbor in node.adjacency_dict.items():
             self.nodes[neighbor[0]].remove_all_edges(node)
+            for edge in neighbor[1].values():
+                self.__remove_edge_entry(edge)
 
         del self.__nodes[node.id]
+        if self.__fingerprint is not None:
+            self.__fingerprint = (self.__fingerprint - _get_node_fingerprint(node)) & _FINGERPRINT_MASK
 
     def add_edge(self, node1: Node, node2: Node, weight: int, id: int | None = None) -> Edge:
         """Adds an edge to the graph."""
@@ -77,6 +158,7 @@ class Graph:
 
         edge = Edge(id, weight)
         self.__edge_list[id] = (node1, node2, edge)
+        self._add_edge_fingerprint(edge)
 
         node1.add_edge(node2, edge)
         node2.add_edge(node1, edge)
@@ -85,14 +167,19 @@ class Graph:
 
     def remove_edge(self, edge: Edge) -> None:
         """Removes an edge from the graph."""
-        if edge not in self.__edge_list:
+        if edge.id not in self.__edge_list:
             raise KeyError(f"Edge with ID {edge.id} not found.")
 
         node1, node2, _ = self.__edge_list[edge.id]
         node1.remove_edge(node2, edge)
         node2.remove_edge(node1, edge)
 
-        del self.__edge_list[edge.id]
+        self.__remove_edge_entry(edge)
+
+    def __remove_edge_entry(self, edge: Edge) -> None:
+        if self._remove_edge_fingerprint(edge):
+            edge._fingerprint_owners = tuple(owner for owner in edge._fingerprint_owners if owner is not self)
+        self.__edge_list.pop(edge.id, None)
 
     def serialize(self) -> SerializedGraph:
         serialized_graph = SerializedGraph()
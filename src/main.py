@@ -1,16 +1,26 @@
-from typing import Any, List, Callable, Tuple, NoReturn
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Callable, Tuple, NoReturn
+import json
 import os
-from time import time
+import sys
+from time import time, perf_counter
 from tubemap.core.tubemap_graph import TubemapGraph, SerializedTubemapGraph
 from tubemap.core.tubemap_node import TubemapNode
 from tubemap.core.tubemap_edge import TubemapEdge
-from algorithms.algorithm import AAlgorithm
-from algorithms.dijkstras_algorithm import DijkstrasAlgorithm
-from algorithms.bellman_fords_algorithm_dp import BellmanFordsAlgorithmDP
-from tubemap.algorithms.tubemap_graph_searcher import TubemapGraphSearcher
-from tubemap.algorithms.tubemap_dijkstras_algorithm import TubemapDijkstrasAlgorithm
-from tubemap.algorithms.tubemap_bellman_fords_algorithm_dp import TubemapBellmanFordsAlgorithmDP
-from webserver import Webserver
+from tubemap.core.tubemap_snapshot import TubemapSnapshot
+from tubemap.core.tubemap_journal import TubemapJournal
+from tubemap.algorithms.tubemap_algorithm_registry import TubemapAlgorithmRegistry
+#Anything that only the interactive program uses (e.g. the algorithms and the webserver) is imported where it is first used rather than here, so that a one-off command (see __run_once) only imports what it needs.
+if TYPE_CHECKING:
+    from tubemap.core.tubemap_compressed_graph import CompressedTubemapGraph
+    from tubemap.core.tubemap_scenario import TubemapScenario
+    from tubemap.core.tubemap_warmup_scheduler import TubemapWarmupScheduler
+    from algorithms.algorithm import AAlgorithm
+    from tubemap.algorithms.tubemap_dynamic_shortest_paths import TubemapDynamicShortestPaths
+    from tubemap.algorithms.tubemap_closure_impact import ClosureImpact
+    from tubemap.algorithms.tubemap_eccentricity import TubemapEccentricityCalculator
+    from tubemap.algorithms.tubemap_all_pairs_store import TubemapAllPairsStore
+    from tubemap.algorithms.tubemap_connectivity import TubemapComponentIndex, TubemapBridgeIndex
 
 class Program:
     INFO = {
@@ -19,94 +29,471 @@ class Program:
         "author": "Tristan Read (ReadieFur)"
     }
 
-    __ALGORITHMS = [
-        "Dijkstra",
-        "Bellman Ford DP"
-    ]
+    __ALGORITHMS = TubemapAlgorithmRegistry.get_names()
+
+    #In order of preference, the raw CSV is only used when there is no converted graph.
+    __GRAPH_PATHS = ["./tubemap.json", "./tubemap.json.gz", "./tubemap.json.xz", "./tubemap.csv"]
+    __SNAPSHOT_PATH = "./tubemap.snapshot"
+    __JOURNAL_PATH = "./tubemap.journal"
+    #The indexes built in the background while the prompt is idle, in order of priority (remove one to stop it being built).
+    __WARMUP_TASKS = ["stations", "components", "bridges", "eccentricity", "journey times"]
+    #The indexes a batch builds before each command (see __run_batch), these are the ones that are quick to rebuild after a change.
+    __BATCH_WARMUP_TASKS = ["stations", "components", "bridges"]
 
     __graph: TubemapGraph = None
+    #The fingerprint of the graph file (e.g. tubemap.json) as it was loaded, before any changes from the journal or compacted into the snapshot (see __save_graph).
+    __source_fingerprint: int | None = None
+    #Set for the one-off commands (see __run_once), so that nothing in the working directory is changed: the snapshot isn't rewritten,
+    #the journal is only read (changes only last until the program exits) and journey times are stored in a temporary directory.
+    __read_only: bool = False
+    __all_pairs_directory: str = "."
+    __load_timings: Dict[str, float] = {}
+    __journal: TubemapJournal = None
+    __compressed_graph: CompressedTubemapGraph = None
+    __use_compression: bool = False
+    __dynamic_shortest_paths: TubemapDynamicShortestPaths = None
+    __eccentricity_calculator: TubemapEccentricityCalculator = None
+    #Opened when it is first needed, and reopened when the graph no longer matches it (e.g. after a closure).
+    __all_pairs_store: TubemapAllPairsStore | None = None
+    __warmup: TubemapWarmupScheduler = None
+    #While set, line changes and routes are made against this scenario instead of the live graph.
+    __scenario: TubemapScenario | None = None
     __start_node: TubemapNode = None
     __end_node: TubemapNode = None
     __algorithm: int = 0
     __stop_webserver_callback: Callable[[], None] | None = None
+    __use_colour: bool = True
+    #While a batch command is running, what it prints is collected here instead (see __run_batch).
+    __output: List[str] | None = None
 
     @staticmethod
-    def Main() -> None:
+    def Main(args: List[str]) -> None:
+        #A one-off command given on the command line (e.g. route bank "canary wharf" --json) is run without starting the interactive program.
+        if len(args) > 0:
+            exit(Program.__run_once(args))
+
         Program.__load_graph()
+        Program.__load_engines()
+        Program.__start_warmup(Program.__WARMUP_TASKS)
         Program.__cli()
 
-    def __load_graph() -> None:
-        """Loads the graph from the file."""
-        if not os.path.exists("./tubemap.json"):
-            raise FileNotFoundError(f"The tubemap.json graph file was not found in the working directory ({os.getcwd()}).")
-        Program.__graph = SerializedTubemapGraph.load_from_file("./tubemap.json")
+    def __load_graph(write_snapshot: bool = False) -> None:
+        """
+        Loads the graph from the file. In read only mode the snapshot is only written if write_snapshot is given,
+        which the route command does as it is only a cache of the graph file there (the journal is still left alone).
+        """
+        #The graph file can also be stored compressed, which is much quicker to read from slow storage.
+        graph_path = next((path for path in Program.__GRAPH_PATHS if os.path.exists(path)), None)
+        if graph_path is None:
+            raise FileNotFoundError(f"The tubemap.json (or tubemap.csv) graph file was not found in the working directory ({os.getcwd()}).")
+
+        #The binary snapshot is much quicker to load, and holds any changes compacted from the journal, so use it unless the graph file has been changed since it was written.
+        snapshot_source_fingerprint: int | None = None
+        if os.path.exists(Program.__SNAPSHOT_PATH):
+            try:
+                start_time = time()
+                with TubemapSnapshot(Program.__SNAPSHOT_PATH) as snapshot:
+                    snapshot_source_fingerprint = snapshot.source_fingerprint
+                    if os.path.getmtime(Program.__SNAPSHOT_PATH) >= os.path.getmtime(graph_path):
+                        Program.__graph = snapshot.to_graph()
+                        Program.__source_fingerprint = snapshot_source_fingerprint
+                        Program.__load_timings["snapshot"] = time() - start_time
+            except (OSError, ValueError):
+                Program.__graph = None
+                snapshot_source_fingerprint = None
+
+        if Program.__graph is None:
+            if graph_path.endswith(".csv"):
+                from tubemap.core.tubemap_csv_loader import TubemapCSVLoader
+                start_time = time()
+                csv_warnings: List[str] = []
+                Program.__graph = TubemapCSVLoader.load_from_file(graph_path, csv_warnings)
+                Program.__load_timings["csv"] = time() - start_time
+                for warning in csv_warnings:
+                    print(warning, file=sys.stderr)
+            else:
+                Program.__graph = SerializedTubemapGraph.load_from_file(graph_path, Program.__load_timings)
+            Program.__source_fingerprint = Program.__graph.fingerprint
+
+            #The graph file is newer than the snapshot but has the same content (e.g. it was copied or touched), so the snapshot, and any changes compacted into it, still apply.
+            if snapshot_source_fingerprint == Program.__source_fingerprint:
+                try:
+                    with TubemapSnapshot(Program.__SNAPSHOT_PATH) as snapshot:
+                        Program.__graph = snapshot.to_graph()
+                    if write_snapshot or not Program.__read_only:
+                        os.utime(Program.__SNAPSHOT_PATH)
+                except (OSError, ValueError):
+                    pass
+            elif write_snapshot or not Program.__read_only:
+                try:
+                    TubemapSnapshot.write(Program.__graph, Program.__SNAPSHOT_PATH)
+                except OSError:
+                    #The snapshot is only a cache until a change has been compacted into it, so it isn't a problem if it can't be written.
+                    pass
+
+        #Apply any changes made since the graph file was written (e.g. closures), these are kept in the journal so a change doesn't rewrite the whole graph.
+        start_time = time()
+        journal = TubemapJournal(Program.__JOURNAL_PATH)
+        if journal.replay(Program.__graph, Program.__read_only) > 0:
+            Program.__load_timings["journal"] = time() - start_time
+        if journal.warning is not None:
+            print(journal.warning, file=sys.stderr)
+        Program.__journal = journal if not Program.__read_only else None
+
+    def __load_engines() -> None:
+        """Sets up the routing state that follows the live graph, which only the interactive program needs."""
+        from tubemap.core.tubemap_compressed_graph import CompressedTubemapGraph
+        from tubemap.algorithms.tubemap_dynamic_shortest_paths import TubemapDynamicShortestPaths
+        from tubemap.algorithms.tubemap_eccentricity import TubemapEccentricityCalculator
+
+        Program.__compressed_graph = CompressedTubemapGraph.compress(Program.__graph)
+        Program.__dynamic_shortest_paths = TubemapDynamicShortestPaths(Program.__graph)
+        Program.__eccentricity_calculator = TubemapEccentricityCalculator(Program.__graph)
+
+    def __start_warmup(task_names: List[str], in_background: bool = True) -> None:
+        """
+        Starts building the indexes in the background, commands use an index once it is ready and search directly until then.
+        If not in the background, the indexes are only built when run_pending is called (see __run_batch).
+        """
+        from tubemap.core.tubemap_warmup_scheduler import TubemapWarmupScheduler
+        from tubemap.algorithms.tubemap_connectivity import TubemapComponentIndex, TubemapBridgeIndex
+
+        def build_station_index() -> Dict[str, TubemapNode]:
+            station_index: Dict[str, TubemapNode] = {}
+            for node in Program.__graph.nodes.values():
+                #The first station with a label wins, the same as the search in __get_node_from_label_or_id.
+                station_index.setdefault(node.label.strip().lower(), node)
+            return station_index
+
+        def build_journey_times() -> Iterator[Tuple[int, int]]:
+            store = Program.__get_all_pairs_store(Program.__graph)
+            yield from store.iterate_searches()
+            return store
+
+        builders: Dict[str, Callable[[], Any]] = {
+            "stations": build_station_index,
+            "components": lambda: TubemapComponentIndex.iterate_build(Program.__graph),
+            "bridges": lambda: TubemapBridgeIndex.iterate_build(Program.__graph),
+            "eccentricity": lambda: Program.__eccentricity_calculator.eccentricities(),
+            "journey times": build_journey_times
+        }
+        Program.__warmup = TubemapWarmupScheduler(lambda: Program.__graph.fingerprint)
+        for priority, name in enumerate(task_names):
+            Program.__warmup.add_task(name, priority, builders[name])
+        if in_background:
+            Program.__warmup.start()
+
+    def __get_warmup_index(name: str) -> Any:
+        """A warmed up index of the live graph, or None if it isn't ready (or a scenario is active, as the indexes don't know about it)."""
+        if Program.__warmup is None or Program.__scenario is not None:
+            return None
+        return Program.__warmup.get(name)
+
+    def __run_once(args: List[str]) -> int:
+        """Runs a single command given on the command line and returns the exit code, only the graph and the modules the command uses are loaded."""
+        ONE_OFF_COMMANDS = {
+            "route": Program.__run_route,
+            "batch": Program.__run_batch
+        }
+
+        command = args[0].lower()
+        Program.__read_only = True
+        if command not in ONE_OFF_COMMANDS:
+            Program.print((f"Invalid command.", 'red'))
+            Program.print("Usage: ", ("main.py", 'yellow'), (" <command>", 'cyan'), "\n\tWithout a command the interactive program is started, the commands that can be run on their own are:")
+            for one_off_command in ONE_OFF_COMMANDS:
+                Program.print(f"- ", (f"{one_off_command}", 'yellow'))
+            return 2
+        return ONE_OFF_COMMANDS[command](args[1:])
+
+    def __run_route(args: List[str]) -> int:
+        """Finds a single route and prints it (as JSON with --json), this is the quickest way to get from starting the program to an answer."""
+        use_json = False
+        algorithm_name = Program.__ALGORITHMS[Program.__algorithm]
+        stations: List[str] = []
+        i = 0
+        while i < len(args):
+            if args[i] == "--json":
+                use_json = True
+            elif args[i] == "--algorithm" and i + 1 < len(args):
+                i += 1
+                algorithm_name = args[i]
+            else:
+                stations.append(args[i])
+            i += 1
+
+        def fail(message: str, exit_code: int = 1) -> int:
+            if use_json:
+                print(json.dumps({"error": message}))
+            else:
+                Program.print((message, 'red'))
+            return exit_code
+
+        if len(stations) != 2:
+            if not use_json:
+                Program.print("Usage: ", ("main.py route", 'yellow'), (" [start] [end]", 'magenta'), (" <--algorithm name>", 'cyan'), (" <--json>", 'cyan'))
+                Program.print("\tFinds the shortest route between two stations (by label or ID), the algorithms are:", " ", ", ".join(Program.build_coloured_string((f"'{name}'", 'cyan')) for name in Program.__ALGORITHMS), ".")
+                Program.print("\tThe graph is cached in", (" './tubemap.snapshot'", 'cyan'), " (written if it is missing or the graph file has changed) so that later routes start quicker, the journal is only read.")
+            return fail(f"Invalid syntax.", 2)
+        if TubemapAlgorithmRegistry.get_name(algorithm_name) is None:
+            return fail(f"Invalid algorithm '{algorithm_name}'.", 2)
+        algorithm_name = TubemapAlgorithmRegistry.get_name(algorithm_name)
+
+        #The snapshot is written if it is missing or out of date, so that only the first route after the graph file changes has to parse it.
+        try:
+            Program.__load_graph(True)
+        except (OSError, ValueError) as error:
+            return fail(f"The graph could not be loaded ({error}).")
+
+        start_time = time()
+        try:
+            route = Program.__find_route(stations[0], stations[1], algorithm_name)
+        except ValueError as error:
+            return fail(str(error))
+        Program.__load_timings["route"] = time() - start_time
+
+        if use_json:
+            route["timings"] = {phase: round(phase_duration * 1000, 3) for phase, phase_duration in Program.__load_timings.items()}
+            print(json.dumps(route, ensure_ascii=False))
+        else:
+            Program.print("The route from ", (f"'{route['from']}'", 'green'), " to ", (f"'{route['to']}'", 'green'), " has a duration of ", (f"{route['duration']} minutes", 'cyan'), ".")
+            for station, line in zip(route["stations"], route["lines"]):
+                Program.print("- ", (f"'{station}'", 'green'), " via the", (f" '{line}'", 'cyan'), " line.")
+            Program.print("- ", (f"'{route['stations'][-1]}'", 'green'), ".")
+        return 0
+
+    def __find_route(start_tag: str, end_tag: str, algorithm_name: str) -> Dict[str, Any]:
+        """Finds the shortest route between two stations (by label or ID) as a JSON friendly dict, raises a ValueError if there isn't one."""
+        graph = Program.__get_graph()
+        start_node = Program.__get_node_from_label_or_id(start_tag)
+        end_node = Program.__get_node_from_label_or_id(end_tag)
+        for tag, node in [(start_tag, start_node), (end_tag, end_node)]:
+            if node is None:
+                raise ValueError(f"Invalid station '{tag}'.")
+        if start_node == end_node:
+            raise ValueError(f"The start and end stations are the same.")
+        start_node = graph.nodes[start_node.id]
+        end_node = graph.nodes[end_node.id]
+
+        component_index: TubemapComponentIndex | None = Program.__get_warmup_index("components")
+        if component_index is not None:
+            is_path_available = component_index.is_path_available(start_node, end_node)
+        else:
+            from tubemap.algorithms.tubemap_graph_searcher import TubemapGraphSearcher
+            is_path_available = TubemapGraphSearcher.is_path_available(graph, start_node, end_node)
+        if not is_path_available:
+            raise ValueError(f"No route is available between '{Program.__get_tag(start_node)}' and '{Program.__get_tag(end_node)}'.")
+
+        _, tubemap_algorithm = TubemapAlgorithmRegistry.get(algorithm_name)
+        if TubemapAlgorithmRegistry.is_stateful(algorithm_name):
+            #The same instance is used for every route, as it keeps the shortest path tree of each start station for later routes from there.
+            if Program.__dynamic_shortest_paths is None:
+                Program.__dynamic_shortest_paths = tubemap_algorithm(Program.__graph)
+            tubemap_algorithm = Program.__dynamic_shortest_paths
+        path_part_array = tubemap_algorithm.find_shortest_path(graph, start_node, end_node)
+
+        return {
+            "from": Program.__get_tag(start_node),
+            "to": Program.__get_tag(end_node),
+            "algorithm": algorithm_name,
+            "duration": sum(path_part.edge.weight for path_part in path_part_array[:-1]),
+            "stations": [Program.__get_tag(path_part.node) for path_part in path_part_array],
+            "lines": [Program.__get_tag(path_part.edge) for path_part in path_part_array[:-1]]
+        }
+
+    def __run_batch(args: List[str]) -> int:
+        """
+        Runs commands from a file (or stdin) one per line, and writes the result of each as a line of JSON without any colour.
+        Every command of the interactive program can be used (other than clear and gui) and its output is given as plain text lines,
+        route [start] [end] gives the route as JSON instead, empty lines and lines starting with # are skipped and exit stops the batch.
+        """
+        #These would write to the terminal or keep running after the batch has finished.
+        UNSUPPORTED_COMMANDS = ["clear", "gui"]
+
+        input_path: str | None = None
+        output_path: str | None = None
+        #Dynamic Dijkstra by default as it reuses the shortest path tree of each start station, which makes replaying a log of routes much quicker.
+        algorithm_name = "Dynamic Dijkstra"
+        i = 0
+        while i < len(args):
+            if args[i] in ["--output", "--algorithm"] and i + 1 < len(args):
+                if args[i] == "--output":
+                    output_path = args[i + 1]
+                else:
+                    algorithm_name = args[i + 1]
+                i += 1
+            elif input_path is None and not args[i].startswith("--"):
+                input_path = args[i]
+            else:
+                input_path = None
+                break
+            i += 1
+
+        if i < len(args) or TubemapAlgorithmRegistry.get_name(algorithm_name) is None:
+            Program.print("Usage: ", ("main.py batch", 'yellow'), (" <file>", 'cyan'), (" <--output file>", 'cyan'), (" <--algorithm name>", 'cyan'))
+            Program.print("\tRuns the commands in the file (or stdin if there isn't one, or it is -) and writes the result of each command as a line of JSON (to stdout if there is no output file).")
+            Program.print("\tAs well as the interactive commands,", (" route", 'yellow'), (" [start] [end]", 'magenta'), " gives a route as JSON.")
+            Program.print((f"Invalid syntax.", 'red'))
+            return 2
+        Program.__algorithm = Program.__ALGORITHMS.index(TubemapAlgorithmRegistry.get_name(algorithm_name))
+
+        try:
+            input_file = sys.stdin if input_path in [None, "-"] else open(input_path, "r", encoding="utf-8")
+            output_file = sys.stdout if output_path is None else open(output_path, "w", encoding="utf-8")
+            Program.__load_graph()
+        except (OSError, ValueError) as error:
+            Program.print((f"The batch could not be started ({error}).", 'red'))
+            return 1
+        Program.__load_engines()
+        #There is no idle time between commands, so the quick indexes are rebuilt (if the graph has changed) before each command instead.
+        Program.__start_warmup(Program.__BATCH_WARMUP_TASKS, in_background=False)
+        Program.__use_colour = False
+        from tempfile import TemporaryDirectory
+        all_pairs_directory = TemporaryDirectory(prefix="tubemap-")
+        Program.__all_pairs_directory = all_pairs_directory.name
+
+        command_count = 0
+        batch_start_time = perf_counter()
+        try:
+            for line_number, line in enumerate(input_file, 1):
+                command = line.strip()
+                if command == "" or command.startswith("#"):
+                    continue
+                Program.__warmup.run_pending()
+
+                result: Dict[str, Any] = {"line": line_number, "command": command}
+                Program.__output = []
+                start_time = perf_counter()
+                try:
+                    command_prefix, command_args = Program.__split_command(command)
+                    if command_prefix == "exit":
+                        break
+                    elif command_prefix == "route":
+                        if len(command_args) != 2:
+                            raise ValueError(f"Invalid syntax.")
+                        result["route"] = Program.__find_route(command_args[0], command_args[1], Program.__ALGORITHMS[Program.__algorithm])
+                    elif command_prefix in UNSUPPORTED_COMMANDS:
+                        raise ValueError(f"The {command_prefix} command can't be used in a batch.")
+                    elif command_prefix != "help" and command_prefix not in Program.__get_commands():
+                        raise ValueError(f"Invalid command.")
+                    else:
+                        Program.__run_command(command_prefix, command_args)
+                        result["output"] = [output_line.rstrip() for output_line in "".join(Program.__output).splitlines()]
+                except ValueError as error:
+                    result["error"] = str(error)
+                except Exception as error:
+                    result["error"] = f"The command failed ({type(error).__name__}: {error})."
+                result["duration_ms"] = round((perf_counter() - start_time) * 1000, 3)
+                output_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+                command_count += 1
+        finally:
+            Program.__output = None
+            if input_file is not sys.stdin:
+                input_file.close()
+            if output_file is not sys.stdout:
+                output_file.close()
+            Program.__warmup.stop()
+            if Program.__all_pairs_store is not None:
+                Program.__all_pairs_store.close()
+            all_pairs_directory.cleanup()
+
+        #Written to stderr so that stdout is only the results.
+        batch_duration = perf_counter() - batch_start_time
+        print(f"Ran {command_count} commands in {batch_duration:.2f}s ({command_count / max(batch_duration, 1e-9):.0f} commands per second).", file=sys.stderr)
+        return 0
 
     def __cli() -> None:
         """The command line interface for the program (also the main loop)."""
         Program.print((Program.INFO['name'], 'magenta'), (f" v{Program.INFO['version']}", 'cyan'), " by", (f" {Program.INFO['author']}", 'green'))
 
+        load_summary = ", ".join(f"{phase} {duration * 1000:.2f}ms" for phase, duration in Program.__load_timings.items())
+        Program.print((f"Loaded {len(Program.__graph.nodes)} stations and {len(Program.__graph.edge_list)} lines ({load_summary}).", 'black'))
         Program.print("Type ", (f"'help'", 'yellow'), " for a list of commands.")
         Program.print("Type ", (f"'exit'", 'yellow'), " to exit the program.")
 
-        COMMANDS = {
+        while True:
+            command = ""
+            #Indexes are only built while waiting for a command, so that they never slow one down.
+            Program.__warmup.resume()
+            try:
+                command = input(Program.__get_warmup_prompt() + Program.build_coloured_string(("> ", 'yellow')))
+            except KeyboardInterrupt:
+                Program.__command_exit([])
+                #Never returns.
+            Program.__warmup.pause()
+
+            Program.__run_command(*Program.__split_command(command))
+
+    def __get_commands() -> Dict[str, Callable[[List[str], bool], None]]:
+        return {
             # "help",
             "list": Program.__command_list,
             "line": Program.__command_line,
             "start": Program.__command_start,
             "end": Program.__command_end,
+            "meet": Program.__command_meet,
             "algorithm": Program.__command_algorithm,
+            "interchange": Program.__command_interchange,
+            "compression": Program.__command_compression,
             "go": Program.__command_go,
+            "alternatives": Program.__command_alternatives,
+            "reach": Program.__command_reach,
+            "centrality": Program.__command_centrality,
+            "eccentricity": Program.__command_eccentricity,
+            "times": Program.__command_times,
+            "warmup": Program.__command_warmup,
+            "scenario": Program.__command_scenario,
             "gui": Program.__command_gui,
             "clear": Program.__command_clear,
             "exit": Program.__command_exit
         }
 
+    def __split_command(command: str) -> Tuple[str, List[str]]:
+        """Splits a command into its (lower case) name and arguments."""
+        command = command.lower()
+        command_prefix = command.split(" ")[0]
+        #The following splits the remaining args on spaces like the above but joins strings back together between quotes.
+        #It does not support nested quotes and I don't have a need to for this project.
+        command_args_split = command.split(" ")[1:]
+        command_args = []
+        i = 0
+        current_arg = ""
         while True:
-            command = ""
-            try:
-                command = input(Program.build_coloured_string(("> ", 'yellow'))).lower()
-            except KeyboardInterrupt:
-                Program.__command_exit([])
-                #Never returns.
-
-            command_prefix = command.split(" ")[0]
-            #The following splits the remaining args on spaces like the above but joins strings back together between quotes.
-            #It does not support nested quotes and I don't have a need to for this project.
-            command_args_split = command.split(" ")[1:]
-            command_args = []
-            i = 0
-            current_arg = ""
-            while True:
-                if i >= len(command_args_split):
-                    break
-                if command_args_split[i].startswith('"'):
-                    current_arg = command_args_split[i][1:]
-                    while not command_args_split[i].endswith('"'):
-                        i += 1
-                        current_arg += f" {command_args_split[i]}"
-                    current_arg = current_arg[:-1]
-                    command_args.append(current_arg)
-                else:
-                    command_args.append(command_args_split[i])
-                i += 1
-
-            if command_prefix == "help":
-                if len(command_args) == 0:
-                    Program.print("Command syntax: ", (f"[required]", 'magenta'), " ", (f"<optional>", 'cyan'))
-                    Program.print("For help with sub-commands, type: ", (f"help", 'yellow'), " ", (f"[command]", 'magenta'))
-                    Program.print("For any argument that requires a space in it, surround it with double quotes (e.g.", (' "', 'yellow'), ("argument", 'cyan'), ('"', 'yellow'), ").")
-                    Program.print("Commands:")
-                    for command in COMMANDS:
-                        Program.print(f"- ", (f"{command}", 'yellow'))
-                else:
-                    if command_args[0] not in COMMANDS:
-                        Program.print((f"Invalid command.", 'red'))
-                    else:
-                        COMMANDS[command_args[0]](command_args, True)
-            elif command_prefix in COMMANDS:
-                COMMANDS[command_prefix](command_args)
+            if i >= len(command_args_split):
+                break
+            if command_args_split[i].startswith('"'):
+                current_arg = command_args_split[i][1:]
+                while not command_args_split[i].endswith('"'):
+                    i += 1
+                    current_arg += f" {command_args_split[i]}"
+                current_arg = current_arg[:-1]
+                command_args.append(current_arg)
+            else:
+                command_args.append(command_args_split[i])
+            i += 1
+        return command_prefix, command_args
+
+    def __run_command(command_prefix: str, command_args: List[str]) -> None:
+        """Runs a command typed at the prompt (or read by a batch)."""
+        COMMANDS = Program.__get_commands()
+
+        if command_prefix == "help":
+            if len(command_args) == 0:
+                Program.print("Command syntax: ", (f"[required]", 'magenta'), " ", (f"<optional>", 'cyan'))
+                Program.print("For help with sub-commands, type: ", (f"help", 'yellow'), " ", (f"[command]", 'magenta'))
+                Program.print("For any argument that requires a space in it, surround it with double quotes (e.g.", (' "', 'yellow'), ("argument", 'cyan'), ('"', 'yellow'), ").")
+                Program.print("Commands:")
+                for command in COMMANDS:
+                    Program.print(f"- ", (f"{command}", 'yellow'))
             else:
-                Program.print((f"Invalid command.", 'red'))
+                if command_args[0] not in COMMANDS:
+                    Program.print((f"Invalid command.", 'red'))
+                else:
+                    COMMANDS[command_args[0]](command_args, True)
+        elif command_prefix in COMMANDS:
+            COMMANDS[command_prefix](command_args)
+        else:
+            Program.print((f"Invalid command.", 'red'))
 
     def __command_list(args: List[str], show_help: bool = False) -> None:
         """Lists the nodes in the graph."""
@@ -169,6 +556,13 @@ class Program:
             Program.print(("line info", 'yellow'), (" [station1] [station2] [line]", 'magenta'), "\n\tShows if a line is closed or not between the specified stations.")
             Program.print(("line open", 'yellow'), (" [station1] [station2] [line]", 'magenta'), "\n\tOpens a line.")
             Program.print(("line close", 'yellow'), (" [station1] [station2] [line]", 'magenta'), "\n\tCloses a line.")
+            Program.print(("line time", 'yellow'), (" [station1] [station2] [line] [minutes]", 'magenta'), "\n\tSets the time it takes to travel between the stations on a line (e.g. to account for delays).")
+            Program.print(("line impact", 'yellow'), (" [station1] [station2] [line]", 'magenta'), "\n\tShows how many journeys between all pairs of stations would be slower if the line was closed.")
+            Program.print(("line critical", 'yellow'), (" <count>", 'cyan'), "\n\tRanks the open lines by how much closing them would slow down journeys between all pairs of stations.")
+            return
+
+        if len(args) >= 1 and args[0] == "critical":
+            Program.__command_line_critical(args)
             return
 
         if len(args) < 3:
@@ -194,12 +588,18 @@ class Program:
             #Sort the entries by their tag and then by their weight in descending order.
             histogram_data = sorted(sorted(histogram_data, key=lambda x: x[0]), key=lambda x: x[1], reverse=True)
             Program.__display_histogram(histogram_data, "Line", "Time (minutes)")
-        elif len(args) == 4:
+        elif len(args) == (5 if args[0] == "time" else 4):
             edge = Program.__get_edge_from_label_or_id(node1, node2, args[3])
             if edge is None:
                 Program.print((f"The two stations do not have a connection on the specified line.", 'red'))
                 return
 
+            #While a scenario is being edited, the line is changed in the scenario rather than on the live graph.
+            graph = Program.__get_graph()
+            node1 = graph.nodes[node1.id]
+            node2 = graph.nodes[node2.id]
+            edge = graph.edge_list[edge.id][2]
+
             node1_tag = Program.__get_tag(node1)
             node2_tag = Program.__get_tag(node2)
             edge_tag = Program.__get_tag(edge)
@@ -214,19 +614,85 @@ class Program:
                 Program.print(info_str, ".")
             elif args[0] == "open":
                 edge.closed = False
+                if Program.__scenario is None:
+                    Program.__on_edge_changed(edge)
                 Program.print(f"{prefix} now ", ("open", 'green'), ".")
             elif args[0] == "close":
+                from tubemap.algorithms.tubemap_graph_searcher import TubemapGraphSearcher
+                bridge_index: TubemapBridgeIndex | None = Program.__get_warmup_index("bridges")
                 edge.closed = True
-                if not TubemapGraphSearcher.is_path_available(Program.__graph, node1, node2):
+                if bridge_index.is_bridge(edge) if bridge_index is not None else not TubemapGraphSearcher.is_path_available(graph, node1, node2):
                     edge.closed = False
                     Program.print(("The Line between", 'red'), (f" '{node1_tag}'", 'green'), (" and", 'red'), (f" '{node2_tag}'", 'green'), (" via", 'red'), (f" '{edge_tag}'", 'cyan'), (" cannot be closed as it would cause one of the stations to be unreachable.", 'red'))
                 else:
+                    if Program.__scenario is None:
+                        Program.__on_edge_changed(edge)
                     Program.print(f"{prefix} now ", ("closed", 'red'), ".")
+            elif args[0] == "impact":
+                if edge.closed:
+                    Program.print(f"{prefix} already ", ("closed", 'red'), ".")
+                    return
+                from tubemap.core.tubemap_scenario import TubemapScenario
+                from tubemap.algorithms.tubemap_dynamic_shortest_paths import TubemapDynamicShortestPaths
+                from tubemap.algorithms.tubemap_closure_impact import TubemapClosureImpactAnalyser
+                #The line is closed on a scenario of its own rather than on a graph that others (e.g. the webserver) are reading,
+                #the cached trees of the live graph give the journeys it could slow down, but while a scenario is active it needs trees of its own.
+                if Program.__scenario is None:
+                    impact_scenario = TubemapScenario(Program.__graph)
+                    shortest_paths = Program.__dynamic_shortest_paths
+                else:
+                    impact_scenario = Program.__scenario.fork()
+                    shortest_paths = TubemapDynamicShortestPaths(Program.__scenario.graph)
+                impact = TubemapClosureImpactAnalyser.analyse_edge_on_scenario(impact_scenario, edge, shortest_paths)
+                Program.print(f"If closed, the Line between", (f" '{node1_tag}'", 'green'), " and", (f" '{node2_tag}'", 'green'), " via", (f" '{edge_tag}'", 'cyan'), " would:")
+                Program.print("- Slow down ", (f"{impact.slower_pairs}", 'cyan'), " journeys between pairs of stations by a total of ", (f"{impact.total_delay} minutes", 'cyan'), " (at most ", (f"{impact.max_delay} minutes", 'cyan'), " for a single journey).")
+                if impact.disconnected_pairs > 0:
+                    Program.print(("- Make ", 'red'), (f"{impact.disconnected_pairs}", 'cyan'), (" journeys between pairs of stations impossible.", 'red'))
+            elif args[0] == "time":
+                if not args[4].isdigit() or int(args[4]) == 0:
+                    Program.print((f"Invalid number of minutes.", 'red'))
+                    return
+                edge.weight = int(args[4])
+                if Program.__scenario is None:
+                    Program.__on_edge_changed(edge)
+                Program.print(f"{prefix} now ", (f"{edge.weight} minutes", 'cyan'), " long.")
             else:
                 Program.print((f"Invalid syntax.", 'red'))
         else:
             Program.print((f"Invalid syntax.", 'red'))
 
+    @staticmethod
+    def __command_line_critical(args: List[str]) -> None:
+        """Ranks every open line by the impact that closing it would have."""
+        from tubemap.algorithms.tubemap_closure_impact import TubemapClosureImpactAnalyser
+
+        if len(args) > 1 and not args[1].isdigit():
+            Program.print((f"Invalid count.", 'red'))
+            return
+        count = int(args[1]) if len(args) > 1 else 10
+
+        calculation_start_time = time()
+        #The analysis runs in other processes, and a scenario can't be sent to them, so they are sent a copy of the graph as the scenario sees it.
+        graph = Program.__scenario.to_graph() if Program.__scenario is not None else Program.__graph
+        impacts = TubemapClosureImpactAnalyser.rank_edges(graph)
+        Program.print((f"Evaluated {len(impacts)} lines in {time() - calculation_start_time:.2f}s.", 'black'))
+
+        def impact_tag(impact: ClosureImpact) -> str:
+            node1, node2, _ = graph.edge_list[impact.edge.id]
+            return f"{Program.__get_tag(node1)} - {Program.__get_tag(node2)} ({Program.__get_tag(impact.edge)})"
+
+        #Lines that would disconnect stations can't be closed, so list them separately from the histogram.
+        disconnecting_impacts = [impact for impact in impacts if impact.disconnected_pairs > 0]
+        histogram_data = [(impact_tag(impact), impact.total_delay) for impact in impacts if impact.disconnected_pairs == 0 and impact.total_delay > 0][:count]
+
+        if len(disconnecting_impacts) > 0:
+            Program.print((f"{len(disconnecting_impacts)}", 'cyan'), " lines cannot be closed as they would make some stations unreachable.")
+        if len(histogram_data) == 0:
+            Program.print((f"No line closure would slow down any journeys.", 'red'))
+            return
+        Program.print("The most critical lines that can be closed, by the total time added to journeys between all pairs of stations:")
+        Program.__display_histogram(histogram_data, "Line", "Total time added (minutes)")
+
     @staticmethod
     def __command_start(args: List[str], show_help = False) -> None:
         """Sets the start node."""
@@ -277,6 +743,39 @@ class Program:
         Program.__end_node = node
         Program.print("The end station is now ", (f"'{Program.__get_tag(Program.__end_node)}'", 'green'), ".")
 
+    @staticmethod
+    def __command_meet(args: List[str], show_help = False) -> None:
+        """Finds the best station for a group of people to meet at."""
+        if show_help:
+            Program.print("Finds the best station for a group of people starting at different stations to meet at, taking line closures into account.")
+            Program.print("Usage:")
+            Program.print(("meet max", 'yellow'), (" [station1] [station2]", 'magenta'), (" <station>...", 'cyan'), "\n\tFinds the station with the shortest longest journey from any of the stations.")
+            Program.print(("meet sum", 'yellow'), (" [station1] [station2]", 'magenta'), (" <station>...", 'cyan'), "\n\tFinds the station with the shortest total journey time from all of the stations.")
+            return
+
+        from tubemap.algorithms.tubemap_meeting_point_searcher import TubemapMeetingPointSearcher
+        if len(args) < 3 or args[0] not in TubemapMeetingPointSearcher.OBJECTIVES:
+            Program.print((f"Invalid syntax.", 'red'))
+            return
+
+        origins: List[TubemapNode] = []
+        for arg in args[1:]:
+            node = Program.__get_node_from_label_or_id(arg)
+            if node is None:
+                Program.print((f"Invalid station", 'red'), (f" '{arg}'", 'green'), (f".", 'red'))
+                return
+            origins.append(node)
+
+        result = TubemapMeetingPointSearcher.find_meeting_point(Program.__get_graph(), origins, args[0])
+        if result is None:
+            Program.print((f"There is no station that can be reached from all of the stations.", 'red'))
+            return
+
+        meeting_node, score, weights = result
+        Program.print("The best station to meet at is ", (f"'{Program.__get_tag(meeting_node)}'", 'green'), " with a", (" longest" if args[0] == "max" else " total", 'cyan'), " journey time of ", (f"{score} minutes", 'cyan'), ".")
+        for origin, weight in zip(origins, weights):
+            Program.print("- From ", (f"'{Program.__get_tag(origin)}'", 'green'), ": ", (f"{weight} minutes", 'cyan'))
+
     @staticmethod
     def __command_algorithm(args: List[str], show_help = False) -> None:
         """Sets the algorithm to use."""
@@ -302,6 +801,51 @@ class Program:
         else:
             Program.print((f"Invalid algorithm.", 'red'))
 
+    @staticmethod
+    def __command_interchange(args: List[str], show_help = False) -> None:
+        """Sets the interchange penalty used by the interchange algorithm."""
+        if show_help:
+            Program.print("Sets the time added to a journey for each change of line when using the", (f" '{Program.__ALGORITHMS[2]}'", 'cyan'), " algorithm.")
+            Program.print("Usage:")
+            Program.print(("interchange", 'yellow'), "\n\tShows the current interchange penalty.")
+            Program.print(("interchange", 'yellow'), (" [minutes]", 'magenta'), "\n\tSets the interchange penalty.")
+            return
+
+        _, TubemapInterchangeDijkstrasAlgorithm = TubemapAlgorithmRegistry.get("Dijkstra Interchange")
+        if len(args) < 1:
+            Program.print("The interchange penalty is ", (f"{TubemapInterchangeDijkstrasAlgorithm.interchange_penalty} minutes", 'cyan'), ".")
+            return
+
+        if not args[0].isdigit():
+            Program.print((f"Invalid number of minutes.", 'red'))
+            return
+
+        TubemapInterchangeDijkstrasAlgorithm.interchange_penalty = int(args[0])
+        Program.print("The interchange penalty is now ", (f"{TubemapInterchangeDijkstrasAlgorithm.interchange_penalty} minutes", 'cyan'), ".")
+
+    @staticmethod
+    def __command_compression(args: List[str], show_help = False) -> None:
+        """Enables or disables searching on the compressed graph."""
+        if show_help:
+            Program.print("Enables or disables searching on the compressed graph, where chains of pass-through stations are contracted into a single edge.")
+            Program.print("Usage:")
+            Program.print(("compression", 'yellow'), "\n\tShows if compression is enabled and the size of the compressed graph.")
+            Program.print(("compression on", 'yellow'), "\n\tEnables compression.")
+            Program.print(("compression off", 'yellow'), "\n\tDisables compression.")
+            return
+
+        if len(args) < 1:
+            Program.print("Compression is", (" enabled", 'green') if Program.__use_compression else (" disabled", 'red'), ".")
+            Program.print("The compressed graph has ", (f"{len(Program.__compressed_graph.nodes)}", 'cyan'), " of ", (f"{len(Program.__graph.nodes)}", 'cyan'), " stations and ", (f"{len(Program.__compressed_graph.edge_list)}", 'cyan'), " of ", (f"{len(Program.__graph.edge_list)}", 'cyan'), " lines.")
+        elif args[0] == "on":
+            Program.__use_compression = True
+            Program.print("Compression is now", (" enabled", 'green'), ".")
+        elif args[0] == "off":
+            Program.__use_compression = False
+            Program.print("Compression is now", (" disabled", 'red'), ".")
+        else:
+            Program.print((f"Invalid syntax.", 'red'))
+
     @staticmethod
     def __command_go(args: List[str], show_help = False) -> None:
         """Finds the shortest route between the set start and end nodes using the specified algorithm."""
@@ -320,25 +864,35 @@ class Program:
             Program.print((f"The start and end stations are the same.", 'red'))
             return
 
-        if not TubemapGraphSearcher.is_path_available(Program.__graph, Program.__start_node, Program.__end_node):
+        graph = Program.__get_graph()
+        start_node = graph.nodes[Program.__start_node.id]
+        end_node = graph.nodes[Program.__end_node.id]
+        from tubemap.algorithms.tubemap_graph_searcher import TubemapGraphSearcher
+        component_index: TubemapComponentIndex | None = Program.__get_warmup_index("components")
+        if not (component_index.is_path_available(start_node, end_node) if component_index is not None else TubemapGraphSearcher.is_path_available(graph, start_node, end_node)):
             Program.print((f"No route is available between the start and end stations.", 'red'))
             return
 
-        base_algorithm: AAlgorithm = None
-        tubemap_algorithm: AAlgorithm = None
-        if Program.__algorithm == 0:
-            base_algorithm = DijkstrasAlgorithm
-            tubemap_algorithm = TubemapDijkstrasAlgorithm
-        elif Program.__algorithm == 1:
-            base_algorithm = BellmanFordsAlgorithmDP
-            tubemap_algorithm = TubemapBellmanFordsAlgorithmDP
+        algorithm_name = Program.__ALGORITHMS[Program.__algorithm]
+        base_algorithm: AAlgorithm
+        tubemap_algorithm: AAlgorithm
+        base_algorithm, tubemap_algorithm = TubemapAlgorithmRegistry.get(algorithm_name)
+        if TubemapAlgorithmRegistry.is_stateful(algorithm_name):
+            #This is an instance rather than a class as it keeps its cached trees between queries.
+            tubemap_algorithm = Program.__dynamic_shortest_paths
 
         calculation_start_time = time()
-        optimal_path_part_array = base_algorithm.find_shortest_path(Program.__graph, Program.__start_node, Program.__end_node)
-        tubemap_path_part_array = tubemap_algorithm.find_shortest_path(Program.__graph, Program.__start_node, Program.__end_node)
+        optimal_path_part_array = base_algorithm.find_shortest_path(graph, start_node, end_node)
+        #The compressed graph follows the live graph, so it isn't used for scenarios (the dynamic engine falls back to a normal search for them by itself).
+        if Program.__use_compression and Program.__scenario is None:
+            tubemap_path_part_array = Program.__compressed_graph.find_shortest_path(tubemap_algorithm, start_node, end_node)
+        else:
+            tubemap_path_part_array = tubemap_algorithm.find_shortest_path(graph, start_node, end_node)
         calculation_duration = time() - calculation_start_time
         if "debug" in args:
-            Program.print((f"Calculation took {calculation_duration * 1000:.2f}ms, using {Program.__ALGORITHMS[Program.__algorithm]}'s algorithm.", 'black'))
+            _, TubemapInterchangeDijkstrasAlgorithm = TubemapAlgorithmRegistry.get("Dijkstra Interchange")
+            Program.print((f"Calculation took {calculation_duration * 1000:.2f}ms, using {algorithm_name}'s algorithm.", 'black'))
+            Program.print((f"The route changes line {TubemapInterchangeDijkstrasAlgorithm.count_interchanges(tubemap_path_part_array)} times.", 'black'))
 
         optimal_path_weight = 0
         tubemap_path_weight = 0
@@ -398,8 +952,302 @@ class Program:
             histogram_data.append((current_station, previous_edge))
         Program.__display_histogram(histogram_data, "Station", "Time between previous station (minutes)")
 
+    @staticmethod
+    def __command_alternatives(args: List[str], show_help = False) -> None:
+        """Lists alternative routes between the set start and end nodes."""
+        if show_help:
+            Program.print("Lists the quickest alternative routes between the set start and end stations, taking line closures into account.")
+            Program.print("Usage:")
+            Program.print(("alternatives", 'yellow'), "\n\tLists the 3 quickest routes.")
+            Program.print(("alternatives", 'yellow'), (" [count]", 'magenta'), "\n\tLists the specified number of quickest routes.")
+            return
+
+        if Program.__start_node is None:
+            Program.print((f"The start station has not been set.", 'red'))
+            return
+        elif Program.__end_node is None:
+            Program.print((f"The end station has not been set.", 'red'))
+            return
+        elif Program.__start_node == Program.__end_node:
+            Program.print((f"The start and end stations are the same.", 'red'))
+            return
+        elif len(args) > 0 and not args[0].isdigit():
+            Program.print((f"Invalid count.", 'red'))
+            return
+
+        from tubemap.algorithms.tubemap_k_shortest_paths import TubemapKShortestPaths
+        count = int(args[0]) if len(args) > 0 else 3
+        routes_found = 0
+        #Routes are generated lazily, so the count is checked before asking for the next one, as each route after the first costs a round of spur searches.
+        routes = TubemapKShortestPaths.iterate_shortest_paths(Program.__get_graph(), Program.__start_node, Program.__end_node)
+        while routes_found < count:
+            route = next(routes, None)
+            if route is None:
+                break
+            duration, path_part_array = route
+            routes_found += 1
+
+            lines: List[str] = []
+            for part in path_part_array:
+                if part.edge is not None and (len(lines) == 0 or lines[-1] != Program.__get_tag(part.edge)):
+                    lines.append(Program.__get_tag(part.edge))
+            Program.print((f"{routes_found}.", 'yellow'), " ", (f"{duration} minutes", 'cyan'), f", {len(path_part_array) - 1} stops via ", " > ".join(Program.build_coloured_string((line, 'cyan')) for line in lines), ".")
+
+        if routes_found == 0:
+            Program.print((f"No route is available between the start and end stations.", 'red'))
+
+    @staticmethod
+    def __command_reach(args: List[str], show_help = False) -> None:
+        """Lists the stations that can be reached from a station within a number of minutes."""
+        if show_help:
+            Program.print("Lists the stations that can be reached from a station within a number of minutes, taking line closures into account.")
+            Program.print("Usage:")
+            Program.print(("reach", 'yellow'), (" [station] [minutes]", 'magenta'), "\n\tLists the reachable stations grouped by the minute they are arrived at.")
+            return
+
+        if len(args) < 2:
+            Program.print((f"Invalid syntax.", 'red'))
+            return
+
+        node = Program.__get_node_from_label_or_id(args[0])
+        if node is None:
+            Program.print((f"Invalid station.", 'red'))
+            return
+        elif not args[1].isdigit():
+            Program.print((f"Invalid number of minutes.", 'red'))
+            return
+
+        from tubemap.algorithms.tubemap_isochrone_searcher import TubemapIsochroneSearcher
+        station_count = 0
+        #Each group is printed as soon as it has been found rather than waiting for the whole search to finish.
+        for minute, nodes in TubemapIsochroneSearcher.iterate_by_minute(Program.__get_graph(), node, int(args[1])):
+            station_count += len(nodes)
+            Program.print((f"{minute:>3} minutes", 'cyan'), ": ", ", ".join(Program.build_coloured_string((Program.__get_tag(reached_node), 'green')) for reached_node in nodes))
+        Program.print((f"{station_count}", 'cyan'), f" {'station' if station_count == 1 else 'stations'} can be reached from ", (f"'{Program.__get_tag(node)}'", 'green'), " within ", (f"{args[1]} minutes", 'cyan'), ".")
+
+    @staticmethod
+    def __command_centrality(args: List[str], show_help = False) -> None:
+        """Ranks stations or lines by how many shortest routes pass through them."""
+        if show_help:
+            Program.print("Ranks stations or lines by their betweenness centrality (how many of the quickest routes between all pairs of stations pass through them), taking line closures into account.")
+            Program.print("Usage:")
+            Program.print(("centrality stations", 'yellow'), (" <count> <samples>", 'cyan'), "\n\tShows the most critical stations, if samples is set then only that many random stations are used to estimate the result.")
+            Program.print(("centrality lines", 'yellow'), (" <count> <samples>", 'cyan'), "\n\tShows the most critical lines between stations.")
+            return
+
+        if len(args) < 1 or args[0] not in ["stations", "lines"]:
+            Program.print((f"Invalid syntax.", 'red'))
+            return
+        try:
+            count = int(args[1]) if len(args) > 1 else 10
+            samples = int(args[2]) if len(args) > 2 else None
+        except ValueError:
+            Program.print((f"Invalid syntax, count and samples must be whole numbers.", 'red'))
+            return
+        if count < 1 or (samples is not None and samples < 1):
+            Program.print((f"Invalid syntax, count and samples must be at least 1.", 'red'))
+            return
+
+        def show_progress(sources_searched: int, total_sources: int) -> None:
+            Program.print((f"Searched {sources_searched}/{total_sources} stations...", 'black'), end="\r")
+
+        from tubemap.algorithms.tubemap_betweenness_centrality import TubemapBetweennessCentrality
+        graph = Program.__get_graph()
+        calculation_start_time = time()
+        node_scores, edge_scores = TubemapBetweennessCentrality.calculate(graph, samples, progress_callback=show_progress)
+        #Pad the message so that it fully overwrites the progress line.
+        Program.print((f"Calculation took {time() - calculation_start_time:.2f}s{' (estimated from a sample)' if samples is not None else ''}.".ljust(40), 'black'))
+
+        histogram_data: List[Tuple[str, int]] = []
+        if args[0] == "stations":
+            for node_id, score in node_scores.items():
+                histogram_data.append((Program.__get_tag(graph.nodes[node_id]), round(score)))
+        else:
+            for edge_id, score in edge_scores.items():
+                node1, node2, edge = graph.edge_list[edge_id]
+                histogram_data.append((f"{Program.__get_tag(node1)} - {Program.__get_tag(node2)} ({Program.__get_tag(edge)})", round(score)))
+        histogram_data = sorted(histogram_data, key=lambda x: x[1], reverse=True)[:count]
+
+        if len(histogram_data) == 0 or histogram_data[0][1] == 0:
+            Program.print((f"No routes pass through any of the {args[0]}.", 'red'))
+            return
+        Program.__display_histogram(histogram_data, "Station" if args[0] == "stations" else "Line", "Routes passing through")
+
+    @staticmethod
+    def __command_eccentricity(args: List[str], show_help = False) -> None:
+        """Shows the longest quickest journeys on the network."""
+        if show_help:
+            Program.print("Shows the longest quickest journeys on the network, taking line closures into account.")
+            Program.print("Usage:")
+            Program.print(("eccentricity", 'yellow'), "\n\tShows the longest journey on the network (the diameter) and the most central station (the radius).")
+            Program.print(("eccentricity", 'yellow'), (" [station]", 'magenta'), "\n\tShows the longest journey from a station.")
+            Program.print("Add", (" debug", 'cyan'), " to either to show how long the calculation took.")
+            return
+
+        station_args = [arg for arg in args if arg != "debug"]
+        calculation_start_time = time()
+        if len(station_args) == 0:
+            diameter, node1, node2 = Program.__eccentricity_calculator.diameter()
+            Program.print("The longest journey on the network is between ", (f"'{Program.__get_tag(node1)}'", 'green'), " and ", (f"'{Program.__get_tag(node2)}'", 'green'), " and takes ", (f"{diameter} minutes", 'cyan'), ".")
+            radius, centre_node = Program.__eccentricity_calculator.radius()
+            Program.print("The most central station is ", (f"'{Program.__get_tag(centre_node)}'", 'green'), ", which can reach every other station within ", (f"{radius} minutes", 'cyan'), ".")
+        else:
+            node = Program.__get_node_from_label_or_id(station_args[0])
+            if node is None:
+                Program.print((f"Invalid station.", 'red'))
+                return
+            Program.print("Every station can be reached from ", (f"'{Program.__get_tag(node)}'", 'green'), " within ", (f"{Program.__eccentricity_calculator.eccentricity(node)} minutes", 'cyan'), ".")
+        if "debug" in args:
+            Program.print((f"Calculation took {(time() - calculation_start_time) * 1000:.2f}ms.", 'black'))
+
+    @staticmethod
+    def __command_times(args: List[str], show_help = False) -> None:
+        """Shows how journey times are spread across the network."""
+        BAND_SIZE = 10
+
+        if show_help:
+            Program.print("Shows how long the quickest journeys take, grouped into", (f" {BAND_SIZE} minute", 'cyan'), " bands and taking line closures into account.")
+            Program.print("Journey times are stored on disk the first time they are calculated, so running this again for the same map is instant.")
+            Program.print("Usage:")
+            Program.print(("times", 'yellow'), "\n\tShows the journey times between every pair of stations.")
+            Program.print(("times", 'yellow'), (" [station]", 'magenta'), "\n\tShows the journey times from a station to every other station.")
+            return
+
+        node = None
+        if len(args) > 0:
+            node = Program.__get_node_from_label_or_id(args[0])
+            if node is None:
+                Program.print((f"Invalid station.", 'red'))
+                return
+
+        graph = Program.__get_graph()
+        try:
+            store = Program.__get_all_pairs_store(graph)
+        except OSError as error:
+            Program.print((f"The journey time store could not be opened ({error.strerror}).", 'red'))
+            return
+
+        def show_progress(stations_searched: int, total_stations: int) -> None:
+            Program.print((f"Searched {stations_searched}/{total_stations} stations...", 'black'), end="\r")
+
+        from tubemap.algorithms.tubemap_all_pairs_store import TubemapAllPairsStore
+        calculation_start_time = time()
+        try:
+            if node is not None:
+                journey_times = [journey_time for node_id, journey_time in store.get_journey_times(graph.nodes[node.id]).items() if node_id != node.id]
+            else:
+                journey_times = [journey_time for journey_time in store.get_all_journey_times(show_progress) if journey_time != TubemapAllPairsStore.UNREACHABLE]
+        except ValueError as error:
+            #Pad the message so that it fully overwrites the progress line.
+            Program.print((f"{error}".ljust(40), 'red'))
+            return
+        #Pad the message so that it fully overwrites the progress line.
+        Program.print((f"Calculation took {(time() - calculation_start_time) * 1000:.2f}ms.".ljust(40), 'black'))
+
+        if len(journey_times) == 0:
+            Program.print((f"No other stations can be reached.", 'red'))
+            return
+        band_counts: Dict[int, int] = {}
+        for journey_time in journey_times:
+            band_counts[journey_time // BAND_SIZE] = band_counts.get(journey_time // BAND_SIZE, 0) + 1
+        #Shown as percentages, as the histogram's scale is laid out for values up to about 100.
+        histogram_data = [(f"{band * BAND_SIZE}-{band * BAND_SIZE + BAND_SIZE - 1}", round(band_counts.get(band, 0) * 100 / len(journey_times))) for band in range(max(band_counts) + 1)]
+        Program.print((f"{len(journey_times)}", 'cyan'), f" {'journey' if len(journey_times) == 1 else 'journeys'}:")
+        Program.__display_histogram(histogram_data, "Minutes", "Journeys (%)")
+
+    @staticmethod
+    def __get_all_pairs_store(graph: TubemapGraph) -> TubemapAllPairsStore:
+        """The journey time store for the graph as it is now, reopening it if the graph has changed since it was opened."""
+        from tubemap.algorithms.tubemap_all_pairs_store import TubemapAllPairsStore
+        if Program.__all_pairs_store is None or Program.__all_pairs_store.fingerprint != graph.fingerprint:
+            if Program.__all_pairs_store is not None:
+                Program.__all_pairs_store.close()
+                Program.__all_pairs_store = None
+            Program.__all_pairs_store = TubemapAllPairsStore(graph, Program.__all_pairs_directory)
+        return Program.__all_pairs_store
+
+    @staticmethod
+    def __command_warmup(args: List[str], show_help = False) -> None:
+        """Shows or cancels the indexes being built in the background."""
+        if show_help:
+            Program.print("Indexes are built in the background while the prompt is waiting for a command, until one is ready the commands that use it search directly instead.")
+            Program.print("Usage:")
+            Program.print(("warmup", 'yellow'), "\n\tShows the progress of each index.")
+            Program.print(("warmup cancel", 'yellow'), (" <index>", 'cyan'), "\n\tStops building an index (or all of them), an index that is already built is still used until the map changes.")
+            return
+
+        status = Program.__warmup.get_status()
+        if len(args) == 0:
+            STATE_COLOURS = {"waiting": 'black', "running": 'yellow', "ready": 'green', "cancelled": 'red', "failed": 'red'}
+            for name, state, done, total in status:
+                progress = f" ({done}/{total})" if state == "running" and total > 0 else ""
+                Program.print(f"- {name}: ", (f"{state}{progress}", STATE_COLOURS[state]))
+        elif args[0] == "cancel":
+            names = [name for name, _, _, _ in status] if len(args) < 2 else [" ".join(args[1:])]
+            if any(name not in Program.__WARMUP_TASKS for name in names):
+                Program.print((f"Invalid index.", 'red'))
+                return
+            cancelled_names = [name for name in names if Program.__warmup.cancel(name)]
+            Program.print(f"Cancelled {', '.join(cancelled_names)}." if len(cancelled_names) > 0 else "Nothing was being built.")
+        else:
+            Program.print((f"Invalid syntax.", 'red'))
+
+    @staticmethod
+    def __get_warmup_prompt() -> str:
+        """A short summary of the index being built, shown before the prompt until every index is ready."""
+        running = next(((name, done, total) for name, state, done, total in Program.__warmup.get_status() if state in ("waiting", "running")), None)
+        if running is None:
+            return ""
+        name, done, total = running
+        progress = f" {done * 100 // total}%" if total > 0 else ""
+        return Program.build_coloured_string((f"[warming up {name}{progress}] ", 'black'))
+
+    @staticmethod
+    def __command_scenario(args: List[str], show_help = False) -> None:
+        """Starts, promotes or discards a what-if scenario."""
+        if show_help:
+            Program.print("Tries out line closures and time changes without changing the live map.")
+            Program.print("While a scenario is active, the", (" line", 'yellow'), " and", (" go", 'yellow'), " commands use the scenario instead of the live map.")
+            Program.print("Usage:")
+            Program.print(("scenario", 'yellow'), "\n\tShows the lines that are different in the active scenario.")
+            Program.print(("scenario start", 'yellow'), "\n\tStarts a new scenario from the live map.")
+            Program.print(("scenario promote", 'yellow'), "\n\tApplies the scenario's changes to the live map and ends the scenario.")
+            Program.print(("scenario discard", 'yellow'), "\n\tEnds the scenario without applying its changes.")
+            return
+
+        if len(args) == 0:
+            if Program.__scenario is None:
+                Program.print("No scenario is active.")
+                return
+            changes = Program.__scenario.get_changes()
+            Program.print("The scenario changes ", (f"{len(changes)}", 'cyan'), f" {'line' if len(changes) == 1 else 'lines'}.")
+            for edge in changes:
+                node1, node2, scenario_edge = Program.__scenario.graph.edge_list[edge.id]
+                state = Program.build_coloured_string(("closed", 'red')) if scenario_edge.closed else Program.build_coloured_string(("open", 'green'), ", ", (f"{scenario_edge.weight} minutes", 'cyan'))
+                Program.print("- ", (f"'{Program.__get_tag(node1)}'", 'green'), " to ", (f"'{Program.__get_tag(node2)}'", 'green'), " via ", (f"'{Program.__get_tag(edge)}'", 'cyan'), f": {state}.")
+        elif len(args) == 1 and args[0] == "start":
+            if Program.__scenario is not None:
+                Program.print(("A scenario is already active.", 'red'))
+                return
+            from tubemap.core.tubemap_scenario import TubemapScenario
+            Program.__scenario = TubemapScenario(Program.__graph)
+            Program.print("Started a new scenario, changes to lines will not affect the live map until it is promoted.")
+        elif len(args) == 1 and args[0] in ["promote", "discard"]:
+            if Program.__scenario is None:
+                Program.print(("No scenario is active.", 'red'))
+                return
+            if args[0] == "promote":
+                changes = Program.__scenario.promote(Program.__on_edge_changed)
+                Program.print("Applied ", (f"{len(changes)}", 'cyan'), f" {'change' if len(changes) == 1 else 'changes'} to the live map.")
+            else:
+                Program.print("Discarded the scenario.")
+            Program.__scenario = None
+        else:
+            Program.print((f"Invalid syntax.", 'red'))
+
     @staticmethod
     def __command_gui(args: List[str], show_help = False) -> None:
+        from webserver import Webserver
         WEBSERVER_ADDRESS = f"http://{Webserver.HOSTNAME}:{Webserver.PORT}"
         webserver_address_message = Program.build_coloured_string((WEBSERVER_ADDRESS, 'blue'))
         json_data_info = Program.build_coloured_string("The data used for this program can be loaded from", (" './tubemap.json'", 'cyan'), ".")
@@ -410,7 +1258,9 @@ class Program:
             Program.print("Usage:")
             Program.print(("gui", 'yellow'), "\n\tReturns the URL of the webserver if it is running.")
             Program.print(("gui start", 'yellow'), "\n\tStarts the webserver.")
+            Program.print(("gui start", 'yellow'), (" <processes>", 'cyan'), "\n\tStarts the webserver, the routes in each", (" /api/batch", 'cyan'), " are found by that many processes sharing the map.")
             Program.print(("gui stop", 'yellow'), "\n\tStops the webserver.")
+            Program.print("While the webserver is running, routes can also be queried as JSON from", (" /api/route", 'cyan'), ",", (" /api/reach", 'cyan'), " and", (" /api/batch", 'cyan'), ".")
             return
 
         if len(args) == 0:
@@ -420,10 +1270,20 @@ class Program:
             else:
                 state_message = Program.build_coloured_string((f" not running", 'red'), ".")
             Program.print(f"The webserver is{state_message}")
-        elif len(args) == 1:
+        elif len(args) == 1 or len(args) == 2 and args[0] == "start":
             if args[0] == "start":
                 if Program.__stop_webserver_callback is None:
-                    Program.__stop_webserver_callback = Webserver.run()
+                    route_processes = None
+                    if len(args) == 2:
+                        if not args[1].isdigit() or int(args[1]) == 0:
+                            Program.print((f"The number of processes must be a whole number greater than 0.", 'red'))
+                            return
+                        route_processes = int(args[1])
+                    try:
+                        Program.__stop_webserver_callback = Webserver.run(Program.__graph, route_processes=route_processes)
+                    except OSError as error:
+                        Program.print((f"The webserver could not be started ({error.strerror}).", 'red'))
+                        return
                     Program.print(f"Webserver started at: {webserver_address_message}")
                     Program.print(json_data_info)
                     os.system(f"start http://{Webserver.HOSTNAME}:{Webserver.PORT}")
@@ -458,8 +1318,49 @@ class Program:
             Program.print("Exiting...")
             if Program.__stop_webserver_callback is not None:
                 Program.__stop_webserver_callback()
+            if Program.__warmup is not None:
+                Program.__warmup.stop()
+            if Program.__all_pairs_store is not None:
+                Program.__all_pairs_store.close()
             exit()
 
+    @staticmethod
+    def __on_edge_changed(edge: TubemapEdge) -> None:
+        """Updates any cached routing state after an edge has been opened, closed or had its time changed."""
+        Program.__compressed_graph.update_edge(edge)
+        Program.__dynamic_shortest_paths.update_edge(edge)
+        if Program.__stop_webserver_callback is not None:
+            from webserver import Webserver
+            Webserver.publish_graph()
+
+        #Nothing is saved in read only mode (see __read_only).
+        if Program.__journal is None:
+            return
+        try:
+            Program.__journal.record_edge(edge)
+        except OSError:
+            Program.print(("The change could not be saved to the journal.", 'red'))
+            return
+        if Program.__journal.record_count >= TubemapJournal.COMPACTION_THRESHOLD:
+            try:
+                Program.__journal.compact(Program.__graph, Program.__save_graph)
+            except (OSError, OverflowError, ValueError) as error:
+                #The journal is left as it was, so nothing is lost and compaction is tried again after the next change.
+                Program.print((f"The journal could not be compacted ({error}), the changes are still saved in the journal.", 'red'))
+
+    @staticmethod
+    def __save_graph() -> None:
+        """
+        Writes the live graph to the snapshot for the journal to be compacted into, the graph file itself is never changed (e.g. the web GUI reads tubemap.json).
+        The snapshot keeps the fingerprint of the graph file it came from, so it is still used (with the compacted changes) until the graph file's content changes.
+        """
+        TubemapSnapshot.write(Program.__graph, Program.__SNAPSHOT_PATH, Program.__source_fingerprint)
+
+    @staticmethod
+    def __get_graph() -> TubemapGraph:
+        """The graph that commands should work on, the active scenario's view if there is one, otherwise the live graph."""
+        return Program.__scenario.graph if Program.__scenario is not None else Program.__graph
+
     @staticmethod
     def __get_node(predicate: Callable[[TubemapNode], bool]) -> TubemapNode | None:
         """Finds the first node in a graph matching against a predicate."""
@@ -471,6 +1372,9 @@ class Program:
     @staticmethod
     def __get_node_from_label_or_id(tag: str) -> TubemapNode | None:
         """Finds the first node in a graph matching against a label or ID."""
+        station_index: Dict[str, TubemapNode] | None = Program.__warmup.get("stations") if Program.__warmup is not None else None
+        if station_index is not None and tag.lower() in station_index:
+            return station_index[tag.lower()]
         return Program.__get_node(lambda node: node.label.strip().lower() == tag.lower() or node.id == tag)
 
     @staticmethod
@@ -522,7 +1426,9 @@ class Program:
         """Builds a string with colour."""
         string = ""
         for item in items:
-            if isinstance(item, tuple):
+            if isinstance(item, tuple) and not Program.__use_colour:
+                string += f"{item[0]}"
+            elif isinstance(item, tuple):
                 string += f"{Program.get_colour_string(item[1])}{item[0]}{Program.get_colour_string()}"
             else:
                 string += item
@@ -531,6 +1437,11 @@ class Program:
     @staticmethod
     def print(*items: Tuple[Any, str] | str, end: str = "\n") -> None:
         """Prints a string with colour."""
+        if Program.__output is not None:
+            #Progress messages (which are overwritten by the next message) are left out of the collected output.
+            if end != "\r":
+                Program.__output.append(Program.build_coloured_string(*items) + end)
+            return
         print(Program.build_coloured_string(*items), end = end)
 
     @staticmethod
@@ -629,4 +1540,4 @@ class Program:
             #endregion
 
 if __name__ == "__main__":
-    Program.Main()
+    Program.Main(sys.argv[1:])
@@ -1,7 +1,29 @@
 #Because python's module resolution is $H1T I've moved all of the test instantiaters to this file so that the module resolutions don't conflict with how I've setup the main.py file.
 
+from typing import Any, Dict, List, Tuple
+from tempfile import TemporaryDirectory
+from threading import Event, Thread
+import gzip
+import http.client
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import time
 from core.graph import Graph, SerializedGraph
-from algorithms.algorithm_tests import AlgorithmTests
+from algorithms.algorithm_tests import AlgorithmTests, _TestHelpers
+from tubemap.core.tubemap_graph import TubemapGraph, SerializedTubemapGraph
+from tubemap.core.tubemap_snapshot import TubemapSnapshot
+from tubemap.core.tubemap_csv_loader import TubemapCSVLoader
+from tubemap.core.tubemap_journal import TubemapJournal
+from tubemap.core.tubemap_scenario import TubemapScenario
+from tubemap.algorithms.tubemap_dijkstras_algorithm import TubemapDijkstrasAlgorithm
+from tubemap.core.tubemap_shared_graph import TubemapSharedGraph
+from tubemap.algorithms.tubemap_shared_route_pool import TubemapSharedRoutePool
+from webserver import Webserver, _RequestCoalescer
 
 class JsonTests:
     @staticmethod
@@ -15,7 +37,791 @@ class JsonTests:
         loaded_graph = SerializedGraph.load_from_file("./test_graph.json")
         return #This line is here to place a breakpoint on so that I can see the result before the method returns.
 
+class TubemapFormatTests:
+    """Every format a graph can be saved in must load back as the same graph, labels included (the fingerprint doesn't cover the labels)."""
+    @staticmethod
+    def run() -> None:
+        print(TubemapFormatTests.__name__)
+        TubemapFormatTests._test_compact_json()
+        TubemapFormatTests._test_original_json()
+        TubemapFormatTests._test_snapshot()
+        TubemapFormatTests._test_truncated_snapshot()
+        TubemapFormatTests._test_csv_loader()
+
+    @staticmethod
+    def __get_labels(graph: TubemapGraph) -> Tuple[List[Tuple[int, str]], List[Tuple[int, str]]]:
+        return sorted((node.id, node.label) for node in graph.nodes.values()), sorted((edge.id, edge.label) for _, _, edge in graph.edge_list.values())
+
+    @staticmethod
+    def __evaluate_round_trip(graph: TubemapGraph, loaded_graph: TubemapGraph) -> None:
+        _TestHelpers.evaluate_result(graph.fingerprint, loaded_graph.fingerprint)
+        _TestHelpers.evaluate_result("Same labels", "Same labels" if TubemapFormatTests.__get_labels(graph) == TubemapFormatTests.__get_labels(loaded_graph) else "Different labels")
+
+    @staticmethod
+    def _test_compact_json() -> None:
+        print(TubemapFormatTests._test_compact_json.__name__)
+        graph = _TestHelpers.build_random_tubemap_graph(1)
+        with TemporaryDirectory() as directory:
+            for file_name in ["graph.json", "graph.json.gz", "graph.json.xz"]:
+                file_path = os.path.join(directory, file_name)
+                graph.save_to_file(file_path)
+                TubemapFormatTests.__evaluate_round_trip(graph, SerializedTubemapGraph.load_from_file(file_path))
+
+    @staticmethod
+    def _test_original_json() -> None:
+        print(TubemapFormatTests._test_original_json.__name__)
+        graph = _TestHelpers.build_random_tubemap_graph(2)
+        with TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "graph.json")
+            graph.serialize().save_to_file(file_path)
+            TubemapFormatTests.__evaluate_round_trip(graph, SerializedTubemapGraph.load_from_file(file_path))
+
+    @staticmethod
+    def _test_snapshot() -> None:
+        print(TubemapFormatTests._test_snapshot.__name__)
+        graph = _TestHelpers.build_random_tubemap_graph(3)
+        with TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "graph.snapshot")
+            TubemapSnapshot.write(graph, file_path)
+            with TubemapSnapshot(file_path) as snapshot:
+                loaded_graph = snapshot.to_graph()
+                TubemapFormatTests.__evaluate_round_trip(graph, loaded_graph)
+            #The loaded graph's fingerprint comes from the header, so check it against hashing the graph and that it still follows changes.
+            _TestHelpers.evaluate_result(loaded_graph._calculate_fingerprint(), loaded_graph.fingerprint)
+            edge = next(iter(loaded_graph.edge_list.values()))[2]
+            edge.weight += 1
+            _TestHelpers.evaluate_result(loaded_graph._calculate_fingerprint(), loaded_graph.fingerprint)
+        with TubemapSnapshot(buffer=TubemapSnapshot.to_bytes(graph)) as snapshot:
+            TubemapFormatTests.__evaluate_round_trip(graph, snapshot.to_graph())
+
+    @staticmethod
+    def _test_truncated_snapshot() -> None:
+        """A snapshot that was cut short is rejected with a ValueError (so the JSON is loaded instead) rather than failing part way through reading it."""
+        print(TubemapFormatTests._test_truncated_snapshot.__name__)
+        snapshot_bytes = TubemapSnapshot.to_bytes(_TestHelpers.build_random_tubemap_graph(3))
+        lengths = [0, 16, 200, len(snapshot_bytes) // 2, len(snapshot_bytes) - 8]
+        results = []
+        for length in lengths:
+            try:
+                with TubemapSnapshot(buffer=snapshot_bytes[:length]) as snapshot:
+                    snapshot.to_graph()
+                results.append("Loaded")
+            except ValueError:
+                results.append("ValueError")
+        _TestHelpers.evaluate_result(["ValueError"] * len(lengths), results)
+
+    @staticmethod
+    def _test_csv_loader() -> None:
+        print(TubemapFormatTests._test_csv_loader.__name__)
+        rows = [
+            ["Red", "A", "", ""],
+            ["Red", "A", "B", "2"],
+            ["Red", "B", "A", "2"],
+            ["Blue", "A", "B", "3"],
+            [" Blue", "B ", "C", "4"],
+            ["", "C", "D", "1"],
+            []
+        ]
+        warnings: List[str] = []
+        graph = TubemapCSVLoader.load_from_rows(rows, warnings)
+        _TestHelpers.evaluate_result(["A", "B", "C"], [node.label for node in graph.nodes.values()])
+        _TestHelpers.evaluate_result([("A", "B", 2, "Red"), ("A", "B", 3, "Blue"), ("B", "C", 4, "Blue")], [(node1.label, node2.label, edge.weight, edge.label) for node1, node2, edge in graph.edge_list.values()])
+        _TestHelpers.evaluate_result(["Row 6 joins 'C' and 'D' without naming a line, so it was skipped."], warnings)
+        #Loading the same rows again must give the same IDs.
+        _TestHelpers.evaluate_result(graph.fingerprint, TubemapCSVLoader.load_from_rows(rows).fingerprint)
+
+        csv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tools", "london_underground_data.csv")
+        if os.path.exists(csv_path):
+            graph = TubemapCSVLoader.load_from_file(csv_path)
+            _TestHelpers.evaluate_result(376, len(graph.edge_list))
+
+class TubemapJournalTests:
+    """Each test records changes to one graph and replays the journal onto a fresh copy of it, as happens when the program is restarted."""
+    SEED = 4
+
+    @staticmethod
+    def run() -> None:
+        print(TubemapJournalTests.__name__)
+        TubemapJournalTests._test_replay()
+        TubemapJournalTests._test_structural_changes()
+        TubemapJournalTests._test_truncated_record()
+        TubemapJournalTests._test_invalid_record()
+        TubemapJournalTests._test_other_graph()
+        TubemapJournalTests._test_read_only()
+        TubemapJournalTests._test_compact()
+        TubemapJournalTests._test_failed_compact()
+
+    @staticmethod
+    def __record_changes(journal_path: str, change_count: int) -> TubemapGraph:
+        """Records some changes to the graph and returns the changed graph."""
+        graph = _TestHelpers.build_random_tubemap_graph(TubemapJournalTests.SEED)
+        journal = TubemapJournal(journal_path)
+        journal.replay(graph)
+        for _, _, edge in list(graph.edge_list.values())[:change_count]:
+            edge.closed = not edge.closed
+            edge.weight += 1
+            journal.record_edge(edge)
+        journal.close()
+        return graph
+
+    @staticmethod
+    def __replay(journal_path: str, read_only: bool = False) -> Tuple[TubemapGraph, TubemapJournal, int]:
+        graph = _TestHelpers.build_random_tubemap_graph(TubemapJournalTests.SEED)
+        journal = TubemapJournal(journal_path)
+        record_count = journal.replay(graph, read_only)
+        return graph, journal, record_count
+
+    @staticmethod
+    def _test_replay() -> None:
+        print(TubemapJournalTests._test_replay.__name__)
+        with TemporaryDirectory() as directory:
+            journal_path = os.path.join(directory, "graph.journal")
+            changed_graph = TubemapJournalTests.__record_changes(journal_path, 5)
+            graph, journal, record_count = TubemapJournalTests.__replay(journal_path)
+            _TestHelpers.evaluate_result(5, record_count)
+            _TestHelpers.evaluate_result(changed_graph.fingerprint, graph.fingerprint)
+            _TestHelpers.evaluate_result(None, journal.warning)
+
+    @staticmethod
+    def _test_structural_changes() -> None:
+        """Nodes and edges added and removed are replayed in order, and an edge whose end point doesn't exist stops the replay."""
+        print(TubemapJournalTests._test_structural_changes.__name__)
+        with TemporaryDirectory() as directory:
+            journal_path = os.path.join(directory, "graph.journal")
+            graph = _TestHelpers.build_random_tubemap_graph(TubemapJournalTests.SEED)
+            journal = TubemapJournal(journal_path)
+            journal.replay(graph)
+            node1, node2 = list(graph.nodes.values())[:2]
+            new_node = graph.add_node(1000)
+            new_node.label = "New Station"
+            journal.record_add_node(new_node)
+            for node in [node1, node2]:
+                new_edge = graph.add_edge(node, new_node, 4, 1000 + node.id)
+                new_edge.label = "New Line"
+                journal.record_add_edge(node, new_node, new_edge)
+            removed_edge = next(iter(graph.edge_list.values()))[2]
+            graph.remove_edge(removed_edge)
+            journal.record_remove_edge(removed_edge)
+            removed_node = list(graph.nodes.values())[5]
+            graph.remove_node(removed_node)
+            journal.record_remove_node(removed_node)
+            journal.close()
+
+            replayed_graph, journal, record_count = TubemapJournalTests.__replay(journal_path)
+            _TestHelpers.evaluate_result(5, record_count)
+            _TestHelpers.evaluate_result(graph.fingerprint, replayed_graph.fingerprint)
+            _TestHelpers.evaluate_result(("New Station", "New Line"), (replayed_graph.nodes[1000].label, replayed_graph.edge_list[1000 + node1.id][2].label))
+            _TestHelpers.evaluate_result((False, False), (removed_node.id in replayed_graph.nodes, removed_edge.id in replayed_graph.edge_list))
+
+            with open(journal_path, "ab") as file:
+                file.write(b'{"op":"add_edge","id":2000,"node1":1000,"node2":99999,"weight":1,"label":"","closed":false}\n')
+            replayed_graph, journal, record_count = TubemapJournalTests.__replay(journal_path)
+            _TestHelpers.evaluate_result((5, graph.fingerprint), (record_count, replayed_graph.fingerprint))
+            _TestHelpers.evaluate_result("Change 6 in the journal is not valid, so it and any changes after it were not replayed.", journal.warning)
+
+    @staticmethod
+    def _test_truncated_record() -> None:
+        """A record cut off part way through is dropped and cut from the file, and new records go after the last complete one."""
+        print(TubemapJournalTests._test_truncated_record.__name__)
+        with TemporaryDirectory() as directory:
+            journal_path = os.path.join(directory, "graph.journal")
+            TubemapJournalTests.__record_changes(journal_path, 4)
+            expected_graph = TubemapJournalTests.__record_changes(os.path.join(directory, "expected.journal"), 3)
+            with open(journal_path, "rb") as file:
+                lines = file.readlines()
+            with open(journal_path, "r+b") as file:
+                file.truncate(sum(len(line) for line in lines[:-1]) + len(lines[-1]) // 2)
+
+            graph, journal, record_count = TubemapJournalTests.__replay(journal_path)
+            _TestHelpers.evaluate_result(3, record_count)
+            _TestHelpers.evaluate_result(expected_graph.fingerprint, graph.fingerprint)
+            _TestHelpers.evaluate_result("The last change in the journal was only partly written, so it was not replayed.", journal.warning)
+            _TestHelpers.evaluate_result(sum(len(line) for line in lines[:-1]), os.path.getsize(journal_path))
+
+            edge = next(iter(graph.edge_list.values()))[2]
+            edge.weight += 10
+            journal.record_edge(edge)
+            journal.close()
+            replayed_graph, journal, record_count = TubemapJournalTests.__replay(journal_path)
+            _TestHelpers.evaluate_result(4, record_count)
+            _TestHelpers.evaluate_result(graph.fingerprint, replayed_graph.fingerprint)
+
+    @staticmethod
+    def _test_invalid_record() -> None:
+        """Replaying stops at a record that isn't a valid change, without applying it or anything after it."""
+        print(TubemapJournalTests._test_invalid_record.__name__)
+        with TemporaryDirectory() as directory:
+            journal_path = os.path.join(directory, "graph.journal")
+            TubemapJournalTests.__record_changes(journal_path, 4)
+            expected_graph = TubemapJournalTests.__record_changes(os.path.join(directory, "expected.journal"), 2)
+            with open(journal_path, "rb") as file:
+                lines = file.readlines()
+            lines[3] = lines[3].replace(b'"weight":', b'"weight":"').replace(b',"closed"', b'","closed"')
+            with open(journal_path, "wb") as file:
+                file.writelines(lines)
+
+            graph, journal, record_count = TubemapJournalTests.__replay(journal_path)
+            _TestHelpers.evaluate_result(2, record_count)
+            _TestHelpers.evaluate_result(expected_graph.fingerprint, graph.fingerprint)
+            _TestHelpers.evaluate_result("Change 3 in the journal is not valid, so it and any changes after it were not replayed.", journal.warning)
+
+    @staticmethod
+    def _test_other_graph() -> None:
+        """A journal made against a different graph isn't replayed, and is moved aside so that it isn't lost."""
+        print(TubemapJournalTests._test_other_graph.__name__)
+        with TemporaryDirectory() as directory:
+            journal_path = os.path.join(directory, "graph.journal")
+            TubemapJournalTests.__record_changes(journal_path, 3)
+            graph = _TestHelpers.build_random_tubemap_graph(TubemapJournalTests.SEED + 1)
+            fingerprint = graph.fingerprint
+            journal = TubemapJournal(journal_path)
+            _TestHelpers.evaluate_result(0, journal.replay(graph))
+            _TestHelpers.evaluate_result(fingerprint, graph.fingerprint)
+            _TestHelpers.evaluate_result((False, True), (os.path.exists(journal_path), os.path.exists(journal_path + TubemapJournal.REJECTED_SUFFIX)))
+            _TestHelpers.evaluate_result(True, journal.warning is not None)
+
+    @staticmethod
+    def _test_read_only() -> None:
+        """A read only replay applies the same changes but leaves the file exactly as it was, even when it has to drop a record."""
+        print(TubemapJournalTests._test_read_only.__name__)
+        with TemporaryDirectory() as directory:
+            journal_path = os.path.join(directory, "graph.journal")
+            changed_graph = TubemapJournalTests.__record_changes(journal_path, 3)
+            with open(journal_path, "ab") as file:
+                file.write(b'{"op":"edge","id":')
+            with open(journal_path, "rb") as file:
+                journal_bytes = file.read()
+
+            graph, journal, record_count = TubemapJournalTests.__replay(journal_path, read_only=True)
+            _TestHelpers.evaluate_result(3, record_count)
+            _TestHelpers.evaluate_result(changed_graph.fingerprint, graph.fingerprint)
+            with open(journal_path, "rb") as file:
+                _TestHelpers.evaluate_result("Unchanged", "Unchanged" if file.read() == journal_bytes else "Changed")
+
+    @staticmethod
+    def _test_compact() -> None:
+        """After compaction the graph file holds every change and the journal is empty and based on the compacted graph."""
+        print(TubemapJournalTests._test_compact.__name__)
+        with TemporaryDirectory() as directory:
+            journal_path = os.path.join(directory, "graph.journal")
+            graph_path = os.path.join(directory, "graph.json")
+            TubemapJournalTests.__record_changes(journal_path, 3)
+            graph, journal, _ = TubemapJournalTests.__replay(journal_path)
+            journal.compact(graph, lambda: graph.save_to_file(graph_path))
+            _TestHelpers.evaluate_result((0, 0), (journal.record_count, os.path.getsize(journal_path)))
+
+            edge = next(iter(graph.edge_list.values()))[2]
+            edge.closed = not edge.closed
+            journal.record_edge(edge)
+            journal.close()
+            loaded_graph = SerializedTubemapGraph.load_from_file(graph_path)
+            journal = TubemapJournal(journal_path)
+            _TestHelpers.evaluate_result(1, journal.replay(loaded_graph))
+            _TestHelpers.evaluate_result(graph.fingerprint, loaded_graph.fingerprint)
+
+    @staticmethod
+    def _test_failed_compact() -> None:
+        """If the graph can't be written, the journal is left as it was and can still be recorded to."""
+        print(TubemapJournalTests._test_failed_compact.__name__)
+        with TemporaryDirectory() as directory:
+            journal_path = os.path.join(directory, "graph.journal")
+            TubemapJournalTests.__record_changes(journal_path, 3)
+            graph, journal, _ = TubemapJournalTests.__replay(journal_path)
+
+            def write_graph() -> None:
+                raise OSError("The disk is full.")
+            try:
+                journal.compact(graph, write_graph)
+            except OSError:
+                pass
+            edge = next(iter(graph.edge_list.values()))[2]
+            edge.weight += 1
+            journal.record_edge(edge)
+            journal.close()
+            replayed_graph, journal, record_count = TubemapJournalTests.__replay(journal_path)
+            _TestHelpers.evaluate_result((4, graph.fingerprint), (record_count, replayed_graph.fingerprint))
+
+class TubemapScenarioTests:
+    """A scenario must see the graph as it was when the scenario was made plus its own changes, and nothing else, until it is promoted."""
+    SEED = 5
+
+    @staticmethod
+    def run() -> None:
+        print(TubemapScenarioTests.__name__)
+        TubemapScenarioTests._test_isolation()
+        TubemapScenarioTests._test_routes()
+        TubemapScenarioTests._test_promote()
+
+    @staticmethod
+    def __change_edges(scenario_or_graph: TubemapScenario | TubemapGraph, edges: List, weight_change: int) -> None:
+        for edge in edges:
+            if isinstance(scenario_or_graph, TubemapScenario):
+                scenario_or_graph.set_closed(edge, not scenario_or_graph.is_closed(edge))
+                scenario_or_graph.set_weight(edge, scenario_or_graph.get_weight(edge) + weight_change)
+            else:
+                edge.closed = not edge.closed
+                edge.weight += weight_change
+
+    @staticmethod
+    def _test_isolation() -> None:
+        """Changes to the graph after the scenario was made, and changes to a fork, don't show through."""
+        print(TubemapScenarioTests._test_isolation.__name__)
+        graph = _TestHelpers.build_random_tubemap_graph(TubemapScenarioTests.SEED)
+        edges = [edge for _, _, edge in graph.edge_list.values()]
+        fingerprint = graph.fingerprint
+        scenario = TubemapScenario(graph)
+        TubemapScenarioTests.__change_edges(graph, edges[:10], 3)
+        _TestHelpers.evaluate_result(fingerprint, scenario.to_graph().fingerprint)
+        _TestHelpers.evaluate_result(fingerprint, scenario.graph.fingerprint)
+
+        TubemapScenarioTests.__change_edges(scenario, edges[10:15], 2)
+        scenario_fingerprint = scenario.graph.fingerprint
+        fork = scenario.fork()
+        TubemapScenarioTests.__change_edges(fork, edges[15:20], 1)
+        _TestHelpers.evaluate_result(scenario_fingerprint, scenario.graph.fingerprint)
+        _TestHelpers.evaluate_result(True, fork.graph.fingerprint != scenario_fingerprint)
+
+    @staticmethod
+    def _test_routes() -> None:
+        """Searching the scenario's view of the graph gives the same journey times as searching a graph with the scenario's changes made directly."""
+        print(TubemapScenarioTests._test_routes.__name__)
+        graph = _TestHelpers.build_random_tubemap_graph(TubemapScenarioTests.SEED)
+        edges = [edge for _, _, edge in graph.edge_list.values()]
+        scenario = TubemapScenario(graph)
+        TubemapScenarioTests.__change_edges(scenario, edges[::4], 4)
+        TubemapScenarioTests.__change_edges(graph, edges[1::4], 2)
+        scenario_graph = _TestHelpers.build_random_tubemap_graph(TubemapScenarioTests.SEED)
+        TubemapScenarioTests.__change_edges(scenario_graph, [edge for _, _, edge in scenario_graph.edge_list.values()][::4], 4)
+        _TestHelpers.evaluate_result(scenario_graph.fingerprint, scenario.to_graph().fingerprint)
+
+        node_ids = list(graph.nodes.keys())
+        pairs = [(start_id, end_id) for start_id in node_ids[::5] for end_id in node_ids[::3] if start_id != end_id]
+        expected_weights = _TestHelpers.get_baseline_weights(scenario_graph, pairs)
+        mismatches = 0
+        for start_id, end_id in pairs:
+            start_node, end_node = scenario.graph.nodes[start_id], scenario.graph.nodes[end_id]
+            weight = None
+            if expected_weights[(start_id, end_id)] is not None:
+                weight = _TestHelpers.get_path_weight(TubemapDijkstrasAlgorithm.find_shortest_path(scenario.graph, start_node, end_node))
+            mismatches += weight != expected_weights[(start_id, end_id)]
+        _TestHelpers.evaluate_result("0 mismatches", f"{mismatches} mismatches")
+
+    @staticmethod
+    def _test_promote() -> None:
+        """Promoting writes the scenario's state to the graph and reports each changed edge once."""
+        print(TubemapScenarioTests._test_promote.__name__)
+        graph = _TestHelpers.build_random_tubemap_graph(TubemapScenarioTests.SEED)
+        edges = [edge for _, _, edge in graph.edge_list.values()]
+        scenario = TubemapScenario(graph)
+        TubemapScenarioTests.__change_edges(scenario, edges[:6], 5)
+        expected_fingerprint = scenario.to_graph().fingerprint
+        changed_edge_ids: List[int] = []
+        changes = scenario.promote(lambda edge: changed_edge_ids.append(edge.id))
+        _TestHelpers.evaluate_result(expected_fingerprint, graph.fingerprint)
+        _TestHelpers.evaluate_result(sorted(edge.id for edge in edges[:6]), sorted(changed_edge_ids))
+        _TestHelpers.evaluate_result(6, len(changes))
+        _TestHelpers.evaluate_result([], scenario.get_changes())
+
+class CompactionTests:
+    """Runs the interactive program in a separate process until the journal is compacted, from a directory holding only a copy of the graph."""
+    @staticmethod
+    def run() -> None:
+        print(CompactionTests.__name__)
+        CompactionTests._test_compaction()
+
+    @staticmethod
+    def __get_line_info(source_directory: str, directory: str) -> str:
+        process = subprocess.run([sys.executable, os.path.join(source_directory, "main.py"), "batch"], input='line info "Baker Street" "Bond Street" Jubilee\n', capture_output=True, text=True, encoding="utf-8", cwd=directory)
+        return json.loads(process.stdout)["output"][0]
+
+    @staticmethod
+    def _test_compaction() -> None:
+        """Compaction goes into the snapshot and leaves the graph file (which the web GUI reads) exactly as it was, the changes survive a restart and the graph file being touched."""
+        print(CompactionTests._test_compaction.__name__)
+        source_directory = os.path.dirname(os.path.abspath(__file__))
+        change_count = TubemapJournal.COMPACTION_THRESHOLD + 1
+        commands = [f'line time "Baker Street" "Bond Street" Jubilee {10 + i % 5}' for i in range(change_count)] + ["exit"]
+        with TemporaryDirectory() as directory:
+            graph_path = os.path.join(directory, "tubemap.json")
+            shutil.copyfile(os.path.join(source_directory, "tubemap.json"), graph_path)
+            with open(graph_path, "rb") as file:
+                graph_bytes = file.read()
+            subprocess.run([sys.executable, os.path.join(source_directory, "main.py")], input="\n".join(commands) + "\n", capture_output=True, text=True, encoding="utf-8", cwd=directory)
+
+            with open(graph_path, "rb") as file:
+                _TestHelpers.evaluate_result("Unchanged", "Unchanged" if file.read() == graph_bytes else "Changed")
+            with open(os.path.join(directory, "tubemap.journal"), "rb") as file:
+                #The header and the one change made after compaction.
+                _TestHelpers.evaluate_result(2, len(file.readlines()))
+            expected_info = f"The Line between 'Baker Street' and 'Bond Street' via 'Jubilee' is open and will take {10 + (change_count - 1) % 5} minutes to travel between."
+            _TestHelpers.evaluate_result(expected_info, CompactionTests.__get_line_info(source_directory, directory))
+            #Touched after the snapshot was written, so the snapshot is only used once the graph file is found to have the same content.
+            modified_time = os.path.getmtime(graph_path) + 10
+            os.utime(graph_path, (modified_time, modified_time))
+            _TestHelpers.evaluate_result(expected_info, CompactionTests.__get_line_info(source_directory, directory))
+
+class BatchTests:
+    """Runs main.py batch in a separate process from a directory holding only a copy of the graph, as it would be run from a script."""
+    COMMANDS = [
+        "# A comment",
+        "",
+        'route "Baker Street" "Oxford Circus"',
+        "route Nowhere Oxford",
+        "algorithm",
+        'line time "Baker Street" "Bond Street" Jubilee',
+        "gui",
+        "lines",
+        "exit",
+        "algorithm"
+    ]
+
+    @staticmethod
+    def run() -> None:
+        print(BatchTests.__name__)
+        BatchTests._test_json_lines()
+
+    @staticmethod
+    def _test_json_lines() -> None:
+        """Every command gives one line of JSON with the route, output or error, and the working directory is left exactly as it was."""
+        print(BatchTests._test_json_lines.__name__)
+        source_directory = os.path.dirname(os.path.abspath(__file__))
+        with TemporaryDirectory() as directory:
+            graph_path = os.path.join(directory, "tubemap.json")
+            shutil.copyfile(os.path.join(source_directory, "tubemap.json"), graph_path)
+            graph_modified_time = os.path.getmtime(graph_path)
+            process = subprocess.run([sys.executable, os.path.join(source_directory, "main.py"), "batch"], input="\n".join(BatchTests.COMMANDS) + "\n", capture_output=True, text=True, encoding="utf-8", cwd=directory)
+            _TestHelpers.evaluate_result(0, process.returncode)
+
+            results = [json.loads(line) for line in process.stdout.splitlines()]
+            _TestHelpers.evaluate_result([3, 4, 5, 6, 7, 8], [result["line"] for result in results])
+            _TestHelpers.evaluate_result(BatchTests.COMMANDS[2:8], [result["command"] for result in results])
+            _TestHelpers.evaluate_result(["route", "error", "output", "output", "error", "error"], [next(key for key in ["route", "output", "error"] if key in result) for result in results])
+            _TestHelpers.evaluate_result((["Baker Street", "Bond Street", "Oxford Circus"], 4), (results[0]["route"]["stations"], results[0]["route"]["duration"]))
+            #line time without the minutes.
+            _TestHelpers.evaluate_result(["Invalid syntax."], results[3]["output"])
+            _TestHelpers.evaluate_result(["The gui command can't be used in a batch.", "Invalid command."], [results[4]["error"], results[5]["error"]])
+            _TestHelpers.evaluate_result(True, all(isinstance(result["duration_ms"], float) for result in results))
+
+            _TestHelpers.evaluate_result(["tubemap.json"], sorted(os.listdir(directory)))
+            _TestHelpers.evaluate_result(graph_modified_time, os.path.getmtime(graph_path))
+
+class RouteCommandTests:
+    """Runs main.py route in a separate process from a directory holding only a copy of the graph, as a script asking for a single route would."""
+    COMMAND = ["route", "bank", "canary wharf", "--json"]
+    #The median time for a route, on top of starting the interpreter (which this program can do nothing about).
+    #A large part of it is compiling main.py itself, which Python never caches for the script that is run.
+    COLD_START_TARGET_MS = 120
+    COLD_START_RUNS = 9
+
+    @staticmethod
+    def run() -> None:
+        print(RouteCommandTests.__name__)
+        RouteCommandTests._test_snapshot()
+        RouteCommandTests._test_cold_start()
+
+    @staticmethod
+    def __run_route(directory: str) -> Dict[str, Any]:
+        process = subprocess.run([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")] + RouteCommandTests.COMMAND, capture_output=True, text=True, encoding="utf-8", cwd=directory)
+        return json.loads(process.stdout)
+
+    @staticmethod
+    def __get_median_duration(arguments: List[str], directory: str) -> float:
+        durations = []
+        for _ in range(RouteCommandTests.COLD_START_RUNS):
+            start_time = time.perf_counter()
+            subprocess.run([sys.executable] + arguments, capture_output=True, cwd=directory)
+            durations.append(time.perf_counter() - start_time)
+        return statistics.median(durations) * 1000
+
+    @staticmethod
+    def _test_snapshot() -> None:
+        """The first route parses the graph file and writes the snapshot, later routes load the snapshot instead, and the journal is never created."""
+        print(RouteCommandTests._test_snapshot.__name__)
+        with TemporaryDirectory() as directory:
+            shutil.copyfile(os.path.join(os.path.dirname(os.path.abspath(__file__)), "tubemap.json"), os.path.join(directory, "tubemap.json"))
+            first_route = RouteCommandTests.__run_route(directory)
+            _TestHelpers.evaluate_result(["tubemap.json", "tubemap.snapshot"], sorted(os.listdir(directory)))
+            second_route = RouteCommandTests.__run_route(directory)
+            _TestHelpers.evaluate_result((["Bank", "London Bridge", "Bermondsey", "Canada Water", "Canary Wharf"], 9), (first_route["stations"], first_route["duration"]))
+            _TestHelpers.evaluate_result((first_route["stations"], first_route["duration"]), (second_route["stations"], second_route["duration"]))
+            _TestHelpers.evaluate_result((True, True), ("parse" in first_route["timings"], "snapshot" in second_route["timings"]))
+
+    @staticmethod
+    def _test_cold_start() -> None:
+        print(RouteCommandTests._test_cold_start.__name__)
+        with TemporaryDirectory() as directory:
+            shutil.copyfile(os.path.join(os.path.dirname(os.path.abspath(__file__)), "tubemap.json"), os.path.join(directory, "tubemap.json"))
+            #Writes the snapshot (and the bytecode of the modules), so that only the cold start of later routes is measured.
+            RouteCommandTests.__run_route(directory)
+            interpreter_duration = RouteCommandTests.__get_median_duration(["-c", "pass"], directory)
+            route_duration = RouteCommandTests.__get_median_duration([os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")] + RouteCommandTests.COMMAND, directory)
+        print(f"Median of {RouteCommandTests.COLD_START_RUNS} runs: {route_duration:.1f}ms, of which {interpreter_duration:.1f}ms is starting the interpreter.")
+        target = f"Under {RouteCommandTests.COLD_START_TARGET_MS}ms"
+        _TestHelpers.evaluate_result(target, target if route_duration - interpreter_duration < RouteCommandTests.COLD_START_TARGET_MS else f"{route_duration - interpreter_duration:.1f}ms")
+
+class SharedRoutePoolTests:
+    """Routes found by the worker processes from the graph in shared memory must match the baseline Dijkstra on the graph as it was last published."""
+    SEED = 7
+    PROCESSES = 2
+
+    @staticmethod
+    def run() -> None:
+        print(SharedRoutePoolTests.__name__)
+        SharedRoutePoolTests._test_publish()
+
+    @staticmethod
+    def __count_mismatches(pool: TubemapSharedRoutePool, expected_weights: Dict[Tuple[int, int], int | None]) -> str:
+        pairs = list(expected_weights.keys())
+        mismatches = 0
+        for (start_id, end_id), result in zip(pairs, pool.find_shortest_paths(pairs)):
+            if result is None or expected_weights[(start_id, end_id)] is None:
+                mismatches += result is not None or expected_weights[(start_id, end_id)] is not None
+            else:
+                mismatches += result[0] != expected_weights[(start_id, end_id)] or (result[1][0][0], result[1][-1][0]) != (start_id, end_id)
+        return f"{mismatches}/{len(pairs)} mismatches"
+
+    @staticmethod
+    def _test_publish() -> None:
+        """Closures are only seen once the graph has been published again, and then by every worker."""
+        print(SharedRoutePoolTests._test_publish.__name__)
+        graph = _TestHelpers.build_random_tubemap_graph(SharedRoutePoolTests.SEED)
+        node_ids = list(graph.nodes.keys())
+        pairs = [(start_id, end_id) for start_id in node_ids[::4] for end_id in node_ids[1::5] if start_id != end_id]
+        expected_weights = _TestHelpers.get_baseline_weights(graph, pairs)
+        with TubemapSharedGraph(graph) as shared_graph, TubemapSharedRoutePool(shared_graph, SharedRoutePoolTests.PROCESSES) as pool:
+            _TestHelpers.evaluate_result(f"0/{len(pairs)} mismatches", SharedRoutePoolTests.__count_mismatches(pool, expected_weights))
+
+            for _, _, edge in list(graph.edge_list.values())[::3]:
+                edge.closed = True
+            closed_expected_weights = _TestHelpers.get_baseline_weights(graph, pairs)
+            _TestHelpers.evaluate_result(True, closed_expected_weights != expected_weights)
+            _TestHelpers.evaluate_result(f"0/{len(pairs)} mismatches", SharedRoutePoolTests.__count_mismatches(pool, expected_weights))
+
+            _TestHelpers.evaluate_result(2, shared_graph.publish())
+            _TestHelpers.evaluate_result(f"0/{len(pairs)} mismatches", SharedRoutePoolTests.__count_mismatches(pool, closed_expected_weights))
+
+class WebserverTests:
+    """Runs the webserver on a free port with a random graph and checks the assets and every API endpoint over real connections, the routes against the baseline Dijkstra."""
+    SEED = 6
+
+    __port: int = 0
+
+    @staticmethod
+    def run() -> None:
+        print(WebserverTests.__name__)
+        #The assets are served from the www folder in the working directory.
+        working_directory = os.getcwd()
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+        graph = _TestHelpers.build_random_tubemap_graph(WebserverTests.SEED)
+        with socket.socket() as free_socket:
+            free_socket.bind((Webserver.HOSTNAME, 0))
+            WebserverTests.__port = free_socket.getsockname()[1]
+        #Batches are answered by the shared route pool, while single routes are answered from the API's snapshot.
+        stop_webserver = Webserver.run(graph, 4, WebserverTests.__port, 2)
+        try:
+            WebserverTests._test_assets()
+            WebserverTests._test_routes(graph)
+            WebserverTests._test_reach(graph)
+            WebserverTests._test_batch(graph)
+            WebserverTests._test_trace(graph)
+            WebserverTests._test_errors()
+            WebserverTests._test_coalescing(graph)
+            WebserverTests._test_closure(graph)
+        finally:
+            stop_webserver()
+            os.chdir(working_directory)
+
+    @staticmethod
+    def __request(method: str, path: str, body: bytes | None = None, headers: Dict[str, str] = {}) -> Tuple[int, http.client.HTTPMessage, bytes]:
+        connection = http.client.HTTPConnection(Webserver.HOSTNAME, WebserverTests.__port, timeout=30)
+        try:
+            connection.request(method, path, body, headers)
+            response = connection.getresponse()
+            return response.status, response.headers, response.read()
+        finally:
+            connection.close()
+
+    @staticmethod
+    def __get_json(path: str) -> Tuple[int, Any]:
+        status, _, body = WebserverTests.__request("GET", path)
+        return status, json.loads(body)
+
+    @staticmethod
+    def __get_route_pairs(graph: TubemapGraph) -> List[Tuple[int, int]]:
+        node_ids = list(graph.nodes.keys())
+        return [(start_id, end_id) for start_id in node_ids[::7] for end_id in node_ids[3::11] if start_id != end_id]
+
+    @staticmethod
+    def _test_assets() -> None:
+        """Assets are sent whole, gzipped when asked for, as a 304 when the client has the current version, and never from outside of www."""
+        print(WebserverTests._test_assets.__name__)
+        with open(os.path.join("www", "index.html"), "rb") as file:
+            content = file.read()
+        status, headers, body = WebserverTests.__request("GET", "/")
+        _TestHelpers.evaluate_result((200, "text/html", True), (status, headers["Content-Type"], body == content))
+        etag = headers["ETag"]
+
+        status, headers, body = WebserverTests.__request("GET", "/index.html", headers={"Accept-Encoding": "gzip"})
+        _TestHelpers.evaluate_result((200, "gzip", True), (status, headers["Content-Encoding"], gzip.decompress(body) == content))
+        status, headers, body = WebserverTests.__request("GET", "/index.html", headers={"If-None-Match": etag})
+        _TestHelpers.evaluate_result((304, etag, b""), (status, headers["ETag"], body))
+        status, headers, body = WebserverTests.__request("HEAD", "/index.html")
+        _TestHelpers.evaluate_result((200, str(len(content)), b""), (status, headers["Content-Length"], body))
+
+        _TestHelpers.evaluate_result(404, WebserverTests.__request("GET", "/missing.html")[0])
+        _TestHelpers.evaluate_result(404, WebserverTests.__request("GET", "/../main.py")[0])
+
+    @staticmethod
+    def _test_routes(graph: TubemapGraph) -> None:
+        """Every algorithm gives the baseline journey time, and a pair with no route is a 404."""
+        print(WebserverTests._test_routes.__name__)
+        pairs = WebserverTests.__get_route_pairs(graph)
+        expected_weights = _TestHelpers.get_baseline_weights(graph, pairs)
+        for algorithm in Webserver.API_ALGORITHMS.keys():
+            mismatches = 0
+            for start_id, end_id in pairs:
+                #One by name (in a different case) and one by ID.
+                status, result = WebserverTests.__get_json(f"/api/route?from={graph.nodes[start_id].label.upper().replace(' ', '%20')}&to={end_id}&algorithm={algorithm}")
+                expected_weight = expected_weights[(start_id, end_id)]
+                if expected_weight is None:
+                    mismatches += status != 404
+                else:
+                    #The interchange search adds a penalty for changing lines, so its route can take longer but never less time.
+                    mismatches += status != 200 or (result["duration"] < expected_weight if algorithm == "interchange" else result["duration"] != expected_weight) or (result["stations"][0], result["stations"][-1]) != (graph.nodes[start_id].label, graph.nodes[end_id].label)
+            print(algorithm)
+            _TestHelpers.evaluate_result(f"0/{len(pairs)} mismatches", f"{mismatches}/{len(pairs)} mismatches")
+
+    @staticmethod
+    def _test_reach(graph: TubemapGraph) -> None:
+        """The stations reached are the ones the baseline Dijkstra gets to in time, with the same journey times."""
+        print(WebserverTests._test_reach.__name__)
+        MINUTES = 15
+        node_ids = list(graph.nodes.keys())
+        mismatches = 0
+        for start_id in node_ids[::9]:
+            expected_weights = _TestHelpers.get_baseline_weights(graph, [(start_id, end_id) for end_id in node_ids if end_id != start_id])
+            expected_stations = sorted([[graph.nodes[end_id].label, weight] for (_, end_id), weight in expected_weights.items() if weight is not None and weight <= MINUTES] + [[graph.nodes[start_id].label, 0]])
+            status, result = WebserverTests.__get_json(f"/api/reach?from={start_id}&minutes={MINUTES}")
+            mismatches += status != 200 or sorted(result["stations"]) != expected_stations or [minutes for _, minutes in result["stations"]] != sorted(minutes for _, minutes in result["stations"])
+        _TestHelpers.evaluate_result("0 mismatches", f"{mismatches} mismatches")
+
+    @staticmethod
+    def _test_batch(graph: TubemapGraph) -> None:
+        """A batch gives the same results as sending each query on its own, with an error in place of any query that fails."""
+        print(WebserverTests._test_batch.__name__)
+        pairs = WebserverTests.__get_route_pairs(graph)[:20]
+        queries: List[Dict[str, Any]] = [{"type": "route", "from": start_id, "to": end_id} for start_id, end_id in pairs] + [{"type": "reach", "from": pairs[0][0], "minutes": 10}, {"type": "walk"}, {"type": "route", "from": "Nowhere", "to": pairs[0][1]}]
+        status, _, body = WebserverTests.__request("POST", "/api/batch", json.dumps(queries).encode("utf-8"), {"Content-Type": "application/json"})
+        results = json.loads(body)
+        expected_results = [WebserverTests.__get_json(f"/api/route?from={start_id}&to={end_id}")[1] for start_id, end_id in pairs] + [WebserverTests.__get_json(f"/api/reach?from={pairs[0][0]}&minutes=10")[1]]
+        expected_results += [{"error": "Unknown query type 'walk'."}, {"error": "Station 'Nowhere' not found."}]
+        _TestHelpers.evaluate_result((200, len(queries), 0), (status, len(results), sum(result != expected for result, expected in zip(results, expected_results))))
+
+    @staticmethod
+    def _test_trace(graph: TubemapGraph) -> None:
+        """A trace is streamed as one step per line and ends with the baseline route."""
+        print(WebserverTests._test_trace.__name__)
+        start_id, end_id = next(pair for pair in WebserverTests.__get_route_pairs(graph) if _TestHelpers.get_baseline_weights(graph, [pair])[pair] is not None)
+        expected_weight = _TestHelpers.get_baseline_weights(graph, [(start_id, end_id)])[(start_id, end_id)]
+        for algorithm in Webserver.TRACE_ALGORITHMS.keys():
+            status, headers, body = WebserverTests.__request("GET", f"/api/trace?from={start_id}&to={end_id}&algorithm={algorithm}&format=ndjson")
+            steps = [json.loads(line) for line in body.splitlines()]
+            print(algorithm)
+            _TestHelpers.evaluate_result((200, "application/x-ndjson", "path", expected_weight), (status, headers["Content-Type"], steps[-1]["type"], steps[-1]["weight"]))
+
+    @staticmethod
+    def _test_errors() -> None:
+        """Bad requests get the right status and an error message, never a 500, and HEAD gets the status of the GET without a body."""
+        print(WebserverTests._test_errors.__name__)
+        requests = [
+            ("GET", "/api/route?from=Nowhere&to=1", None, {}, 404),
+            ("GET", "/api/route?to=1", None, {}, 400),
+            ("GET", "/api/route?from=1&to=2&algorithm=astar", None, {}, 400),
+            ("GET", "/api/reach?from=1&minutes=soon", None, {}, 400),
+            ("GET", "/api/unknown", None, {}, 404),
+            ("POST", "/api/route?from=1&to=2", b"", {}, 405),
+            ("GET", "/api/batch", None, {}, 405),
+            ("POST", "/api/batch", b"[{", {}, 400),
+            ("POST", "/api/batch", b"{}", {}, 400),
+            ("POST", "/api/batch", b"[]", {"Content-Length": "two"}, 400),
+            ("POST", "/api/batch", b"[]", {"Content-Length": "-2"}, 400),
+            ("POST", "/api/batch", json.dumps([{"type": "reach"}] * (Webserver.MAX_BATCH_SIZE + 1)).encode("utf-8"), {}, 413)
+        ]
+        statuses = []
+        for method, path, body, headers, _ in requests:
+            status, response_headers, response_body = WebserverTests.__request(method, path, body, headers)
+            statuses.append(status if response_headers["Content-Type"] == "application/json" and "error" in json.loads(response_body) else f"{status} without an error")
+        _TestHelpers.evaluate_result([status for *_, status in requests], statuses)
+
+        status, headers, body = WebserverTests.__request("HEAD", "/api/route?from=1&to=1")
+        _TestHelpers.evaluate_result((200, "application/json", b""), (status, headers["Content-Type"], body))
+        _TestHelpers.evaluate_result(404, WebserverTests.__request("HEAD", "/api/route?from=Nowhere&to=1")[0])
+
+    @staticmethod
+    def _test_coalescing(graph: TubemapGraph) -> None:
+        """Identical work submitted while it is running shares one result, and is run again once it has finished."""
+        print(WebserverTests._test_coalescing.__name__)
+        coalescer = _RequestCoalescer(2)
+        release = Event()
+        def work() -> object:
+            release.wait(10)
+            return object()
+        try:
+            futures = [coalescer.submit("key", work) for _ in range(5)]
+            other_future = coalescer.submit("other key", work)
+            _TestHelpers.evaluate_result((1, True), (len(set(futures)), other_future is not futures[0]))
+            release.set()
+            results = [future.result() for future in futures]
+            _TestHelpers.evaluate_result((1, True), (len(set(id(result) for result in results)), other_future.result() is not results[0]))
+            _TestHelpers.evaluate_result(True, coalescer.submit("key", work).result() is not results[0])
+        finally:
+            coalescer.shutdown()
+
+        #The same route asked for by many clients at once all get the right answer.
+        start_id, end_id = next(pair for pair in WebserverTests.__get_route_pairs(graph) if _TestHelpers.get_baseline_weights(graph, [pair])[pair] is not None)
+        expected_weight = _TestHelpers.get_baseline_weights(graph, [(start_id, end_id)])[(start_id, end_id)]
+        results: List[Any] = [None] * 16
+        def get_route(i: int) -> None:
+            results[i] = WebserverTests.__get_json(f"/api/route?from={start_id}&to={end_id}")
+        threads = [Thread(target=get_route, args=(i,)) for i in range(len(results))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        _TestHelpers.evaluate_result([(200, expected_weight)] * len(results), [(status, result["duration"]) for status, result in results])
+
+    @staticmethod
+    def _test_closure(graph: TubemapGraph) -> None:
+        """A closure made to the live graph is seen by the next query."""
+        print(WebserverTests._test_closure.__name__)
+        start_id, end_id = next(pair for pair in WebserverTests.__get_route_pairs(graph) if _TestHelpers.get_baseline_weights(graph, [pair])[pair] is not None)
+        status, result = WebserverTests.__get_json(f"/api/route?from={start_id}&to={end_id}")
+        #Every line between the stations of the route is closed, so the same route can't be given again.
+        route_pairs = [{node_label, next_node_label} for node_label, next_node_label in zip(result["stations"], result["stations"][1:])]
+        closed_edges = [edge for node1, node2, edge in graph.edge_list.values() if not edge.closed and {node1.label, node2.label} in route_pairs]
+        for edge in closed_edges:
+            edge.closed = True
+        expected_weight = _TestHelpers.get_baseline_weights(graph, [(start_id, end_id)])[(start_id, end_id)]
+        status, new_result = WebserverTests.__get_json(f"/api/route?from={start_id}&to={end_id}")
+        _TestHelpers.evaluate_result((404, None) if expected_weight is None else (200, expected_weight), (status, new_result.get("duration")))
+        _TestHelpers.evaluate_result(True, new_result.get("stations") != result["stations"])
+        #The shared route pool only sees the closures once the graph is published again, as the program does after every change.
+        Webserver.publish_graph()
+        status, _, body = WebserverTests.__request("POST", "/api/batch", json.dumps([{"type": "route", "from": start_id, "to": end_id}]).encode("utf-8"))
+        _TestHelpers.evaluate_result((200, new_result.get("duration")), (status, json.loads(body)[0].get("duration")))
+        for edge in closed_edges:
+            edge.closed = False
+        Webserver.publish_graph()
+
 if __name__ == "__main__":
     # JsonTests().run()
     AlgorithmTests.run()
+    TubemapFormatTests.run()
+    TubemapJournalTests.run()
+    TubemapScenarioTests.run()
+    CompactionTests.run()
+    BatchTests.run()
+    RouteCommandTests.run()
+    SharedRoutePoolTests.run()
+    WebserverTests.run()
     pass
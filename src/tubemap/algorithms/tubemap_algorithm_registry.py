@@ -0,0 +1,67 @@
+from typing import Any, Dict, List, Tuple
+from importlib import import_module
+
+class _RegisteredAlgorithm:
+    def __init__(self, name: str, tubemap_algorithm_path: str, base_algorithm_path: str, stateful: bool) -> None:
+        self.name: str = name
+        #"module:class" paths, the classes are only imported the first time the algorithm is used.
+        self.tubemap_algorithm_path: str = tubemap_algorithm_path
+        self.base_algorithm_path: str = base_algorithm_path
+        self.stateful: bool = stateful
+        self.algorithms: Tuple[Any, Any] | None = None
+
+"""
+* The route finding algorithms that can be picked by name (e.g. with the algorithm command or route --algorithm).
+* Each algorithm is registered by the module path of its class rather than the class itself, and is only imported the first time it is used,
+* so starting the program (especially a one-off query, see main.py route) doesn't pay for importing every algorithm.
+* Every algorithm has a pair of classes, the tubemap algorithm that finds the route taking closures into account,
+* and the base algorithm that finds the route ignoring them (used to show how much longer the closures have made the journey).
+* A stateful algorithm keeps caches between queries, so its class has to be constructed with the graph (see TubemapDynamicShortestPaths) rather than used directly.
+"""
+class TubemapAlgorithmRegistry:
+    __algorithms: Dict[str, _RegisteredAlgorithm] = {}
+
+    @staticmethod
+    def register(name: str, tubemap_algorithm_path: str, base_algorithm_path: str, stateful: bool = False) -> None:
+        """Adds an algorithm, the paths are "module:class" and aren't imported until the algorithm is used."""
+        TubemapAlgorithmRegistry.__algorithms[name.lower()] = _RegisteredAlgorithm(name, tubemap_algorithm_path, base_algorithm_path, stateful)
+
+    @staticmethod
+    def get_names() -> List[str]:
+        """The names of the algorithms in the order they were registered."""
+        return [algorithm.name for algorithm in TubemapAlgorithmRegistry.__algorithms.values()]
+
+    @staticmethod
+    def get_name(name: str) -> str | None:
+        """The registered name of an algorithm from a name in any case, or None if there is no such algorithm."""
+        algorithm = TubemapAlgorithmRegistry.__algorithms.get(name.lower())
+        return algorithm.name if algorithm is not None else None
+
+    @staticmethod
+    def is_stateful(name: str) -> bool:
+        return TubemapAlgorithmRegistry.__get(name).stateful
+
+    @staticmethod
+    def get(name: str) -> Tuple[Any, Any]:
+        """The (base algorithm, tubemap algorithm) classes of an algorithm, importing them if this is the first time it has been used."""
+        algorithm = TubemapAlgorithmRegistry.__get(name)
+        if algorithm.algorithms is None:
+            algorithm.algorithms = (TubemapAlgorithmRegistry.__import(algorithm.base_algorithm_path), TubemapAlgorithmRegistry.__import(algorithm.tubemap_algorithm_path))
+        return algorithm.algorithms
+
+    @staticmethod
+    def __get(name: str) -> _RegisteredAlgorithm:
+        algorithm = TubemapAlgorithmRegistry.__algorithms.get(name.lower())
+        if algorithm is None:
+            raise KeyError(f"Unknown algorithm '{name}', expected one of: {', '.join(TubemapAlgorithmRegistry.get_names())}.")
+        return algorithm
+
+    @staticmethod
+    def __import(path: str) -> Any:
+        module_name, class_name = path.split(":")
+        return getattr(import_module(module_name), class_name)
+
+TubemapAlgorithmRegistry.register("Dijkstra", "tubemap.algorithms.tubemap_dijkstras_algorithm:TubemapDijkstrasAlgorithm", "algorithms.dijkstras_algorithm:DijkstrasAlgorithm")
+TubemapAlgorithmRegistry.register("Bellman Ford DP", "tubemap.algorithms.tubemap_bellman_fords_algorithm_dp:TubemapBellmanFordsAlgorithmDP", "algorithms.bellman_fords_algorithm_dp:BellmanFordsAlgorithmDP")
+TubemapAlgorithmRegistry.register("Dijkstra Interchange", "tubemap.algorithms.tubemap_interchange_dijkstras_algorithm:TubemapInterchangeDijkstrasAlgorithm", "algorithms.dijkstras_algorithm:DijkstrasAlgorithm")
+TubemapAlgorithmRegistry.register("Dynamic Dijkstra", "tubemap.algorithms.tubemap_dynamic_shortest_paths:TubemapDynamicShortestPaths", "algorithms.dijkstras_algorithm:DijkstrasAlgorithm", stateful=True)
@@ -0,0 +1,44 @@
+from typing import Any, Dict, List
+from algorithms.algorithm import PathPart
+
+class TubemapAlgorithmStep:
+    """
+    A single step taken by an algorithm, as yielded by the iterate_steps methods so that a search can be shown as it happens.
+    box: node_id has been boxed with its final path_weight.
+    relax: the edge from node_id to neighbour_id is being checked, path_weight is the weight of the path through it.
+    update: the edge from node_id to neighbour_id gave a lighter path to neighbour_id, path_weight is its new weight.
+    path: the search has finished, path holds the node and edge IDs of the shortest path and path_weight is its total weight.
+    """
+    BOX = "box"
+    RELAX = "relax"
+    UPDATE = "update"
+    PATH = "path"
+
+    __slots__ = ("type", "node_id", "neighbour_id", "edge_id", "path_weight", "path")
+
+    def __init__(self, type: str, node_id: int | None, path_weight: int, neighbour_id: int | None = None, edge_id: int | None = None, path: List[List[int | None]] | None = None) -> None:
+        self.type: str = type
+        self.node_id: int | None = node_id
+        self.neighbour_id: int | None = neighbour_id
+        self.edge_id: int | None = edge_id
+        self.path_weight: int = path_weight
+        #[[node ID, ID of the edge to the next node], ...], the last edge ID is None.
+        self.path: List[List[int | None]] | None = path
+
+    def to_obj(self) -> Dict[str, Any]:
+        """A JSON friendly dict of the step, leaving out any fields that don't apply to its type."""
+        obj: Dict[str, Any] = {"type": self.type, "weight": self.path_weight}
+        if self.node_id is not None:
+            obj["node"] = self.node_id
+        if self.neighbour_id is not None:
+            obj["neighbour"] = self.neighbour_id
+        if self.edge_id is not None:
+            obj["edge"] = self.edge_id
+        if self.path is not None:
+            obj["path"] = self.path
+        return obj
+
+    @staticmethod
+    def from_path(path_part_array: List[PathPart]) -> "TubemapAlgorithmStep":
+        path_weight = sum(path_part.edge.weight for path_part in path_part_array[:-1])
+        return TubemapAlgorithmStep(TubemapAlgorithmStep.PATH, None, path_weight, path=[[path_part.node.id, path_part.edge.id if path_part.edge is not None else None] for path_part in path_part_array])
@@ -0,0 +1,216 @@
+from typing import Callable, Dict, Iterator, List, Tuple
+from array import array
+from sys import maxsize as INT_MAX
+import glob
+import heapq
+import mmap
+import os
+import struct
+from tubemap.core.tubemap_graph import TubemapGraph
+from tubemap.core.tubemap_node import TubemapNode
+
+"""
+* Stores the quickest journey time between every pair of stations in a memory mapped file, so that it is only ever calculated once for a given graph.
+* The file name holds the graph's fingerprint (a hash of its stations, lines, journey times and closures), so a store is only used for the exact graph it was built from
+* and a closure just switches to a different file, the last few files are kept so that undoing a closure doesn't need a recalculation.
+* As the graph is undirected, d(i, j) = d(j, i), so only the upper triangle (i < j) is stored, as u16 minutes (0xFFFF for stations that can't reach each other).
+* That is (n * (n - 1) / 2) * 2 bytes, about 400MB for 20,000 stations instead of 3.2GB for a dense i64 matrix.
+* Rows are calculated lazily, the first time a station's journey times are needed a single search from it fills in every pair it is part of
+* (its own row and its column in the rows before it) and marks it as calculated, so the pair (i, j) is known once either i or j has been searched.
+* Layout:
+#   Header: magic, version, node count and the graph's fingerprint.
+#   Searched: a bitmap with one bit per station, set once a search from that station has been written.
+#   Node IDs: i64 ID of the station at each index.
+#   Triangle: u16 journey times, row i holds (i, i + 1) ... (i, n - 1).
+"""
+class TubemapAllPairsStore:
+    MAGIC = b"TUBEAPSP"
+    VERSION = 2
+    UNREACHABLE = 0xFFFF
+    #The number of store files (i.e. different closures) kept in the directory.
+    MAX_FILES = 4
+    #magic, version, node count, fingerprint.
+    __HEADER = struct.Struct("=8sIIQ")
+
+    @property
+    def file_path(self) -> str:
+        return self.__file_path
+
+    @property
+    def fingerprint(self) -> int:
+        """The fingerprint of the graph the store was opened for, if the graph's fingerprint no longer matches then a new store is needed."""
+        return self.__fingerprint
+
+    @property
+    def searched_count(self) -> int:
+        """The number of stations whose journey times have been calculated."""
+        return sum(bin(byte).count("1") for byte in self.__searched)
+
+    def __init__(self, graph: TubemapGraph, directory: str = ".") -> None:
+        """Opens the store for the graph's current content, creating the file if it doesn't exist yet. Use close when it is no longer needed."""
+        self.__graph: TubemapGraph = graph
+        fingerprint = graph.fingerprint
+        self.__fingerprint: int = fingerprint
+        self.__file_path: str = os.path.join(directory, f"tubemap-{fingerprint:016x}.allpairs")
+
+        node_count = len(graph.nodes)
+        searched_size = ((node_count + 7) // 8 + 7) & ~7
+        triangle_offset = TubemapAllPairsStore.__HEADER.size + searched_size + node_count * 8
+        file_size = triangle_offset + (node_count * (node_count - 1) // 2) * 2
+
+        if os.path.exists(self.__file_path) and not self.__is_valid(self.__file_path, node_count, fingerprint, file_size):
+            os.remove(self.__file_path)
+        if not os.path.exists(self.__file_path):
+            TubemapAllPairsStore.__create(self.__file_path, graph, fingerprint, file_size, triangle_offset)
+            TubemapAllPairsStore.__remove_old_files(directory, self.__file_path)
+        else:
+            #Counts as a use of the file, so that the files removed are the least recently used ones.
+            os.utime(self.__file_path)
+
+        self.__file = open(self.__file_path, "r+b")
+        self.__buffer = mmap.mmap(self.__file.fileno(), 0)
+        whole_view = memoryview(self.__buffer)
+        self.__node_count: int = node_count
+        self.__searched: memoryview = whole_view[TubemapAllPairsStore.__HEADER.size:TubemapAllPairsStore.__HEADER.size + searched_size]
+        self.__node_ids: memoryview = whole_view[TubemapAllPairsStore.__HEADER.size + searched_size:triangle_offset].cast("q")
+        self.__triangle: memoryview = whole_view[triangle_offset:].cast("H")
+        self.__node_indices: Dict[int, int] = {node_id: i for i, node_id in enumerate(self.__node_ids.tolist())}
+        whole_view.release()
+
+    @staticmethod
+    def __is_valid(file_path: str, node_count: int, fingerprint: int, file_size: int) -> bool:
+        try:
+            with open(file_path, "rb") as file:
+                header = file.read(TubemapAllPairsStore.__HEADER.size)
+            if len(header) != TubemapAllPairsStore.__HEADER.size or os.path.getsize(file_path) != file_size:
+                return False
+            return TubemapAllPairsStore.__HEADER.unpack(header) == (TubemapAllPairsStore.MAGIC, TubemapAllPairsStore.VERSION, node_count, fingerprint)
+        except OSError:
+            return False
+
+    @staticmethod
+    def __create(file_path: str, graph: TubemapGraph, fingerprint: int, file_size: int, triangle_offset: int) -> None:
+        #Written to a temporary file first so that a half written header is never picked up, the triangle is left sparse until rows are searched.
+        temp_file_path = f"{file_path}.tmp"
+        with open(temp_file_path, "wb") as file:
+            file.write(TubemapAllPairsStore.__HEADER.pack(TubemapAllPairsStore.MAGIC, TubemapAllPairsStore.VERSION, len(graph.nodes), fingerprint))
+            file.seek(triangle_offset - len(graph.nodes) * 8)
+            file.write(array("q", graph.nodes.keys()).tobytes())
+            file.truncate(file_size)
+        os.replace(temp_file_path, file_path)
+
+    @staticmethod
+    def __remove_old_files(directory: str, current_file_path: str) -> None:
+        file_paths = sorted(glob.glob(os.path.join(directory, "tubemap-*.allpairs")), key=os.path.getmtime, reverse=True)
+        for file_path in [path for path in file_paths if path != current_file_path][TubemapAllPairsStore.MAX_FILES - 1:]:
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+
+    def close(self) -> None:
+        self.__searched.release()
+        self.__node_ids.release()
+        self.__triangle.release()
+        self.__buffer.close()
+        self.__file.close()
+
+    def __enter__(self) -> "TubemapAllPairsStore":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __get_index(self, i: int, j: int) -> int:
+        """The index of the pair (i, j) in the triangle, where i < j."""
+        return i * (2 * self.__node_count - i - 1) // 2 + (j - i - 1)
+
+    def __is_searched(self, i: int) -> bool:
+        return (self.__searched[i >> 3] >> (i & 7)) & 1 == 1
+
+    def __search(self, source_index: int) -> None:
+        """Searches from a station and writes the journey time of every pair it is part of."""
+        nodes = self.__graph.nodes
+        node_ids = self.__node_ids
+        source_id = node_ids[source_index]
+        path_weights: Dict[int, int] = {source_id: 0}
+        boxed_ids = set()
+        queue: List[Tuple[int, int]] = [(0, source_id)]
+        while len(queue) > 0:
+            path_weight, node_id = heapq.heappop(queue)
+            if node_id in boxed_ids:
+                continue
+            boxed_ids.add(node_id)
+            for neighbouring_node_id, edges in nodes[node_id].adjacency_dict.items():
+                if neighbouring_node_id in boxed_ids:
+                    continue
+                for edge in edges.values():
+                    new_weight = path_weight + edge.weight
+                    if edge.closed or new_weight >= path_weights.get(neighbouring_node_id, INT_MAX):
+                        continue
+                    path_weights[neighbouring_node_id] = new_weight
+                    heapq.heappush(queue, (new_weight, neighbouring_node_id))
+
+        if max(path_weights.values()) >= TubemapAllPairsStore.UNREACHABLE:
+            raise ValueError(f"A journey from station {source_id} is too long to be stored (the limit is {TubemapAllPairsStore.UNREACHABLE - 1} minutes).")
+
+        #Built as a row in memory and written as one slice, the column entries (pairs with the stations before it) have to be written one at a time.
+        row = array("H", [path_weights.get(node_ids[j], TubemapAllPairsStore.UNREACHABLE) for j in range(source_index + 1, self.__node_count)])
+        row_start = self.__get_index(source_index, source_index + 1) if source_index + 1 < self.__node_count else 0
+        self.__triangle[row_start:row_start + len(row)] = row
+        for i in range(source_index):
+            self.__triangle[self.__get_index(i, source_index)] = path_weights.get(node_ids[i], TubemapAllPairsStore.UNREACHABLE)
+        self.__searched[source_index >> 3] |= 1 << (source_index & 7)
+
+    def get_journey_times(self, node: TubemapNode) -> Dict[int, int]:
+        """The quickest journey time from a station to every station it can reach (by ID), searching from it first if it hasn't been yet."""
+        source_index = self.__node_indices[node.id]
+        if not self.__is_searched(source_index):
+            self.__search(source_index)
+
+        journey_times: Dict[int, int] = {node.id: 0}
+        for i in range(source_index):
+            journey_time = self.__triangle[self.__get_index(i, source_index)]
+            if journey_time != TubemapAllPairsStore.UNREACHABLE:
+                journey_times[self.__node_ids[i]] = journey_time
+        if source_index + 1 < self.__node_count:
+            row_start = self.__get_index(source_index, source_index + 1)
+            for j, journey_time in enumerate(self.__triangle[row_start:row_start + self.__node_count - source_index - 1], source_index + 1):
+                if journey_time != TubemapAllPairsStore.UNREACHABLE:
+                    journey_times[self.__node_ids[j]] = journey_time
+        return journey_times
+
+    def get_journey_time(self, node1: TubemapNode, node2: TubemapNode) -> int | None:
+        """The quickest journey time between two stations, or None if they can't reach each other."""
+        i = self.__node_indices[node1.id]
+        j = self.__node_indices[node2.id]
+        if i == j:
+            return 0
+        if j < i:
+            i, j = j, i
+        if not self.__is_searched(i) and not self.__is_searched(j):
+            self.__search(i)
+        journey_time = self.__triangle[self.__get_index(i, j)]
+        return None if journey_time == TubemapAllPairsStore.UNREACHABLE else journey_time
+
+    def get_all_journey_times(self, progress_callback: Callable[[int, int], None] | None = None) -> memoryview:
+        """
+        The journey time of every pair of stations as the stored triangle (UNREACHABLE for pairs that can't reach each other), searching from any stations that haven't been yet.
+        progress_callback is called with (stations searched, total stations) while searching. The view is only valid until the store is closed.
+        """
+        for searched, total in self.iterate_searches():
+            if progress_callback is not None:
+                progress_callback(searched, total)
+        return self.__triangle
+
+    def iterate_searches(self) -> Iterator[Tuple[int, int]]:
+        """Searches from every station that hasn't been yet, yielding (stations searched, total stations to search) after each one so that it can be stopped part way through."""
+        #Every pair includes a station before the last one, so the last station never needs its own search.
+        missing_indices = [i for i in range(self.__node_count - 1) if not self.__is_searched(i)]
+        for searched, source_index in enumerate(missing_indices, 1):
+            self.__search(source_index)
+            yield searched, len(missing_indices)
+
+    def flush(self) -> None:
+        """Writes the searched rows to disk now rather than whenever the OS decides to."""
+        self.__buffer.flush()
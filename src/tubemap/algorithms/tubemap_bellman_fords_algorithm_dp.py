@@ -1,9 +1,10 @@
-from typing import Dict, List
+from typing import Dict, Iterator, List
 from sys import maxsize as INT_MAX
 from tubemap.core.tubemap_graph import TubemapGraph
 from tubemap.core.tubemap_node import TubemapNode
 from algorithms.algorithm import AlgorithmNode, PathPart
 from algorithms.bellman_fords_algorithm_dp import BellmanFordsAlgorithmDP
+from tubemap.algorithms.tubemap_algorithm_step import TubemapAlgorithmStep
 
 class TubemapBellmanFordNode(AlgorithmNode):
     @property
@@ -46,3 +47,34 @@ class TubemapBellmanFordsAlgorithmDP(BellmanFordsAlgorithmDP):
 
         #Return the shortest path.
         return AlgorithmNode.to_path_array(bellman_ford_nodes[end_node.id])
+
+    @staticmethod
+    def iterate_steps(graph: TubemapGraph, start_node: TubemapNode, end_node: TubemapNode) -> Iterator[TubemapAlgorithmStep]:
+        """
+        The same relaxation as find_shortest_path, but yields every relax and update as it happens and finishes with the path.
+        Bellman-Ford never boxes a node, so no box steps are yielded, and it stops after the first pass that changes nothing (every later pass would be the same).
+        """
+        bellman_ford_nodes: Dict[int, AlgorithmNode] = {node_id: AlgorithmNode(node) for node_id, node in graph.nodes.items()}
+        bellman_ford_nodes[start_node.id].path_weight = 0
+
+        for _ in range(len(graph.nodes) - 1):
+            updated = False
+            for [source, destination, edge] in graph.edge_list.values():
+                if edge.closed:
+                    continue
+                #The edge is undirected, so it is relaxed in both directions.
+                for node, neighbour in [(bellman_ford_nodes[source.id], bellman_ford_nodes[destination.id]), (bellman_ford_nodes[destination.id], bellman_ford_nodes[source.id])]:
+                    if node.path_weight == INT_MAX:
+                        continue
+                    new_weight = node.path_weight + edge.weight
+                    yield TubemapAlgorithmStep(TubemapAlgorithmStep.RELAX, node.node.id, new_weight, neighbour.node.id, edge.id)
+                    if new_weight < neighbour.path_weight:
+                        neighbour.path_weight = new_weight
+                        neighbour.previous_node = node
+                        neighbour.previous_edge = edge
+                        updated = True
+                        yield TubemapAlgorithmStep(TubemapAlgorithmStep.UPDATE, node.node.id, new_weight, neighbour.node.id, edge.id)
+            if not updated:
+                break
+
+        yield TubemapAlgorithmStep.from_path(AlgorithmNode.to_path_array(bellman_ford_nodes[end_node.id]))
@@ -0,0 +1,142 @@
+from typing import Callable, Dict, List, Tuple
+from multiprocessing import Pool
+import heapq
+import os
+import random
+from tubemap.core.tubemap_graph import TubemapGraph
+
+class _CentralitySnapshot:
+    """A read-only copy of the open part of the graph using list indices instead of IDs, so that it is cheap to send to and search in the worker processes."""
+    def __init__(self, graph: TubemapGraph) -> None:
+        self.node_ids: List[int] = list(graph.nodes.keys())
+        self.edge_ids: List[int] = [edge_id for edge_id, (_, _, edge) in graph.edge_list.items() if not edge.closed]
+        node_indices: Dict[int, int] = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        edge_indices: Dict[int, int] = {edge_id: i for i, edge_id in enumerate(self.edge_ids)}
+
+        #adjacency[i] holds (neighbour index, edge index, weight) for every open edge of node i.
+        self.adjacency: List[List[Tuple[int, int, int]]] = [[] for _ in self.node_ids]
+        for edge_id in self.edge_ids:
+            node1, node2, edge = graph.edge_list[edge_id]
+            self.adjacency[node_indices[node1.id]].append((node_indices[node2.id], edge_indices[edge_id], edge.weight))
+            self.adjacency[node_indices[node2.id]].append((node_indices[node1.id], edge_indices[edge_id], edge.weight))
+
+"""
+* I am using Brandes' algorithm (2001), modified for weighted graphs by using Dijkstra instead of BFS for the search from each source.
+* Each source is independent, so the sources are split into chunks that are searched by a pool of processes and their scores are summed.
+* For large graphs, a random sample of sources can be used instead and the scores scaled up to estimate the exact values.
+* As the graph is undirected, every path is found from both of its ends, so the scores are halved at the end.
+"""
+class TubemapBetweennessCentrality:
+    #The snapshot used by the worker processes, it is set once when each worker starts.
+    __worker_snapshot: _CentralitySnapshot | None = None
+
+    @staticmethod
+    def _worker_initialise(snapshot: _CentralitySnapshot) -> None:
+        TubemapBetweennessCentrality.__worker_snapshot = snapshot
+
+    @staticmethod
+    def _worker_accumulate(source_indices: List[int]) -> Tuple[int, List[float], List[float]]:
+        """Runs the single source part of Brandes' algorithm for each source and returns the summed node and edge scores."""
+        snapshot = TubemapBetweennessCentrality.__worker_snapshot
+        node_count = len(snapshot.node_ids)
+        node_scores = [0.0] * node_count
+        edge_scores = [0.0] * len(snapshot.edge_ids)
+
+        for source_index in source_indices:
+            #region Dijkstra, counting the number of shortest paths to every node (sigma) and their predecessors.
+            path_weights = [-1] * node_count
+            path_counts = [0] * node_count
+            predecessors: List[List[Tuple[int, int]]] = [[] for _ in range(node_count)]
+            is_boxed = [False] * node_count
+            boxed_order: List[int] = []
+
+            path_weights[source_index] = 0
+            path_counts[source_index] = 1
+            queue: List[Tuple[int, int]] = [(0, source_index)]
+            while len(queue) > 0:
+                path_weight, node_index = heapq.heappop(queue)
+                if is_boxed[node_index]:
+                    continue
+                is_boxed[node_index] = True
+                boxed_order.append(node_index)
+
+                for neighbouring_index, edge_index, weight in snapshot.adjacency[node_index]:
+                    new_weight = path_weight + weight
+                    if path_weights[neighbouring_index] == -1 or new_weight < path_weights[neighbouring_index]:
+                        path_weights[neighbouring_index] = new_weight
+                        path_counts[neighbouring_index] = 0
+                        predecessors[neighbouring_index] = []
+                        heapq.heappush(queue, (new_weight, neighbouring_index))
+                    if new_weight == path_weights[neighbouring_index]:
+                        path_counts[neighbouring_index] += path_counts[node_index]
+                        predecessors[neighbouring_index].append((node_index, edge_index))
+            #endregion
+
+            #region Accumulate the dependencies in the reverse order that the nodes were boxed.
+            dependencies = [0.0] * node_count
+            for node_index in reversed(boxed_order):
+                for predecessor_index, edge_index in predecessors[node_index]:
+                    contribution = path_counts[predecessor_index] / path_counts[node_index] * (1 + dependencies[node_index])
+                    edge_scores[edge_index] += contribution
+                    dependencies[predecessor_index] += contribution
+                if node_index != source_index:
+                    node_scores[node_index] += dependencies[node_index]
+            #endregion
+
+        return len(source_indices), node_scores, edge_scores
+
+    @staticmethod
+    def calculate(graph: TubemapGraph, samples: int | None = None, processes: int | None = None, progress_callback: Callable[[int, int], None] | None = None) -> Tuple[Dict[int, float], Dict[int, float]]:
+        """
+        Returns the betweenness centrality of every station and every edge (by ID), closed edges are ignored.
+        If samples is set, only that many random sources are searched and the result is an estimate, it must be at least 1.
+        progress_callback is called with (sources searched, total sources) as the work completes.
+        """
+        if samples is not None and samples < 1:
+            raise ValueError(f"At least one sample is needed to estimate the centrality, got {samples}.")
+
+        snapshot = _CentralitySnapshot(graph)
+        node_count = len(snapshot.node_ids)
+
+        source_indices = list(range(node_count))
+        scale = 0.5
+        if samples is not None and samples < node_count:
+            source_indices = random.sample(source_indices, samples)
+            scale *= node_count / samples
+
+        if processes is None:
+            processes = os.cpu_count() or 1
+        #Several chunks per process so that progress is reported regularly and the work stays balanced.
+        chunk_size = max(1, len(source_indices) // (processes * 8))
+        chunks = [source_indices[i:i + chunk_size] for i in range(0, len(source_indices), chunk_size)]
+
+        node_scores = [0.0] * node_count
+        edge_scores = [0.0] * len(snapshot.edge_ids)
+        sources_searched = 0
+
+        def accumulate(result: Tuple[int, List[float], List[float]]) -> None:
+            nonlocal sources_searched
+            chunk_sources, chunk_node_scores, chunk_edge_scores = result
+            for i in range(node_count):
+                node_scores[i] += chunk_node_scores[i]
+            for i in range(len(edge_scores)):
+                edge_scores[i] += chunk_edge_scores[i]
+            sources_searched += chunk_sources
+            if progress_callback is not None:
+                progress_callback(sources_searched, len(source_indices))
+
+        if processes == 1:
+            #Starting a pool for a single process is just overhead, so run the work here instead.
+            TubemapBetweennessCentrality._worker_initialise(snapshot)
+            for chunk in chunks:
+                accumulate(TubemapBetweennessCentrality._worker_accumulate(chunk))
+        else:
+            #The snapshot is sent to each worker once when it starts, after that only lists of sources and scores are sent between the processes.
+            with Pool(processes, TubemapBetweennessCentrality._worker_initialise, (snapshot,)) as pool:
+                for result in pool.imap_unordered(TubemapBetweennessCentrality._worker_accumulate, chunks):
+                    accumulate(result)
+
+        return (
+            {snapshot.node_ids[i]: node_scores[i] * scale for i in range(node_count)},
+            {snapshot.edge_ids[i]: edge_scores[i] * scale for i in range(len(edge_scores))}
+        )
@@ -0,0 +1,118 @@
+from typing import List, Tuple
+from multiprocessing import Pool
+from tubemap.core.tubemap_graph import TubemapGraph
+from tubemap.core.tubemap_edge import TubemapEdge
+from tubemap.core.tubemap_scenario import TubemapScenario
+from tubemap.algorithms.tubemap_dynamic_shortest_paths import TubemapDynamicShortestPaths
+
+class ClosureImpact:
+    """The effect on every pair of stations of closing a single edge."""
+    def __init__(self, edge: TubemapEdge) -> None:
+        self.edge: TubemapEdge = edge
+        #The number of station pairs whose journey gets longer.
+        self.slower_pairs: int = 0
+        #The total number of minutes added over all of the station pairs.
+        self.total_delay: int = 0
+        self.max_delay: int = 0
+        #The number of station pairs that can no longer reach each other.
+        self.disconnected_pairs: int = 0
+
+"""
+* Closing an edge can only change the journey times from a station if the edge is in that station's shortest path tree,
+* so rather than recalculating every pair of stations, only the stations whose trees use the edge are looked at again,
+* and their trees are repaired (only the part below the edge is searched again) rather than being rebuilt.
+* Each pair is counted once, from the station with the lower ID, as journey times are the same in both directions.
+"""
+class TubemapClosureImpactAnalyser:
+    #The shortest path trees used by the worker processes, each worker builds its own copy once when it starts.
+    __worker_paths: TubemapDynamicShortestPaths | None = None
+
+    @staticmethod
+    def analyse_edge(graph: TubemapGraph, edge: TubemapEdge, shortest_paths: TubemapDynamicShortestPaths) -> ClosureImpact:
+        """
+        Calculates how closing the edge would change the journey time between every pair of stations, the edge is reopened before this returns.
+        As the edge is closed while this runs, the graph must not be read by anything else until it returns, so give it a scenario's graph (see TubemapScenario) or a copy (as rank_edges does).
+        """
+        impact = ClosureImpact(edge)
+        if edge.closed:
+            return impact
+
+        affected_nodes = [node for node in graph.nodes.values() if shortest_paths.uses_edge(node, edge)]
+        old_weights = {node.id: dict(shortest_paths.distances_from(node)) for node in affected_nodes}
+
+        #Rather than searching the affected stations from scratch, close the edge and let the cached trees repair themselves.
+        try:
+            edge.closed = True
+            shortest_paths.update_edge(edge)
+            for source_node in affected_nodes:
+                new_weights = shortest_paths.distances_from(source_node)
+                for node_id, old_weight in old_weights[source_node.id].items():
+                    if node_id <= source_node.id:
+                        continue
+                    new_weight = new_weights.get(node_id)
+                    if new_weight is None:
+                        impact.disconnected_pairs += 1
+                    elif new_weight > old_weight:
+                        impact.slower_pairs += 1
+                        impact.total_delay += new_weight - old_weight
+                        impact.max_delay = max(impact.max_delay, new_weight - old_weight)
+        finally:
+            edge.closed = False
+            shortest_paths.update_edge(edge)
+
+        return impact
+
+    @staticmethod
+    def analyse_edge_on_scenario(scenario: TubemapScenario, edge: TubemapEdge, shortest_paths: TubemapDynamicShortestPaths) -> ClosureImpact:
+        """
+        Like analyse_edge, but shortest_paths is only read, so the cached trees of a graph others are using (e.g. the program's live graph) can be given.
+        The edge is closed on the scenario (a private copy of the trees' graph) instead, and only the part of each tree below the edge is searched again on it.
+        """
+        impact = ClosureImpact(edge)
+        if edge.closed:
+            return impact
+
+        scenario.set_closed(edge, True)
+        for source_node in shortest_paths.graph.nodes.values():
+            old_weights = shortest_paths.distances_from(source_node)
+            for node_id, new_weight in shortest_paths.distances_if_closed(source_node, edge, scenario.graph).items():
+                if node_id <= source_node.id:
+                    continue
+                if new_weight is None:
+                    impact.disconnected_pairs += 1
+                elif new_weight > old_weights[node_id]:
+                    impact.slower_pairs += 1
+                    impact.total_delay += new_weight - old_weights[node_id]
+                    impact.max_delay = max(impact.max_delay, new_weight - old_weights[node_id])
+        return impact
+
+    @staticmethod
+    def _worker_initialise(graph: TubemapGraph) -> None:
+        TubemapClosureImpactAnalyser.__worker_paths = TubemapDynamicShortestPaths(graph)
+        TubemapClosureImpactAnalyser.__worker_paths.all_pairs()
+
+    @staticmethod
+    def _worker_analyse_edge(edge_id: int) -> Tuple[int, int, int, int, int]:
+        shortest_paths = TubemapClosureImpactAnalyser.__worker_paths
+        impact = TubemapClosureImpactAnalyser.analyse_edge(shortest_paths.graph, shortest_paths.graph.edge_list[edge_id][2], shortest_paths)
+        return edge_id, impact.slower_pairs, impact.total_delay, impact.max_delay, impact.disconnected_pairs
+
+    @staticmethod
+    def rank_edges(graph: TubemapGraph, processes: int | None = None) -> List[ClosureImpact]:
+        """Analyses every open edge across a pool of processes and returns the impacts, most critical first."""
+        edge_ids = [edge.id for _, _, edge in graph.edge_list.values() if not edge.closed]
+
+        impacts: List[ClosureImpact] = []
+        #The graph is sent to each worker once when it starts, after that only edge IDs and results are sent between the processes.
+        with Pool(processes, TubemapClosureImpactAnalyser._worker_initialise, (graph,)) as pool:
+            for edge_id, slower_pairs, total_delay, max_delay, disconnected_pairs in pool.imap_unordered(TubemapClosureImpactAnalyser._worker_analyse_edge, edge_ids, chunksize=8):
+                impact = ClosureImpact(graph.edge_list[edge_id][2])
+                impact.slower_pairs = slower_pairs
+                impact.total_delay = total_delay
+                impact.max_delay = max_delay
+                impact.disconnected_pairs = disconnected_pairs
+                impacts.append(impact)
+
+        #Closures that disconnect stations are always the most critical, after that it is the total time added.
+        impacts.sort(key=lambda impact: (impact.disconnected_pairs, impact.total_delay, impact.slower_pairs), reverse=True)
+        return impacts
@@ -0,0 +1,124 @@
+from typing import Any, Dict, Generator, List, Set, Tuple
+from tubemap.core.tubemap_graph import TubemapGraph
+from tubemap.core.tubemap_node import TubemapNode
+from tubemap.core.tubemap_edge import TubemapEdge
+
+#How many stations are processed between each progress report while building, see TubemapWarmupScheduler.
+_PROGRESS_INTERVAL = 256
+
+def _run_to_completion(builder: Generator[Tuple[int, int], None, Any]) -> Any:
+    try:
+        while True:
+            next(builder)
+    except StopIteration as stop:
+        return stop.value
+
+"""
+* Indexes that answer connectivity questions in O(1) instead of a search, both only consider open edges.
+* Each index remembers the fingerprint of the graph it was built from, so a caller can check that it is still valid (i.e. nothing has been opened or closed since).
+* They are built by generators that yield (stations done, total stations) as they go, so that a build can be run a step at a time in the background and stopped part way through.
+"""
+class TubemapComponentIndex:
+    """The connected component of every station, two stations can reach each other if they are in the same component."""
+    def __init__(self, fingerprint: int, component_ids: Dict[int, int]) -> None:
+        self.fingerprint: int = fingerprint
+        self.__component_ids: Dict[int, int] = component_ids
+
+    @property
+    def component_count(self) -> int:
+        return len(set(self.__component_ids.values()))
+
+    def is_path_available(self, start: TubemapNode, end: TubemapNode) -> bool:
+        return self.__component_ids[start.id] == self.__component_ids[end.id]
+
+    @staticmethod
+    def iterate_build(graph: TubemapGraph) -> Generator[Tuple[int, int], None, "TubemapComponentIndex"]:
+        fingerprint = graph.fingerprint
+        component_ids: Dict[int, int] = {}
+        for node_id in graph.nodes.keys():
+            if node_id in component_ids:
+                continue
+            #Each unvisited station starts a new component (named after it), which is filled with a search.
+            component_id = node_id
+            component_ids[node_id] = component_id
+            queue: List[int] = [node_id]
+            while len(queue) > 0:
+                current_id = queue.pop()
+                for neighbouring_node_id, edges in graph.nodes[current_id].adjacency_dict.items():
+                    if neighbouring_node_id in component_ids or all(edge.closed for edge in edges.values()):
+                        continue
+                    component_ids[neighbouring_node_id] = component_id
+                    queue.append(neighbouring_node_id)
+                    if len(component_ids) % _PROGRESS_INTERVAL == 0:
+                        yield len(component_ids), len(graph.nodes)
+        return TubemapComponentIndex(fingerprint, component_ids)
+
+    @staticmethod
+    def build(graph: TubemapGraph) -> "TubemapComponentIndex":
+        return _run_to_completion(TubemapComponentIndex.iterate_build(graph))
+
+class TubemapBridgeIndex:
+    """
+    The bridges of the graph, which are the open edges that would disconnect stations from each other if they were closed.
+    These are found with Tarjan's bridge finding algorithm (1974), an edge is a bridge if nothing below it in the depth first search tree has a back edge to above it.
+    Parallel edges are told apart by ID, so two lines running between the same pair of stations are never bridges.
+    """
+    def __init__(self, fingerprint: int, bridge_ids: Set[int]) -> None:
+        self.fingerprint: int = fingerprint
+        self.__bridge_ids: Set[int] = bridge_ids
+
+    @property
+    def bridge_count(self) -> int:
+        return len(self.__bridge_ids)
+
+    def is_bridge(self, edge: TubemapEdge) -> bool:
+        return edge.id in self.__bridge_ids
+
+    @staticmethod
+    def iterate_build(graph: TubemapGraph) -> Generator[Tuple[int, int], None, "TubemapBridgeIndex"]:
+        fingerprint = graph.fingerprint
+        #The order each station was first reached in, and the earliest station reachable from its subtree with at most one back edge.
+        discovery: Dict[int, int] = {}
+        low: Dict[int, int] = {}
+        bridge_ids: Set[int] = set()
+
+        for root_id in graph.nodes.keys():
+            if root_id in discovery:
+                continue
+            discovery[root_id] = low[root_id] = len(discovery)
+            #An explicit stack of (station ID, ID of the edge it was reached by, iterator over its open edges), as a large graph is deep enough to hit the recursion limit.
+            stack = [(root_id, None, TubemapBridgeIndex.__iterate_open_edges(graph, root_id))]
+            while len(stack) > 0:
+                node_id, parent_edge_id, edges = stack[-1]
+                for neighbouring_node_id, edge_id in edges:
+                    if edge_id == parent_edge_id:
+                        continue
+                    if neighbouring_node_id in discovery:
+                        low[node_id] = min(low[node_id], discovery[neighbouring_node_id])
+                        continue
+                    discovery[neighbouring_node_id] = low[neighbouring_node_id] = len(discovery)
+                    stack.append((neighbouring_node_id, edge_id, TubemapBridgeIndex.__iterate_open_edges(graph, neighbouring_node_id)))
+                    if len(discovery) % _PROGRESS_INTERVAL == 0:
+                        yield len(discovery), len(graph.nodes)
+                    break
+                else:
+                    #Every edge of the station has been followed, so pass its low value up to its parent.
+                    stack.pop()
+                    if len(stack) > 0:
+                        parent_id = stack[-1][0]
+                        low[parent_id] = min(low[parent_id], low[node_id])
+                        if low[node_id] > discovery[parent_id]:
+                            bridge_ids.add(parent_edge_id)
+
+        return TubemapBridgeIndex(fingerprint, bridge_ids)
+
+    @staticmethod
+    def __iterate_open_edges(graph: TubemapGraph, node_id: int) -> Generator[Tuple[int, int], None, None]:
+        for neighbouring_node_id, edges in graph.nodes[node_id].adjacency_dict.items():
+            for edge in edges.values():
+                if not edge.closed:
+                    yield neighbouring_node_id, edge.id
+
+    @staticmethod
+    def build(graph: TubemapGraph) -> "TubemapBridgeIndex":
+        return _run_to_completion(TubemapBridgeIndex.iterate_build(graph))
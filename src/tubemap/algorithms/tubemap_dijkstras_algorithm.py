@@ -1,9 +1,11 @@
-from typing import Dict, List
+from typing import Dict, Iterator, List, Tuple
 from sys import maxsize as INT_MAX
+import heapq
 from tubemap.core.tubemap_graph import TubemapGraph
 from tubemap.core.tubemap_node import TubemapNode
 from algorithms.algorithm import AlgorithmNode, PathPart
 from algorithms.dijkstras_algorithm import DijkstrasAlgorithm, DijkstraNode
+from tubemap.algorithms.tubemap_algorithm_step import TubemapAlgorithmStep
 
 class TubemapDijkstraNode(DijkstraNode):
     @property
@@ -73,3 +75,48 @@ class TubemapDijkstrasAlgorithm(DijkstrasAlgorithm):
 
         #If we do end somehow end up here, something has gone wrong.
         raise AssertionError(f"Failed to find a path from node '{start_node.id}' to node '{end_node.id}' on the specified graph.")
+
+    @staticmethod
+    def iterate_steps(graph: TubemapGraph, start_node: TubemapNode, end_node: TubemapNode) -> Iterator[TubemapAlgorithmStep]:
+        """
+        The same search as find_shortest_path, but yields every box, relax and update as it happens and finishes with the path.
+        The next node is taken from a heap rather than by scanning every node, as this is meant for showing searches on large graphs.
+        Nothing is kept for steps that have been yielded, so the caller can stream them out without the whole trace ever being held in memory.
+        """
+        dijkstra_nodes: Dict[int, TubemapDijkstraNode] = {node_id: TubemapDijkstraNode(node) for node_id, node in graph.nodes.items()}
+        dijkstra_nodes[start_node.id].path_weight = 0
+        queue: List[Tuple[int, int]] = [(0, start_node.id)]
+
+        while len(queue) > 0:
+            path_weight, node_id = heapq.heappop(queue)
+            dijkstra_node = dijkstra_nodes[node_id]
+            #Stale entries are left in the heap rather than being removed when a node's weight is lowered.
+            if dijkstra_node.is_boxed:
+                continue
+            dijkstra_node.is_boxed = True
+            yield TubemapAlgorithmStep(TubemapAlgorithmStep.BOX, node_id, path_weight)
+
+            if node_id == end_node.id:
+                yield TubemapAlgorithmStep.from_path(AlgorithmNode.to_path_array(dijkstra_node))
+                return
+
+            for neighbouring_node_id, edges in dijkstra_node.node.adjacency_dict.items():
+                dijkstra_edge_node = dijkstra_nodes[neighbouring_node_id]
+                if dijkstra_edge_node.is_boxed:
+                    continue
+
+                for edge in edges.values():
+                    if edge.closed:
+                        continue
+                    new_weight = path_weight + edge.weight
+                    yield TubemapAlgorithmStep(TubemapAlgorithmStep.RELAX, node_id, new_weight, neighbouring_node_id, edge.id)
+                    if new_weight >= dijkstra_edge_node.path_weight:
+                        continue
+
+                    dijkstra_edge_node.path_weight = new_weight
+                    dijkstra_edge_node.previous_node = dijkstra_node
+                    dijkstra_edge_node.previous_edge = edge
+                    heapq.heappush(queue, (new_weight, neighbouring_node_id))
+                    yield TubemapAlgorithmStep(TubemapAlgorithmStep.UPDATE, node_id, new_weight, neighbouring_node_id, edge.id)
+
+        raise AssertionError(f"Failed to find a path from node '{start_node.id}' to node '{end_node.id}' on the specified graph.")
@@ -0,0 +1,239 @@
+from typing import Dict, List, Set, Tuple
+from sys import maxsize as INT_MAX
+import heapq
+from tubemap.core.tubemap_graph import TubemapGraph
+from tubemap.core.tubemap_node import TubemapNode
+from tubemap.core.tubemap_edge import TubemapEdge
+from algorithms.algorithm import PathPart
+from tubemap.algorithms.tubemap_dijkstras_algorithm import TubemapDijkstrasAlgorithm
+
+class _ShortestPathTree:
+    """The shortest path from one source station to every other station, stored as a tree of parent pointers."""
+    def __init__(self, graph: TubemapGraph, source_id: int) -> None:
+        self.graph: TubemapGraph = graph
+        self.source_id: int = source_id
+        self.path_weights: Dict[int, int] = {}
+        #Maps a station to the station before it on its shortest path and the edge used.
+        self.parents: Dict[int, Tuple[int, TubemapEdge]] = {}
+        self.children: Dict[int, Set[int]] = {}
+        self.build()
+
+    def __set_parent(self, node_id: int, parent_id: int, edge: TubemapEdge) -> None:
+        old_parent = self.parents.get(node_id)
+        if old_parent is not None:
+            self.children[old_parent[0]].discard(node_id)
+        self.parents[node_id] = (parent_id, edge)
+        self.children.setdefault(parent_id, set()).add(node_id)
+
+    def __propagate(self, queue: List[Tuple[int, int]], allowed_ids: Set[int] | None = None) -> None:
+        """Runs Dijkstra from the stations in the queue, only improving on the current weights (and only inside of allowed_ids if set)."""
+        while len(queue) > 0:
+            path_weight, node_id = heapq.heappop(queue)
+            if path_weight > self.path_weights.get(node_id, INT_MAX):
+                continue
+
+            for neighbouring_node_id, edges in self.graph.nodes[node_id].adjacency_dict.items():
+                if allowed_ids is not None and neighbouring_node_id not in allowed_ids:
+                    continue
+                for edge in edges.values():
+                    new_weight = path_weight + edge.weight
+                    if edge.closed or new_weight >= self.path_weights.get(neighbouring_node_id, INT_MAX):
+                        continue
+                    self.path_weights[neighbouring_node_id] = new_weight
+                    self.__set_parent(neighbouring_node_id, node_id, edge)
+                    heapq.heappush(queue, (new_weight, neighbouring_node_id))
+
+    def build(self) -> None:
+        self.path_weights = {self.source_id: 0}
+        self.parents = {}
+        self.children = {}
+        self.__propagate([(0, self.source_id)])
+
+    def __get_subtree_ids(self, child_id: int) -> Set[int]:
+        subtree_ids: Set[int] = set()
+        stack = [child_id]
+        while len(stack) > 0:
+            node_id = stack.pop()
+            subtree_ids.add(node_id)
+            stack.extend(self.children.get(node_id, ()))
+        return subtree_ids
+
+    def __repair_increase(self, child_id: int) -> None:
+        """The edge into child_id got heavier or closed, so every station below it in the tree may now have a longer path."""
+        #Collect the subtree, these are the only stations whose weights can change.
+        affected_ids = self.__get_subtree_ids(child_id)
+
+        for node_id in affected_ids:
+            self.path_weights.pop(node_id, None)
+            parent_id, _ = self.parents.pop(node_id)
+            self.children[parent_id].discard(node_id)
+
+        #Seed each affected station with its best connection from the unaffected part of the tree and then settle the subtree.
+        queue: List[Tuple[int, int]] = []
+        for node_id in affected_ids:
+            for neighbouring_node_id, edges in self.graph.nodes[node_id].adjacency_dict.items():
+                if neighbouring_node_id in affected_ids or neighbouring_node_id not in self.path_weights:
+                    continue
+                for edge in edges.values():
+                    new_weight = self.path_weights[neighbouring_node_id] + edge.weight
+                    if edge.closed or new_weight >= self.path_weights.get(node_id, INT_MAX):
+                        continue
+                    self.path_weights[node_id] = new_weight
+                    self.__set_parent(node_id, neighbouring_node_id, edge)
+            if node_id in self.path_weights:
+                heapq.heappush(queue, (self.path_weights[node_id], node_id))
+        self.__propagate(queue, affected_ids)
+
+    def __repair_decrease(self, node1_id: int, node2_id: int, edge: TubemapEdge) -> None:
+        """The edge got lighter or opened, so it may now give a shorter path to either end and everything past it."""
+        queue: List[Tuple[int, int]] = []
+        for from_id, to_id in ((node1_id, node2_id), (node2_id, node1_id)):
+            if from_id not in self.path_weights:
+                continue
+            new_weight = self.path_weights[from_id] + edge.weight
+            if new_weight < self.path_weights.get(to_id, INT_MAX):
+                self.path_weights[to_id] = new_weight
+                self.__set_parent(to_id, from_id, edge)
+                heapq.heappush(queue, (new_weight, to_id))
+        self.__propagate(queue)
+
+    def find_subtree_weights(self, closed_graph: TubemapGraph, child_id: int) -> Dict[int, int | None]:
+        """
+        The weights the stations below child_id would have if the edge into it was closed, without changing the tree (see __repair_increase).
+        closed_graph is searched instead of the tree's graph, it must be the same graph with the edge closed (e.g. a scenario of it), a station that can't be reached maps to None.
+        """
+        affected_ids = self.__get_subtree_ids(child_id)
+        weights: Dict[int, int] = {}
+        queue: List[Tuple[int, int]] = []
+        for node_id in affected_ids:
+            for neighbouring_node_id, edges in closed_graph.nodes[node_id].adjacency_dict.items():
+                if neighbouring_node_id in affected_ids or neighbouring_node_id not in self.path_weights:
+                    continue
+                for edge in edges.values():
+                    new_weight = self.path_weights[neighbouring_node_id] + edge.weight
+                    if not edge.closed and new_weight < weights.get(node_id, INT_MAX):
+                        weights[node_id] = new_weight
+            if node_id in weights:
+                heapq.heappush(queue, (weights[node_id], node_id))
+
+        while len(queue) > 0:
+            path_weight, node_id = heapq.heappop(queue)
+            if path_weight > weights[node_id]:
+                continue
+            for neighbouring_node_id, edges in closed_graph.nodes[node_id].adjacency_dict.items():
+                if neighbouring_node_id not in affected_ids:
+                    continue
+                for edge in edges.values():
+                    new_weight = path_weight + edge.weight
+                    if not edge.closed and new_weight < weights.get(neighbouring_node_id, INT_MAX):
+                        weights[neighbouring_node_id] = new_weight
+                        heapq.heappush(queue, (new_weight, neighbouring_node_id))
+        return {node_id: weights.get(node_id) for node_id in affected_ids}
+
+    def repair(self, node1_id: int, node2_id: int, edge: TubemapEdge) -> None:
+        for parent_id, child_id in ((node1_id, node2_id), (node2_id, node1_id)):
+            parent = self.parents.get(child_id)
+            if parent is None or parent[0] != parent_id or parent[1] is not edge:
+                continue
+            #The edge is in the tree, if it is now worse then the subtree below it has to be repaired.
+            if edge.closed or self.path_weights[parent_id] + edge.weight > self.path_weights[child_id]:
+                self.__repair_increase(child_id)
+                return
+            self.path_weights[child_id] = self.path_weights[parent_id] + edge.weight
+            #The edge got lighter, so push the new weight down the tree.
+            self.__propagate([(self.path_weights[child_id], child_id)])
+            return
+
+        #Edges that are not in the tree can only affect the tree if they got lighter or opened.
+        if not edge.closed:
+            self.__repair_decrease(node1_id, node2_id, edge)
+
+    def to_path_array(self, end_id: int) -> List[PathPart]:
+        path_array: List[PathPart] = [PathPart(self.graph.nodes[end_id], None)]
+        node_id = end_id
+        while node_id != self.source_id:
+            parent_id, edge = self.parents[node_id]
+            path_array.append(PathPart(self.graph.nodes[parent_id], edge))
+            node_id = parent_id
+        path_array.reverse()
+        return path_array
+
+"""
+* This keeps shortest path trees cached between queries and repairs them when an edge changes, instead of throwing them away (Ramalingam-Reps style).
+* When an edge in a tree is closed or made heavier, only the subtree hanging below it can change, so that subtree is cleared,
+* reseeded from its neighbours outside of the subtree and then settled with a Dijkstra search limited to the subtree.
+* When an edge is opened or made lighter, the improvement is pushed outwards from its end points, stopping wherever it no longer helps.
+* A tree is cached for every source that has been queried, the all pairs distance matrix is just a tree cached for every station.
+"""
+class TubemapDynamicShortestPaths:
+    @property
+    def graph(self) -> TubemapGraph:
+        return self.__graph
+
+    def __init__(self, graph: TubemapGraph) -> None:
+        self.__graph: TubemapGraph = graph
+        self.__trees: Dict[int, _ShortestPathTree] = {}
+
+    def __get_tree(self, source_id: int) -> _ShortestPathTree:
+        tree = self.__trees.get(source_id)
+        if tree is None:
+            tree = _ShortestPathTree(self.__graph, source_id)
+            self.__trees[source_id] = tree
+        return tree
+
+    def update_edge(self, edge: TubemapEdge) -> None:
+        """Must be called after an edge's weight or closed state has changed, repairs every cached tree."""
+        node1, node2, _ = self.__graph.edge_list[edge.id]
+        for tree in self.__trees.values():
+            tree.repair(node1.id, node2.id, edge)
+
+    def clear(self) -> None:
+        """Drops all cached trees, needed if stations or edges are added or removed."""
+        self.__trees.clear()
+
+    def distance(self, start_node: TubemapNode, end_node: TubemapNode) -> int | None:
+        """The shortest travel time between two stations, or None if there is no route."""
+        return self.__get_tree(start_node.id).path_weights.get(end_node.id)
+
+    def distances_from(self, start_node: TubemapNode) -> Dict[int, int]:
+        """The shortest travel time from a station to every reachable station (this must not be modified)."""
+        return self.__get_tree(start_node.id).path_weights
+
+    def uses_edge(self, start_node: TubemapNode, edge: TubemapEdge) -> bool:
+        """Checks if an edge is part of the cached shortest path tree of a station."""
+        node1, node2, _ = self.__graph.edge_list[edge.id]
+        parents = self.__get_tree(start_node.id).parents
+        for parent_id, child_id in ((node1.id, node2.id), (node2.id, node1.id)):
+            parent = parents.get(child_id)
+            if parent is not None and parent[0] == parent_id and parent[1] is edge:
+                return True
+        return False
+
+    def distances_if_closed(self, start_node: TubemapNode, edge: TubemapEdge, closed_graph: TubemapGraph) -> Dict[int, int | None]:
+        """
+        The new travel times from a station to the stations whose journeys could change if the edge was closed (None if they couldn't be reached), the cached tree isn't changed.
+        Only the part of the tree below the edge is searched, on closed_graph, which must be this graph with the edge closed (e.g. a scenario of it).
+        """
+        node1, node2, _ = self.__graph.edge_list[edge.id]
+        tree = self.__get_tree(start_node.id)
+        for parent_id, child_id in ((node1.id, node2.id), (node2.id, node1.id)):
+            parent = tree.parents.get(child_id)
+            if parent is not None and parent[0] == parent_id and parent[1] is edge:
+                return tree.find_subtree_weights(closed_graph, child_id)
+        #Closing an edge that isn't in the tree doesn't change any journeys from the station.
+        return {}
+
+    def all_pairs(self) -> Dict[int, Dict[int, int]]:
+        """The all pairs travel time matrix, every row is cached and kept up to date after this is called."""
+        return {node_id: self.__get_tree(node_id).path_weights for node_id in self.__graph.nodes.keys()}
+
+    def find_shortest_path(self, graph: TubemapGraph, start_node: TubemapNode, end_node: TubemapNode) -> List[PathPart]:
+        """Has the same signature as the other algorithms so that it can be used in their place."""
+        #Any other graph (e.g. the compressed graph) can't use the cache.
+        if graph is not self.__graph:
+            return TubemapDijkstrasAlgorithm.find_shortest_path(graph, start_node, end_node)
+
+        tree = self.__get_tree(start_node.id)
+        if end_node.id not in tree.path_weights:
+            raise AssertionError(f"Failed to find a path from node '{start_node.id}' to node '{end_node.id}' on the specified graph.")
+        return tree.to_path_array(end_node.id)
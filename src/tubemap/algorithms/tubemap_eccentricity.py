@@ -0,0 +1,129 @@
+from typing import Dict, List, Set, Tuple
+from sys import maxsize as INT_MAX
+import heapq
+from tubemap.core.tubemap_graph import TubemapGraph
+from tubemap.core.tubemap_node import TubemapNode
+
+"""
+* The eccentricity of a station is its longest quickest journey to any other station, the diameter is the largest eccentricity and the radius the smallest.
+* Rather than searching from every station, I am using the bounding approach from Takes & Kosters (2011), which also works for weighted graphs:
+* after a search from v, every station w has ecc(w) >= max(ecc(v) - d(v, w), d(v, w)) and ecc(w) <= ecc(v) + d(v, w).
+* Searches are taken alternately from the station with the largest upper bound and the smallest lower bound,
+* and a station is resolved once its bounds meet, which on the tube map takes a handful of searches instead of one per station.
+* Stations that can't reach each other are ignored, so each station's eccentricity is relative to the stations it can reach.
+* Results are cached and only recalculated when an edge's weight or closed state has changed.
+"""
+class TubemapEccentricityCalculator:
+    @property
+    def search_count(self) -> int:
+        """The number of searches used for the last calculation."""
+        return self.__search_count
+
+    def __init__(self, graph: TubemapGraph) -> None:
+        self.__graph: TubemapGraph = graph
+        self.__search_count: int = 0
+        self.__cache_key: int | None = None
+        self.__eccentricities: Dict[int, int] | None = None
+        #The station furthest away from each station that was searched, used to report the diameter's end points.
+        self.__furthest: Dict[int, int] = {}
+        #Set when the diameter was found without resolving every eccentricity.
+        self.__diameter: Tuple[int, int, int] | None = None
+
+    def __validate_cache(self) -> None:
+        cache_key = self.__graph.fingerprint
+        if cache_key != self.__cache_key:
+            self.__cache_key = cache_key
+            self.__eccentricities = None
+            self.__diameter = None
+            self.__furthest = {}
+
+    def __search(self, source_id: int) -> Dict[int, int]:
+        self.__search_count += 1
+        path_weights: Dict[int, int] = {source_id: 0}
+        boxed_ids: Set[int] = set()
+        queue: List[Tuple[int, int]] = [(0, source_id)]
+
+        while len(queue) > 0:
+            path_weight, node_id = heapq.heappop(queue)
+            if node_id in boxed_ids:
+                continue
+            boxed_ids.add(node_id)
+
+            for neighbouring_node_id, edges in self.__graph.nodes[node_id].adjacency_dict.items():
+                if neighbouring_node_id in boxed_ids:
+                    continue
+                for edge in edges.values():
+                    new_weight = path_weight + edge.weight
+                    if edge.closed or new_weight >= path_weights.get(neighbouring_node_id, INT_MAX):
+                        continue
+                    path_weights[neighbouring_node_id] = new_weight
+                    heapq.heappush(queue, (new_weight, neighbouring_node_id))
+
+        return path_weights
+
+    def __bound(self, diameter_only: bool) -> Dict[int, int]:
+        """Runs the bounding algorithm, returns the resolved eccentricities (every station unless diameter_only is set)."""
+        self.__search_count = 0
+        lower_bounds: Dict[int, int] = {node_id: 0 for node_id in self.__graph.nodes.keys()}
+        upper_bounds: Dict[int, int] = {node_id: INT_MAX for node_id in self.__graph.nodes.keys()}
+        unresolved_ids: Set[int] = set(self.__graph.nodes.keys())
+        resolved: Dict[int, int] = {}
+        pick_upper = True
+
+        while len(unresolved_ids) > 0:
+            if diameter_only and len(resolved) > 0:
+                #Once the largest known eccentricity is at least every unresolved upper bound, the diameter has been found.
+                if max(resolved.values()) >= max(upper_bounds[node_id] for node_id in unresolved_ids):
+                    break
+
+            if pick_upper:
+                source_id = max(unresolved_ids, key=lambda node_id: (upper_bounds[node_id], -lower_bounds[node_id]))
+            else:
+                source_id = min(unresolved_ids, key=lambda node_id: (lower_bounds[node_id], -upper_bounds[node_id]))
+            pick_upper = not pick_upper
+
+            path_weights = self.__search(source_id)
+            furthest_id = max(path_weights, key=path_weights.get)
+            eccentricity = path_weights[furthest_id]
+            self.__furthest[source_id] = furthest_id
+            resolved[source_id] = eccentricity
+            unresolved_ids.discard(source_id)
+
+            for node_id, path_weight in path_weights.items():
+                if node_id not in unresolved_ids:
+                    continue
+                lower_bounds[node_id] = max(lower_bounds[node_id], eccentricity - path_weight, path_weight)
+                upper_bounds[node_id] = min(upper_bounds[node_id], eccentricity + path_weight)
+                if lower_bounds[node_id] == upper_bounds[node_id]:
+                    resolved[node_id] = lower_bounds[node_id]
+                    unresolved_ids.discard(node_id)
+
+        return resolved
+
+    def eccentricities(self) -> Dict[int, int]:
+        """The eccentricity of every station by ID (this must not be modified)."""
+        self.__validate_cache()
+        if self.__eccentricities is None:
+            self.__eccentricities = self.__bound(False)
+        return self.__eccentricities
+
+    def eccentricity(self, node: TubemapNode) -> int:
+        return self.eccentricities()[node.id]
+
+    def diameter(self) -> Tuple[int, TubemapNode, TubemapNode]:
+        """The longest quickest journey on the graph and the two stations at either end of it."""
+        self.__validate_cache()
+        if self.__diameter is None:
+            resolved = self.__eccentricities if self.__eccentricities is not None else self.__bound(True)
+            diameter = max(resolved.values())
+            #The end points are only known for stations that were searched, at least one of which has the largest eccentricity.
+            source_id = next(node_id for node_id, furthest_id in self.__furthest.items() if resolved.get(node_id) == diameter)
+            self.__diameter = (diameter, source_id, self.__furthest[source_id])
+        diameter, node1_id, node2_id = self.__diameter
+        return diameter, self.__graph.nodes[node1_id], self.__graph.nodes[node2_id]
+
+    def radius(self) -> Tuple[int, TubemapNode]:
+        """The smallest eccentricity and the station that has it (the centre of the graph)."""
+        eccentricities = self.eccentricities()
+        centre_id = min(eccentricities, key=eccentricities.get)
+        return eccentricities[centre_id], self.__graph.nodes[centre_id]
@@ -0,0 +1,113 @@
+from typing import Dict, List, Tuple
+import heapq
+from tubemap.core.tubemap_graph import TubemapGraph
+from tubemap.core.tubemap_node import TubemapNode
+from tubemap.core.tubemap_edge import TubemapEdge
+from algorithms.algorithm import AlgorithmNode, PathPart
+from tubemap.algorithms.tubemap_dijkstras_algorithm import TubemapDijkstrasAlgorithm
+
+class TubemapInterchangeNode(AlgorithmNode):
+    """A (station, line) state, the line is the one that was used to arrive at the station (None for the start station)."""
+    @property
+    def node(self) -> TubemapNode:
+        return super().node
+
+    @property
+    def line(self) -> str | None:
+        return self.__line
+
+    def __init__(self, node: TubemapNode, line: str | None) -> None:
+        super().__init__(node)
+        self.__line: str | None = line
+        self.is_boxed: bool = False
+
+"""
+* This is Dijkstra's algorithm run over a state-expanded graph where every state is a (station, line) pair.
+* Moving along an edge on the same line costs the edge weight, changing to a different line costs the edge weight plus the interchange penalty.
+* The state graph is never built up front, the neighbours of a state are generated from the station's adjacency_dict when the state is boxed.
+* To keep the visited table small, a state is skipped if the station has already been boxed on another line with a weight that,
+* even after paying the interchange penalty, would be no worse than this state (changing lines from there can never be worse than staying on this one).
+* This means that most stations only ever get one or two states, keeping the query time close to the plain algorithm.
+"""
+class TubemapInterchangeDijkstrasAlgorithm(TubemapDijkstrasAlgorithm):
+    #The time in minutes added to a journey every time the line is changed, this can be changed with the 'interchange' command.
+    interchange_penalty: int = 5
+
+    @staticmethod
+    def find_shortest_path(graph: TubemapGraph, start_node: TubemapNode, end_node: TubemapNode, interchange_penalty: int | None = None) -> List[PathPart]:
+        if interchange_penalty is None:
+            interchange_penalty = TubemapInterchangeDijkstrasAlgorithm.interchange_penalty
+
+        #The visited table, only states that have been reached are ever stored here.
+        states: Dict[Tuple[int, str | None], TubemapInterchangeNode] = {}
+        #The lowest boxed weight for each station (over any line), used to prune dominated states.
+        boxed_weights: Dict[int, int] = {}
+
+        start_state = TubemapInterchangeNode(start_node, None)
+        start_state.path_weight = 0
+        states[(start_node.id, None)] = start_state
+
+        #The counter is used as a tie breaker so that the heap never has to compare two nodes.
+        counter = 0
+        queue: List[Tuple[int, int, TubemapInterchangeNode]] = [(0, counter, start_state)]
+
+        while len(queue) > 0:
+            path_weight, _, state = heapq.heappop(queue)
+
+            #Stale entries are left in the heap instead of being decreased, so skip them here.
+            if state.is_boxed or path_weight > state.path_weight:
+                continue
+            state.is_boxed = True
+
+            #As the first boxed state of the end station has the lowest weight of any line, we can return here.
+            if state.node.id == end_node.id:
+                return AlgorithmNode.to_path_array(state)
+
+            boxed_weight = boxed_weights.get(state.node.id)
+            if boxed_weight is not None and boxed_weight + interchange_penalty <= path_weight:
+                continue
+            if boxed_weight is None:
+                boxed_weights[state.node.id] = path_weight
+
+            #region Generate the neighbouring states from the adjacency dict.
+            for neighbouring_node_id, edges in state.node.adjacency_dict.items():
+                neighbouring_node = graph.nodes[neighbouring_node_id]
+
+                for edge in edges.values():
+                    if edge.closed:
+                        continue
+
+                    new_weight = path_weight + edge.weight
+                    if state.line is not None and edge.label != state.line:
+                        new_weight += interchange_penalty
+
+                    key = (neighbouring_node_id, edge.label)
+                    neighbouring_state = states.get(key)
+                    if neighbouring_state is None:
+                        neighbouring_state = TubemapInterchangeNode(neighbouring_node, edge.label)
+                        states[key] = neighbouring_state
+                    elif neighbouring_state.is_boxed or new_weight >= neighbouring_state.path_weight:
+                        continue
+
+                    neighbouring_state.path_weight = new_weight
+                    neighbouring_state.previous_node = state
+                    neighbouring_state.previous_edge = edge
+                    counter += 1
+                    heapq.heappush(queue, (new_weight, counter, neighbouring_state))
+            #endregion
+
+        raise AssertionError(f"Failed to find a path from node '{start_node.id}' to node '{end_node.id}' on the specified graph.")
+
+    @staticmethod
+    def count_interchanges(path: List[PathPart]) -> int:
+        """Counts the number of times the line changes along a path."""
+        interchanges = 0
+        current_line: str | None = None
+        for part in path:
+            edge: TubemapEdge | None = part.edge
+            if edge is None:
+                continue
+            if current_line is not None and edge.label != current_line:
+                interchanges += 1
+            current_line = edge.label
+        return interchanges
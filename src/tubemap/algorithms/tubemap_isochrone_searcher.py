@@ -0,0 +1,60 @@
+from typing import Dict, Iterator, List, Tuple
+import heapq
+from tubemap.core.tubemap_graph import TubemapGraph
+from tubemap.core.tubemap_node import TubemapNode
+
+"""
+* An isochrone is the set of stations that can be reached from a start station within a time budget.
+* This is a Dijkstra search that is cut off once the lightest unboxed station is over the budget, as every station boxed after it would be too.
+* The search is written as a generator so that stations are handed to the caller as soon as they are boxed,
+* meaning that a large budget on a large graph never has to hold more than the search frontier in memory.
+"""
+class TubemapIsochroneSearcher:
+    @staticmethod
+    def iterate_reachable(graph: TubemapGraph, start_node: TubemapNode, max_minutes: int) -> Iterator[Tuple[TubemapNode, int]]:
+        """Yields every station reachable within max_minutes (respecting closures) with its arrival time, in order of arrival time."""
+        path_weights: Dict[int, int] = {start_node.id: 0}
+        boxed_ids = set()
+        queue: List[Tuple[int, int]] = [(0, start_node.id)]
+
+        while len(queue) > 0:
+            path_weight, node_id = heapq.heappop(queue)
+
+            #The queue is ordered by weight, so once we pop something over the budget, nothing else can be within it.
+            if path_weight > max_minutes:
+                return
+            if node_id in boxed_ids:
+                continue
+            boxed_ids.add(node_id)
+
+            node = graph.nodes[node_id]
+            yield node, path_weight
+
+            for neighbouring_node_id, edges in node.adjacency_dict.items():
+                if neighbouring_node_id in boxed_ids:
+                    continue
+
+                for edge in edges.values():
+                    new_weight = path_weight + edge.weight
+                    if edge.closed or new_weight > max_minutes or new_weight >= path_weights.get(neighbouring_node_id, new_weight + 1):
+                        continue
+
+                    path_weights[neighbouring_node_id] = new_weight
+                    heapq.heappush(queue, (new_weight, neighbouring_node_id))
+
+    @staticmethod
+    def iterate_by_minute(graph: TubemapGraph, start_node: TubemapNode, max_minutes: int) -> Iterator[Tuple[int, List[TubemapNode]]]:
+        """Yields (minute, stations) groups in order of arrival minute, each group is yielded as soon as the search moves past that minute."""
+        current_minute = -1
+        current_group: List[TubemapNode] = []
+
+        for node, path_weight in TubemapIsochroneSearcher.iterate_reachable(graph, start_node, max_minutes):
+            if path_weight != current_minute:
+                if len(current_group) > 0:
+                    yield current_minute, current_group
+                current_minute = path_weight
+                current_group = []
+            current_group.append(node)
+
+        if len(current_group) > 0:
+            yield current_minute, current_group
@@ -0,0 +1,160 @@
+from typing import Dict, Iterator, List, Set, Tuple
+from sys import maxsize as INT_MAX
+import heapq
+from tubemap.core.tubemap_graph import TubemapGraph
+from tubemap.core.tubemap_node import TubemapNode
+from tubemap.core.tubemap_edge import TubemapEdge
+from algorithms.algorithm import PathPart
+
+"""
+* This is Yen's algorithm for finding the k shortest loopless paths, modified so that it doesn't need to run a full search for every spur node.
+* Routes are compared by the stations they pass through, parallel edges between two stations are treated as one (the quickest open line),
+* otherwise the alternatives would mostly be the same route on different lines that share the same track.
+* A reverse shortest path tree is built once from the end station, giving the exact time from every station to the end.
+* Each spur search is then an A* search using those times as its heuristic, which is exact until it runs into a blocked station or edge,
+* and if the tree path from the spur station is not blocked at all then it is used as-is without searching.
+"""
+class TubemapKShortestPaths:
+    @staticmethod
+    def __lightest_open_edge(node: TubemapNode, neighbouring_node_id: int) -> TubemapEdge | None:
+        lightest_edge: TubemapEdge | None = None
+        for edge in node.adjacency_dict[neighbouring_node_id].values():
+            if not edge.closed and (lightest_edge is None or edge.weight < lightest_edge.weight):
+                lightest_edge = edge
+        return lightest_edge
+
+    @staticmethod
+    def __build_reverse_tree(graph: TubemapGraph, end_node: TubemapNode) -> Tuple[Dict[int, int], Dict[int, int]]:
+        """Returns the time from every station to the end station, and the next station along that path."""
+        path_weights: Dict[int, int] = {end_node.id: 0}
+        next_hops: Dict[int, int] = {}
+        boxed_ids: Set[int] = set()
+        queue: List[Tuple[int, int]] = [(0, end_node.id)]
+
+        while len(queue) > 0:
+            path_weight, node_id = heapq.heappop(queue)
+            if node_id in boxed_ids:
+                continue
+            boxed_ids.add(node_id)
+
+            node = graph.nodes[node_id]
+            for neighbouring_node_id in node.adjacency_dict.keys():
+                edge = TubemapKShortestPaths.__lightest_open_edge(node, neighbouring_node_id)
+                if edge is None or neighbouring_node_id in boxed_ids:
+                    continue
+                new_weight = path_weight + edge.weight
+                if new_weight < path_weights.get(neighbouring_node_id, INT_MAX):
+                    path_weights[neighbouring_node_id] = new_weight
+                    next_hops[neighbouring_node_id] = node_id
+                    heapq.heappush(queue, (new_weight, neighbouring_node_id))
+
+        return path_weights, next_hops
+
+    @staticmethod
+    def __spur_search(graph: TubemapGraph, spur_node_id: int, end_node_id: int, remaining_weights: Dict[int, int], next_hops: Dict[int, int], blocked_node_ids: Set[int], blocked_pairs: Set[Tuple[int, int]]) -> List[int] | None:
+        """Finds the shortest path from the spur station to the end station that avoids the blocked stations and edges."""
+        #If the tree path is not blocked then it is already the shortest path.
+        tree_path = [spur_node_id]
+        while tree_path[-1] != end_node_id:
+            next_hop = next_hops.get(tree_path[-1])
+            if next_hop is None or next_hop in blocked_node_ids or (tree_path[-1], next_hop) in blocked_pairs:
+                break
+            tree_path.append(next_hop)
+        else:
+            return tree_path
+
+        #Otherwise, fall back to an A* search guided by the tree.
+        path_weights: Dict[int, int] = {spur_node_id: 0}
+        previous_ids: Dict[int, int] = {}
+        boxed_ids: Set[int] = set()
+        queue: List[Tuple[int, int, int]] = [(remaining_weights.get(spur_node_id, 0), 0, spur_node_id)]
+
+        while len(queue) > 0:
+            _, path_weight, node_id = heapq.heappop(queue)
+            if node_id in boxed_ids:
+                continue
+            boxed_ids.add(node_id)
+
+            if node_id == end_node_id:
+                path = [node_id]
+                while path[-1] != spur_node_id:
+                    path.append(previous_ids[path[-1]])
+                path.reverse()
+                return path
+
+            node = graph.nodes[node_id]
+            for neighbouring_node_id in node.adjacency_dict.keys():
+                if neighbouring_node_id in boxed_ids or neighbouring_node_id in blocked_node_ids or (node_id, neighbouring_node_id) in blocked_pairs:
+                    continue
+                #Stations that can't reach the end station in the unblocked graph can't reach it now either.
+                if neighbouring_node_id not in remaining_weights:
+                    continue
+                edge = TubemapKShortestPaths.__lightest_open_edge(node, neighbouring_node_id)
+                if edge is None:
+                    continue
+                new_weight = path_weight + edge.weight
+                if new_weight < path_weights.get(neighbouring_node_id, INT_MAX):
+                    path_weights[neighbouring_node_id] = new_weight
+                    previous_ids[neighbouring_node_id] = node_id
+                    heapq.heappush(queue, (new_weight + remaining_weights[neighbouring_node_id], new_weight, neighbouring_node_id))
+
+        return None
+
+    @staticmethod
+    def __to_path_array(graph: TubemapGraph, node_ids: List[int]) -> List[PathPart]:
+        path_array: List[PathPart] = []
+        for i in range(len(node_ids) - 1):
+            node = graph.nodes[node_ids[i]]
+            path_array.append(PathPart(node, TubemapKShortestPaths.__lightest_open_edge(node, node_ids[i + 1])))
+        path_array.append(PathPart(graph.nodes[node_ids[-1]], None))
+        return path_array
+
+    @staticmethod
+    def iterate_shortest_paths(graph: TubemapGraph, start_node: TubemapNode, end_node: TubemapNode) -> Iterator[Tuple[int, List[PathPart]]]:
+        """Lazily yields (duration, path) for every loopless route between the two stations, in order of duration."""
+        remaining_weights, next_hops = TubemapKShortestPaths.__build_reverse_tree(graph, end_node)
+        if start_node.id not in remaining_weights:
+            return
+
+        def path_weight(node_ids: List[int]) -> int:
+            return sum(TubemapKShortestPaths.__lightest_open_edge(graph.nodes[node_ids[i]], node_ids[i + 1]).weight for i in range(len(node_ids) - 1))
+
+        first_path = TubemapKShortestPaths.__spur_search(graph, start_node.id, end_node.id, remaining_weights, next_hops, set(), set())
+        found_paths: List[List[int]] = [first_path]
+        seen_paths: Set[Tuple[int, ...]] = {tuple(first_path)}
+        yield remaining_weights[start_node.id], TubemapKShortestPaths.__to_path_array(graph, first_path)
+
+        #The counter is used as a tie breaker so that the heap never has to compare two lists.
+        counter = 0
+        candidates: List[Tuple[int, int, List[int]]] = []
+
+        while True:
+            previous_path = found_paths[-1]
+            root_weight = 0
+            for i in range(len(previous_path) - 1):
+                root_path = previous_path[:i + 1]
+                spur_node_id = previous_path[i]
+
+                #Block the next edge of every found path that shares this root, and the root itself so that the path stays loopless.
+                blocked_pairs: Set[Tuple[int, int]] = set()
+                for found_path in found_paths:
+                    if len(found_path) > i + 1 and found_path[:i + 1] == root_path:
+                        blocked_pairs.add((spur_node_id, found_path[i + 1]))
+                blocked_node_ids: Set[int] = set(root_path[:-1])
+
+                spur_path = TubemapKShortestPaths.__spur_search(graph, spur_node_id, end_node.id, remaining_weights, next_hops, blocked_node_ids, blocked_pairs)
+                if spur_path is not None:
+                    candidate = root_path[:-1] + spur_path
+                    if tuple(candidate) not in seen_paths:
+                        seen_paths.add(tuple(candidate))
+                        counter += 1
+                        heapq.heappush(candidates, (root_weight + path_weight(spur_path), counter, candidate))
+
+                root_weight += TubemapKShortestPaths.__lightest_open_edge(graph.nodes[spur_node_id], previous_path[i + 1]).weight
+
+            if len(candidates) == 0:
+                return
+
+            weight, _, next_path = heapq.heappop(candidates)
+            found_paths.append(next_path)
+            yield weight, TubemapKShortestPaths.__to_path_array(graph, next_path)
@@ -0,0 +1,96 @@
+from typing import Dict, List, Tuple
+from sys import maxsize as INT_MAX
+import heapq
+from tubemap.core.tubemap_graph import TubemapGraph
+from tubemap.core.tubemap_node import TubemapNode
+
+class _MeetingPointSearch:
+    """A single Dijkstra search from one origin that can be advanced one station at a time."""
+    def __init__(self, origin: TubemapNode) -> None:
+        self.origin: TubemapNode = origin
+        self.path_weights: Dict[int, int] = {origin.id: 0}
+        self.boxed_weights: Dict[int, int] = {}
+        self.queue: List[Tuple[int, int]] = [(0, origin.id)]
+        self.stopped: bool = False
+
+    def frontier(self) -> int:
+        """The weight of the next station that will be boxed (INT_MAX when the search is exhausted)."""
+        while len(self.queue) > 0 and self.queue[0][1] in self.boxed_weights:
+            heapq.heappop(self.queue)
+        return self.queue[0][0] if len(self.queue) > 0 else INT_MAX
+
+    def step(self, graph: TubemapGraph) -> Tuple[int, int]:
+        """Boxes the next station and returns its ID and weight, frontier must be called first."""
+        path_weight, node_id = heapq.heappop(self.queue)
+        self.boxed_weights[node_id] = path_weight
+
+        for neighbouring_node_id, edges in graph.nodes[node_id].adjacency_dict.items():
+            if neighbouring_node_id in self.boxed_weights:
+                continue
+            for edge in edges.values():
+                new_weight = path_weight + edge.weight
+                if edge.closed or new_weight >= self.path_weights.get(neighbouring_node_id, INT_MAX):
+                    continue
+                self.path_weights[neighbouring_node_id] = new_weight
+                heapq.heappush(self.queue, (new_weight, neighbouring_node_id))
+
+        return node_id, path_weight
+
+"""
+* The meeting point is the station that minimises either the longest (max) or the total (sum) travel time from a set of origins.
+* Instead of running a full search from every origin to every candidate station, one search per origin is run at the same time,
+* always advancing the search that is furthest behind so that they all grow outwards at the same rate.
+* A station becomes a candidate once every search has boxed it, at which point its exact score is known.
+* Once a search's frontier reaches the best score found so far, any station it boxes afterwards would score at least that much
+* under both objectives, so that search is stopped, and when every search has stopped the best candidate is the answer.
+"""
+class TubemapMeetingPointSearcher:
+    OBJECTIVES = ["max", "sum"]
+
+    @staticmethod
+    def find_meeting_point(graph: TubemapGraph, origins: List[TubemapNode], objective: str = "max") -> Tuple[TubemapNode, int, List[int]] | None:
+        """Returns the meeting station, its score and the travel time from each origin, or None if the origins can't all reach a common station."""
+        if objective not in TubemapMeetingPointSearcher.OBJECTIVES:
+            raise ValueError(f"Unknown objective '{objective}', expected one of {TubemapMeetingPointSearcher.OBJECTIVES}.")
+        if len(origins) == 0:
+            raise ValueError("At least one origin is required.")
+
+        searches = [_MeetingPointSearch(origin) for origin in origins]
+        #The number of searches that have boxed each station, a station is a candidate once this reaches len(searches).
+        box_counts: Dict[int, int] = {}
+
+        best_node_id: int | None = None
+        best_score = INT_MAX
+
+        while True:
+            #Pick the search with the lowest frontier that hasn't been stopped.
+            next_search: _MeetingPointSearch | None = None
+            next_frontier = INT_MAX
+            for search in searches:
+                if search.stopped:
+                    continue
+                frontier = search.frontier()
+                if frontier >= best_score or frontier == INT_MAX:
+                    search.stopped = True
+                    continue
+                if frontier < next_frontier:
+                    next_search = search
+                    next_frontier = frontier
+
+            if next_search is None:
+                break
+
+            node_id, _ = next_search.step(graph)
+            box_counts[node_id] = box_counts.get(node_id, 0) + 1
+            if box_counts[node_id] < len(searches):
+                continue
+
+            weights = [search.boxed_weights[node_id] for search in searches]
+            score = max(weights) if objective == "max" else sum(weights)
+            if score < best_score:
+                best_score = score
+                best_node_id = node_id
+
+        if best_node_id is None:
+            return None
+        return graph.nodes[best_node_id], best_score, [search.boxed_weights[best_node_id] for search in searches]
@@ -0,0 +1,129 @@
+from typing import Dict, List, Tuple
+from multiprocessing import Pool
+import heapq
+import os
+from tubemap.core.tubemap_shared_graph import TubemapSharedGraph, TubemapSharedGraphReader
+
+#(path weight, [[node ID, ID of the edge to the next node], ...]) as in TubemapAlgorithmStep.path, or None if there is no open path.
+RouteResult = Tuple[int, List[List[int | None]]] | None
+
+"""
+* A pool of worker processes that find shortest paths in a TubemapSharedGraph, so that routing throughput scales with the number of cores.
+* Each worker attaches to the shared graph once when it starts and runs Dijkstra directly on the snapshot's arrays (CSR adjacency, weights and the closed edge bitmap),
+* so the graph is never copied into the workers, and only (start ID, end ID) pairs and results are sent between the processes.
+* Before each chunk of queries a worker checks the shared graph's generation, so once the graph has been published again (e.g. after closures)
+* every later query sees the new closures, and all queries in a chunk are answered from the same generation.
+"""
+class TubemapSharedRoutePool:
+    #The reader used by the worker processes, it is set once when each worker starts.
+    __worker_reader: TubemapSharedGraphReader | None = None
+    #Node ID to snapshot index, rebuilt whenever the worker moves to a new generation.
+    __worker_node_indices: Dict[int, int] = {}
+    __worker_generation: int = 0
+
+    @staticmethod
+    def _worker_initialise(name: str) -> None:
+        TubemapSharedRoutePool.__worker_reader = TubemapSharedGraphReader(name)
+
+    @staticmethod
+    def _worker_find_shortest_paths(pairs: List[Tuple[int, int]]) -> List[RouteResult]:
+        reader = TubemapSharedRoutePool.__worker_reader
+        snapshot = reader.get_snapshot()
+        if reader.generation != TubemapSharedRoutePool.__worker_generation:
+            TubemapSharedRoutePool.__worker_node_indices = {node_id: i for i, node_id in enumerate(snapshot.view("node_ids").tolist())}
+            TubemapSharedRoutePool.__worker_generation = reader.generation
+        node_indices = TubemapSharedRoutePool.__worker_node_indices
+
+        node_ids = snapshot.view("node_ids")
+        edge_ids = snapshot.view("edge_ids")
+        edge_weights = snapshot.view("edge_weights")
+        row_offsets = snapshot.view("row_offsets")
+        neighbours = snapshot.view("neighbours")
+        neighbour_edges = snapshot.view("neighbour_edges")
+        closed_bitmap = snapshot.view("closed_bitmap")
+        node_count = snapshot.node_count
+
+        results: List[RouteResult] = []
+        for start_id, end_id in pairs:
+            start_index = node_indices.get(start_id)
+            end_index = node_indices.get(end_id)
+            if start_index is None or end_index is None:
+                results.append(None)
+                continue
+
+            path_weights = [-1] * node_count
+            #(previous node index, edge index) of the lightest path to each node.
+            previous: List[Tuple[int, int] | None] = [None] * node_count
+            is_boxed = [False] * node_count
+            path_weights[start_index] = 0
+            queue: List[Tuple[int, int]] = [(0, start_index)]
+            while len(queue) > 0:
+                path_weight, node_index = heapq.heappop(queue)
+                if is_boxed[node_index]:
+                    continue
+                is_boxed[node_index] = True
+                if node_index == end_index:
+                    break
+
+                for i in range(row_offsets[node_index], row_offsets[node_index + 1]):
+                    edge_index = neighbour_edges[i]
+                    if (closed_bitmap[edge_index >> 3] >> (edge_index & 7)) & 1:
+                        continue
+                    neighbour_index = neighbours[i]
+                    new_path_weight = path_weight + edge_weights[edge_index]
+                    if path_weights[neighbour_index] == -1 or new_path_weight < path_weights[neighbour_index]:
+                        path_weights[neighbour_index] = new_path_weight
+                        previous[neighbour_index] = (node_index, edge_index)
+                        heapq.heappush(queue, (new_path_weight, neighbour_index))
+
+            if not is_boxed[end_index]:
+                results.append(None)
+                continue
+
+            path: List[List[int | None]] = [[node_ids[end_index], None]]
+            node_index = end_index
+            while previous[node_index] is not None:
+                node_index, edge_index = previous[node_index]
+                path.append([node_ids[node_index], edge_ids[edge_index]])
+            path.reverse()
+            results.append((path_weights[end_index], path))
+        return results
+
+    def __init__(self, shared_graph: TubemapSharedGraph, processes: int | None = None) -> None:
+        """Starts the worker processes, use close when the pool is no longer needed."""
+        self.__processes: int = processes or os.cpu_count() or 1
+        self.__pool = None
+        if self.__processes == 1:
+            #Starting a pool for a single process is just overhead, so the queries are answered here instead.
+            TubemapSharedRoutePool._worker_initialise(shared_graph.name)
+        else:
+            self.__pool = Pool(self.__processes, TubemapSharedRoutePool._worker_initialise, (shared_graph.name,))
+
+    def find_shortest_paths(self, pairs: List[Tuple[int, int]]) -> List[RouteResult]:
+        """Finds the shortest path between each (start node ID, end node ID) pair, the results are in the same order as the pairs."""
+        if self.__pool is None:
+            return TubemapSharedRoutePool._worker_find_shortest_paths(pairs)
+
+        #Several chunks per process so that the work stays balanced.
+        chunk_size = max(1, len(pairs) // (self.__processes * 4))
+        chunks = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+        results: List[RouteResult] = []
+        for chunk_results in self.__pool.imap(TubemapSharedRoutePool._worker_find_shortest_paths, chunks):
+            results.extend(chunk_results)
+        return results
+
+    def close(self) -> None:
+        if self.__pool is not None:
+            self.__pool.close()
+            self.__pool.join()
+            self.__pool = None
+        elif TubemapSharedRoutePool.__worker_reader is not None:
+            TubemapSharedRoutePool.__worker_reader.close()
+            TubemapSharedRoutePool.__worker_reader = None
+            TubemapSharedRoutePool.__worker_generation = 0
+
+    def __enter__(self) -> "TubemapSharedRoutePool":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
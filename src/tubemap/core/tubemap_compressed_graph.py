@@ -0,0 +1,220 @@
+from typing import Dict, List, Set, Tuple
+from algorithms.algorithm import AAlgorithm, PathPart
+from .tubemap_graph import TubemapGraph
+from .tubemap_node import TubemapNode
+from .tubemap_edge import TubemapEdge
+
+class TubemapSuperEdge(TubemapEdge):
+    """An edge that replaces a chain of pass-through stations, it carries the summed weight of the chain and the original edges."""
+    @property
+    def nodes(self) -> List[TubemapNode]:
+        """The original nodes along the chain, including both end points."""
+        return self.__nodes
+
+    @property
+    def edges(self) -> List[TubemapEdge]:
+        """The original edges along the chain, edges[i] connects nodes[i] and nodes[i + 1]."""
+        return self.__edges
+
+    def __init__(self, id: int, nodes: List[TubemapNode], edges: List[TubemapEdge]):
+        super().__init__(id)
+        self.__nodes: List[TubemapNode] = nodes
+        self.__edges: List[TubemapEdge] = edges
+        self.label = edges[0].label
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Recalculates the weight and closed state from the original edges."""
+        self.weight = sum(edge.weight for edge in self.__edges)
+        self.closed = any(edge.closed for edge in self.__edges)
+
+"""
+* Most stations on the tube map are pass-through stops, they have exactly two neighbours and are only served by one line.
+* A shortest path that enters one of these stations can only ever leave through the other side, so a maximal run of them (a chain) can be replaced with a single edge.
+* The compressed graph only keeps the junction stations (every other station) and can be searched by any of the algorithms as it is still a TubemapGraph.
+* Edges that are not part of a chain are shared with the original graph, so closing them needs no extra work,
+* super edges on the other hand have to be refreshed with update_edge when one of their original edges changes.
+"""
+class CompressedTubemapGraph(TubemapGraph):
+    @property
+    def original_graph(self) -> TubemapGraph:
+        return self.__original_graph
+
+    @property
+    def fingerprint(self) -> int:
+        """The original graph's fingerprint, as the compressed graph holds nothing the original doesn't (and its chains are split and joined again around every query)."""
+        return self.__original_graph.fingerprint
+
+    def __init__(self, original_graph: TubemapGraph) -> None:
+        super().__init__()
+        self.__original_graph: TubemapGraph = original_graph
+        #Maps the ID of an original edge to the super edge that contains it.
+        self.__chain_lookup: Dict[int, TubemapSuperEdge] = {}
+        #Maps the ID of a station inside of a chain to the super edge that contains it.
+        self.__interior_lookup: Dict[int, TubemapSuperEdge] = {}
+
+    @staticmethod
+    def __is_pass_through(node: TubemapNode) -> bool:
+        """A station is a pass-through stop if it has two neighbours, each with a single edge on the same line."""
+        if len(node.adjacency_dict) != 2:
+            return False
+        edges = [edge for edge_dict in node.adjacency_dict.values() for edge in edge_dict.values()]
+        return len(edges) == 2 and edges[0].label == edges[1].label
+
+    @staticmethod
+    def compress(graph: TubemapGraph) -> "CompressedTubemapGraph":
+        """Builds a compressed copy of the graph where every maximal chain of pass-through stations is contracted into a super edge."""
+        compressed_graph = CompressedTubemapGraph(graph)
+
+        interior_ids: Set[int] = set(node.id for node in graph.nodes.values() if CompressedTubemapGraph.__is_pass_through(node))
+        junction_ids: List[int] = [node_id for node_id in graph.nodes.keys() if node_id not in interior_ids]
+        visited_edge_ids: Set[int] = set()
+
+        for node_id in junction_ids:
+            compressed_graph.__add_junction(graph.nodes[node_id])
+
+        i = 0
+        while True:
+            #Walk out from every junction, each walk either finds a direct edge to another junction or a chain.
+            while i < len(junction_ids):
+                junction = graph.nodes[junction_ids[i]]
+                i += 1
+                for neighbouring_node_id, edges in junction.adjacency_dict.items():
+                    for edge in edges.values():
+                        if edge.id in visited_edge_ids:
+                            continue
+                        visited_edge_ids.add(edge.id)
+
+                        if neighbouring_node_id not in interior_ids:
+                            compressed_graph.__link(junction.id, neighbouring_node_id, edge)
+                            continue
+
+                        chain_nodes, chain_edges = CompressedTubemapGraph.__walk_chain(graph, junction, edge, interior_ids, visited_edge_ids)
+                        compressed_graph.__link_chain(chain_nodes, chain_edges)
+
+            #Any interior station that has not been reached is part of a closed loop with no junctions, so promote one of its stations and carry on.
+            remaining_ids = [node_id for node_id in interior_ids if node_id not in compressed_graph.__interior_lookup]
+            if len(remaining_ids) == 0:
+                break
+            interior_ids.remove(remaining_ids[0])
+            junction_ids.append(remaining_ids[0])
+            compressed_graph.__add_junction(graph.nodes[remaining_ids[0]])
+
+        return compressed_graph
+
+    @staticmethod
+    def __walk_chain(graph: TubemapGraph, junction: TubemapNode, first_edge: TubemapEdge, interior_ids: Set[int], visited_edge_ids: Set[int]) -> Tuple[List[TubemapNode], List[TubemapEdge]]:
+        """Follows a chain of pass-through stations from a junction until the next junction is reached."""
+        chain_nodes: List[TubemapNode] = [junction]
+        chain_edges: List[TubemapEdge] = [first_edge]
+        current_node = graph.nodes[next(neighbouring_node_id for neighbouring_node_id, edges in junction.adjacency_dict.items() if first_edge.id in edges)]
+
+        while current_node.id in interior_ids:
+            chain_nodes.append(current_node)
+            #A pass-through station only has one other edge, which is the next one along the chain.
+            for neighbouring_node_id, edges in current_node.adjacency_dict.items():
+                edge = next(iter(edges.values()))
+                if edge.id == chain_edges[-1].id:
+                    continue
+                visited_edge_ids.add(edge.id)
+                chain_edges.append(edge)
+                current_node = graph.nodes[neighbouring_node_id]
+                break
+
+        chain_nodes.append(current_node)
+        return chain_nodes, chain_edges
+
+    def __add_junction(self, node: TubemapNode) -> None:
+        compressed_node = TubemapNode(node.id)
+        compressed_node.label = node.label
+        self.nodes[node.id] = compressed_node
+
+    def __link(self, node1_id: int, node2_id: int, edge: TubemapEdge) -> None:
+        """Adds an (original or super) edge between two compressed nodes."""
+        node1 = self.nodes[node1_id]
+        node2 = self.nodes[node2_id]
+        self.edge_list[edge.id] = (node1, node2, edge)
+        node1.add_edge(node2, edge)
+        node2.add_edge(node1, edge)
+
+    def __unlink(self, edge: TubemapEdge) -> None:
+        node1, node2, _ = self.edge_list.pop(edge.id)
+        node1.remove_edge(node2, edge)
+        node2.remove_edge(node1, edge)
+        if len(node1.adjacency_dict.get(node2.id, {})) == 0:
+            node1.remove_all_edges(node2)
+            node2.remove_all_edges(node1)
+
+    def __link_chain(self, chain_nodes: List[TubemapNode], chain_edges: List[TubemapEdge]) -> TubemapSuperEdge:
+        #The ID of the first original edge is used as the super edge's ID as each original edge only belongs to one chain.
+        super_edge = TubemapSuperEdge(chain_edges[0].id, chain_nodes, chain_edges)
+        self.__link(chain_nodes[0].id, chain_nodes[-1].id, super_edge)
+        for edge in chain_edges:
+            self.__chain_lookup[edge.id] = super_edge
+        for node in chain_nodes[1:-1]:
+            self.__interior_lookup[node.id] = super_edge
+        return super_edge
+
+    def update_edge(self, edge: TubemapEdge) -> None:
+        """Must be called after an original edge's weight or closed state has changed."""
+        super_edge = self.__chain_lookup.get(edge.id)
+        if super_edge is not None:
+            super_edge.refresh()
+
+    def __expose(self, node: TubemapNode) -> TubemapSuperEdge | None:
+        """Splits the chain that the station is inside of so that it becomes a junction, returns the super edge that was split (if any)."""
+        super_edge = self.__interior_lookup.get(node.id)
+        if super_edge is None or node.id in self.nodes:
+            return None
+
+        index = next(i for i, chain_node in enumerate(super_edge.nodes) if chain_node.id == node.id)
+        self.__unlink(super_edge)
+        self.__add_junction(node)
+        self.__link_chain(super_edge.nodes[:index + 1], super_edge.edges[:index])
+        self.__link_chain(super_edge.nodes[index:], super_edge.edges[index:])
+        return super_edge
+
+    def __restore(self, node: TubemapNode, super_edge: TubemapSuperEdge) -> None:
+        """Reverts a call to __expose."""
+        index = next(i for i, chain_node in enumerate(super_edge.nodes) if chain_node.id == node.id)
+        self.__unlink(self.__chain_lookup[super_edge.edges[0].id])
+        self.__unlink(self.__chain_lookup[super_edge.edges[index].id])
+        del self.nodes[node.id]
+        super_edge.refresh()
+        self.__link_chain(super_edge.nodes, super_edge.edges)
+
+    def expand_path(self, path: List[PathPart]) -> List[PathPart]:
+        """Converts a path found on the compressed graph back into a path on the original graph."""
+        expanded_path: List[PathPart] = []
+        for part in path:
+            original_node = self.__original_graph.nodes[part.node.id]
+            if not isinstance(part.edge, TubemapSuperEdge):
+                expanded_path.append(PathPart(original_node, part.edge))
+                continue
+
+            #Super edges are stored in one direction, so walk them backwards if the path enters from the other end.
+            chain_nodes = part.edge.nodes
+            chain_edges = part.edge.edges
+            if chain_nodes[0].id != part.node.id:
+                chain_nodes = chain_nodes[::-1]
+                chain_edges = chain_edges[::-1]
+            for i in range(len(chain_edges)):
+                expanded_path.append(PathPart(chain_nodes[i], chain_edges[i]))
+        return expanded_path
+
+    def find_shortest_path(self, algorithm: AAlgorithm, start_node: TubemapNode, end_node: TubemapNode) -> List[PathPart]:
+        """Runs an algorithm on the compressed graph between two original stations and returns the path on the original graph."""
+        #Start and end stations inside of a chain are temporarily made into junctions for the duration of the query.
+        exposed: List[Tuple[TubemapNode, TubemapSuperEdge]] = []
+        try:
+            for node in (start_node, end_node):
+                super_edge = self.__expose(node)
+                if super_edge is not None:
+                    exposed.append((node, super_edge))
+
+            path = algorithm.find_shortest_path(self, self.nodes[start_node.id], self.nodes[end_node.id])
+        finally:
+            for node, super_edge in reversed(exposed):
+                self.__restore(node, super_edge)
+
+        return self.expand_path(path)
@@ -0,0 +1,76 @@
+from typing import Dict, Iterable, List, Set, Tuple
+import csv
+from .tubemap_graph import TubemapGraph, pause_garbage_collector
+from .tubemap_node import TubemapNode
+from .tubemap_edge import TubemapEdge
+
+"""
+* Builds a TubemapGraph straight from the raw London Underground CSV, without going through the C# csvToJson tool.
+* Each row is "line,station,next station,minutes", where rows without a next station only declare the station.
+* The rows are streamed one at a time and station names are looked up in a dict, so the whole load is a single linear pass and the file is never held in memory.
+* A station that appears on several lines is a single node, and two stations joined by more than one line get one (parallel) edge per line.
+* Node and edge IDs are given out in the order they are first seen, so loading the same file always gives the same IDs,
+* these don't match the IDs in a graph converted by the C# tool, so files kept for one (e.g. the journal) are never used with the other (see Graph.fingerprint).
+* A row that joins two stations without naming a line is skipped with a warning, rather than becoming an edge that isn't on any line.
+"""
+class TubemapCSVLoader:
+    @staticmethod
+    def load_from_file(file_path: str, warnings: List[str] | None = None) -> TubemapGraph:
+        with open(file_path, "r", encoding="utf-8", newline="") as file:
+            return TubemapCSVLoader.load_from_rows(csv.reader(file), warnings)
+
+    @staticmethod
+    def load_from_rows(rows: Iterable[List[str]], warnings: List[str] | None = None) -> TubemapGraph:
+        """
+        Builds a graph from an iterable of CSV rows (e.g. a csv.reader), a ValueError is raised for a malformed row.
+        If warnings is set, a message is added to it for every row that was skipped.
+        """
+        graph = TubemapGraph()
+        nodes = graph.nodes
+        edge_list = graph.edge_list
+        #The station name index, this is what keeps the load linear as every row refers to its stations by name.
+        station_index: Dict[str, TubemapNode] = {}
+        #(lower node ID, higher node ID, line, minutes) of every edge, so that a connection listed in both directions is only added once.
+        seen_edges: Set[Tuple[int, int, str, int]] = set()
+
+        def get_station(name: str) -> TubemapNode:
+            node = station_index.get(name)
+            if node is None:
+                node = TubemapNode(len(nodes) + 1)
+                node.label = name
+                nodes[node.id] = node
+                station_index[name] = node
+            return node
+
+        with pause_garbage_collector():
+            for row_number, row in enumerate(rows, 1):
+                if len(row) == 0 or (len(row) == 1 and row[0].strip() == ""):
+                    continue
+                if len(row) != 4:
+                    raise ValueError(f"Row {row_number} has {len(row)} fields (expected 4).")
+
+                line, station, next_station, minutes = (field.strip() for field in row)
+                node = get_station(station)
+                if next_station == "" or minutes == "":
+                    continue
+                if not minutes.isdigit():
+                    raise ValueError(f"Row {row_number} has an invalid number of minutes ('{minutes}').")
+                if line == "":
+                    if warnings is not None:
+                        warnings.append(f"Row {row_number} joins '{station}' and '{next_station}' without naming a line, so it was skipped.")
+                    continue
+
+                next_node = get_station(next_station)
+                weight = int(minutes)
+                edge_key = (node.id, next_node.id, line, weight) if node.id < next_node.id else (next_node.id, node.id, line, weight)
+                if edge_key in seen_edges:
+                    continue
+                seen_edges.add(edge_key)
+
+                edge = TubemapEdge(len(edge_list) + 1, weight)
+                edge.label = line
+                edge_list[edge.id] = (node, next_node, edge)
+                node.adjacency_dict.setdefault(next_node.id, {})[edge.id] = edge
+                next_node.adjacency_dict.setdefault(node.id, {})[edge.id] = edge
+
+        return graph
@@ -1,4 +1,4 @@
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
 from core.edge import Edge, SerializedEdge
 
 class SerializedTubemapEdge(SerializedEdge):
@@ -19,10 +19,17 @@ class SerializedTubemapEdge(SerializedEdge):
         return edge
 
 class TubemapEdge(Edge):
+    _FINGERPRINT_FIELDS = ("weight", "closed")
+
     def __init__(self, id: int, weight: int = 1):
         super().__init__(id, weight)
-        self.closed = False
-        self.label = ""
+        #See Edge.__init__.
+        fields = self.__dict__
+        fields["closed"] = False
+        fields["label"] = ""
+
+    def _get_fingerprint_values(self) -> Tuple[int, ...]:
+        return (self.weight, int(self.closed))
 
     def serialize(self) -> SerializedTubemapEdge:
         base_serialized_edge = super().serialize()
@@ -30,6 +37,7 @@ class TubemapEdge(Edge):
         serialized_edge.id = base_serialized_edge.id
         serialized_edge.weight = base_serialized_edge.weight
         serialized_edge.closed = self.closed
+        serialized_edge.label = self.label
         return serialized_edge
 
     @staticmethod
@@ -1,10 +1,27 @@
-from typing import Dict, List
+from typing import Dict, Iterator, List, Any, TextIO
+from contextlib import contextmanager
+from time import perf_counter
 import json
 import random
+import gc
 from core.graph import Graph, SerializedGraph, INT_MAX
 from .tubemap_node import TubemapNode, SerializedTubemapNode
 from .tubemap_edge import TubemapEdge
 
+@contextmanager
+def pause_garbage_collector() -> Iterator[None]:
+    """
+    Pauses the garbage collector for a whole graph load (parsing or reading the file and building the graph).
+    Creating this many objects triggers the garbage collector over and over, but none of them are garbage yet.
+    """
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
 class SerializedTubemapGraph(SerializedGraph):
     def __init__(self) -> None:
         self.nodes: List[SerializedTubemapNode] = []
@@ -17,10 +34,50 @@ class SerializedTubemapGraph(SerializedGraph):
         return graph
 
     @staticmethod
-    def load_from_file(file_path: str) -> "TubemapGraph":
-        with open(file_path, "r") as file:
-            serialized_graph = SerializedTubemapGraph.from_json(file.read())
-            return TubemapGraph.deserialize(serialized_graph)
+    def open_file(file_path: str, mode: str) -> TextIO:
+        """Opens a graph file as text ("r" or "w"), files ending in .gz or .xz are (de)compressed as they are read or written."""
+        #The compression modules are only imported when needed, as most graph files aren't compressed.
+        if file_path.endswith(".gz"):
+            import gzip
+            return gzip.open(file_path, mode + "t", encoding="utf-8")
+        elif file_path.endswith(".xz"):
+            import lzma
+            return lzma.open(file_path, mode + "t", encoding="utf-8")
+        return open(file_path, mode, encoding="utf-8")
+
+    def save_to_file(self, file_path: str) -> None:
+        with SerializedTubemapGraph.open_file(file_path, "w") as file:
+            file.write(self.to_json())
+
+    @staticmethod
+    def load_from_file(file_path: str, timings: Dict[str, float] | None = None) -> "TubemapGraph":
+        """
+        Loads a graph straight from the parsed JSON without building the Serialized* objects, if timings is set it is filled with the time taken by each phase (in seconds).
+        The compact format is parsed one entry at a time as the file is read (and decompressed), so the whole text is never held in memory,
+        the original format has to be parsed as a whole.
+        """
+        with pause_garbage_collector():
+            start_time = perf_counter()
+            with SerializedTubemapGraph.open_file(file_path, "r") as file:
+                reader = _CompactGraphReader(file)
+                is_compact = reader.is_compact()
+                if is_compact:
+                    graph = TubemapGraph._from_compact_entries(reader.iterate_array("nodes"), reader.iterate_array("edges"))
+                else:
+                    obj = json.loads(reader.read_all())
+            parse_time = perf_counter()
+            if not is_compact:
+                graph = TubemapGraph.from_obj(obj)
+            build_time = perf_counter()
+
+        if timings is not None:
+            if is_compact:
+                #The graph is built while the file is parsed, so the two phases can't be timed separately.
+                timings["stream"] = parse_time - start_time
+            else:
+                timings["parse"] = parse_time - start_time
+                timings["build"] = build_time - parse_time
+        return graph
 
 class TubemapGraph(Graph):
     @property
@@ -31,19 +88,26 @@ class TubemapGraph(Graph):
     def edge_list(self) -> Dict[int, tuple[TubemapNode, TubemapNode, TubemapEdge]]:
         return super().edge_list
 
+    #The version number of the compact format written by save_to_file, the original format has no version number.
+    COMPACT_FORMAT_VERSION = 2
+
     def __init__(self) -> None:
         super().__init__()
         # self.__nodes: Dict[int, TubemapNode] = {}
         # self.__edge_list: Dict[int, tuple[TubemapNode, TubemapNode, TubemapEdge]] = {}
 
-    def add_node(self) -> TubemapNode:
+    def add_node(self, id: int | None = None) -> TubemapNode:
         """Adds a node to the graph."""
-        id = 0
-        while id == 0 or id in self.__nodes:
-            id = random.randint(0, INT_MAX)
+        if id is None:
+            id = 0
+            while id == 0 or id in self.nodes:
+                id = random.randint(0, INT_MAX)
+        elif id in self.nodes:
+            raise KeyError(f"Node with ID {id} already exists.")
 
         node = TubemapNode(id)
-        self.__nodes[id] = node
+        self.nodes[id] = node
+        self._add_node_fingerprint(node)
 
         return node
 
@@ -58,6 +122,7 @@ class TubemapGraph(Graph):
 
         edge = TubemapEdge(id, weight)
         self.edge_list[id] = (node1, node2, edge)
+        self._add_edge_fingerprint(edge)
 
         node1.add_edge(node2, edge)
         node2.add_edge(node1, edge)
@@ -70,6 +135,96 @@ class TubemapGraph(Graph):
         serialized_graph.nodes = base_serialized_graph.nodes
         return serialized_graph
 
+    @staticmethod
+    def from_obj(obj: Dict[str, Any]) -> "TubemapGraph":
+        """Builds a graph in a single pass over the parsed JSON object, either format can be read, this is quickest within pause_garbage_collector (as load_from_file does)."""
+        if obj.get("version") == TubemapGraph.COMPACT_FORMAT_VERSION:
+            return TubemapGraph._from_compact_entries(iter(obj["nodes"]), iter(obj["edges"]))
+
+        graph = TubemapGraph()
+        nodes = graph.nodes
+        edge_list = graph.edge_list
+        #The adjacency dicts are fetched once per node and filled in directly, going through the add_edge methods costs more than building the edge itself.
+        adjacency_dicts: Dict[int, Dict[int, Dict[int, TubemapEdge]]] = {}
+
+        for node_obj in obj["nodes"]:
+            node = TubemapNode(node_obj["id"])
+            node.label = node_obj.get("label", "")
+            nodes[node.id] = node
+            adjacency_dicts[node.id] = node.adjacency_dict
+
+        for node_obj in obj["nodes"]:
+            node_id = node_obj["id"]
+            node = nodes[node_id]
+            for neighbour_node_id, edge_objs in node_obj["adjacencyList"].items():
+                neighbour_node_id = int(neighbour_node_id)
+                for edge_obj in edge_objs:
+                    edge_id = edge_obj["id"]
+                    #Every edge is listed by both of its nodes, so skip it the second time it is seen.
+                    if edge_id in edge_list:
+                        continue
+                    edge = TubemapEdge(edge_id, edge_obj["weight"])
+                    edge.closed = edge_obj.get("closed", False)
+                    edge.label = edge_obj.get("label", "")
+                    edge_list[edge_id] = (node, nodes[neighbour_node_id], edge)
+                    adjacency_dicts[node_id].setdefault(neighbour_node_id, {})[edge_id] = edge
+                    adjacency_dicts[neighbour_node_id].setdefault(node_id, {})[edge_id] = edge
+
+        return graph
+
+    @staticmethod
+    def _from_compact_entries(node_entries: Iterator[List[Any]], edge_entries: Iterator[List[Any]]) -> "TubemapGraph":
+        """Builds a graph from the node and edge entries of the compact format, every node entry is read before the first edge entry (see from_obj for the garbage collector)."""
+        graph = TubemapGraph()
+        nodes = graph.nodes
+        edge_list = graph.edge_list
+
+        for node_id, label in node_entries:
+            node = TubemapNode(node_id)
+            node.label = label
+            nodes[node_id] = node
+
+        for edge_entry in edge_entries:
+            node1 = nodes[edge_entry[0]]
+            node2 = nodes[edge_entry[1]]
+            #The edge ID is optional, one is generated if it is missing.
+            edge_id = edge_entry[5] if len(edge_entry) > 5 else None
+            if edge_id is None or edge_id in edge_list:
+                edge = graph.add_edge(node1, node2, edge_entry[2])
+            else:
+                edge = TubemapEdge(edge_id, edge_entry[2])
+                edge_list[edge_id] = (node1, node2, edge)
+                node1.adjacency_dict.setdefault(node2.id, {})[edge_id] = edge
+                node2.adjacency_dict.setdefault(node1.id, {})[edge_id] = edge
+            edge.label = edge_entry[3]
+            edge.closed = edge_entry[4]
+
+        return graph
+
+    def save_to_file(self, file_path: str) -> None:
+        """
+        Saves the graph in the compact format, where every edge is written once rather than once per end point:
+        {"version": 2, "nodes": [[id, label], ...], "edges": [[node1 id, node2 id, weight, line, closed, id], ...]}
+        Each entry is encoded and written on its own, so the whole document is never held in memory.
+        Files ending in .gz or .xz are compressed as they are written.
+        """
+        encoder = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False)
+        with SerializedTubemapGraph.open_file(file_path, "w") as file:
+            file.write(f'{{"version":{TubemapGraph.COMPACT_FORMAT_VERSION},"nodes":[')
+            separator = ""
+            for node in self.nodes.values():
+                file.write(separator)
+                file.write(encoder.encode([node.id, node.label]))
+                separator = ","
+
+            file.write('],"edges":[')
+            separator = ""
+            for node1, node2, edge in self.edge_list.values():
+                file.write(separator)
+                file.write(encoder.encode([node1.id, node2.id, edge.weight, edge.label, edge.closed, edge.id]))
+                separator = ","
+            file.write("]}")
+
     @staticmethod
     def deserialize(serialized_graph: SerializedTubemapGraph) -> "TubemapGraph":
         graph = TubemapGraph()
@@ -91,3 +246,77 @@ class TubemapGraph(Graph):
                         pass
 
         return graph
+
+class _CompactGraphReader:
+    """Reads the compact format written by TubemapGraph.save_to_file one array entry at a time, holding at most a chunk or so of the text."""
+    __CHUNK_SIZE = 1 << 16
+    #save_to_file always writes the keys in this order without whitespace, anything else is parsed as a whole.
+    __PREFIX = f'{{"version":{TubemapGraph.COMPACT_FORMAT_VERSION},"nodes":'
+
+    def __init__(self, file: TextIO) -> None:
+        self.__file: TextIO = file
+        self.__decoder = json.JSONDecoder()
+        self.__buffer: str = ""
+        self.__position: int = 0
+        while len(self.__buffer) < len(_CompactGraphReader.__PREFIX) and self.__read_chunk():
+            pass
+        self.__is_compact: bool = self.__buffer.startswith(_CompactGraphReader.__PREFIX)
+
+    def is_compact(self) -> bool:
+        return self.__is_compact
+
+    def read_all(self) -> str:
+        """Reads the rest of the file, for documents that can't be streamed."""
+        return self.__buffer[self.__position:] + self.__file.read()
+
+    def __read_chunk(self) -> bool:
+        chunk = self.__file.read(_CompactGraphReader.__CHUNK_SIZE)
+        if chunk == "":
+            return False
+        #Drop the part of the buffer that has already been parsed before adding to it.
+        self.__buffer = self.__buffer[self.__position:] + chunk
+        self.__position = 0
+        return True
+
+    def __next_character(self) -> str:
+        """Skips any whitespace and returns the next character without consuming it."""
+        while True:
+            while self.__position < len(self.__buffer) and self.__buffer[self.__position] in " \t\r\n":
+                self.__position += 1
+            if self.__position < len(self.__buffer):
+                return self.__buffer[self.__position]
+            if not self.__read_chunk():
+                raise ValueError("Unexpected end of the graph file.")
+
+    def __expect(self, characters: str) -> None:
+        for character in characters:
+            if self.__next_character() != character:
+                raise ValueError(f"Expected '{character}' in the graph file.")
+            self.__position += 1
+
+    def iterate_array(self, key: str) -> Iterator[Any]:
+        """Yields each entry of the array stored under the key, the keys must be read in the order they were written."""
+        if key == "nodes":
+            self.__position = len(_CompactGraphReader.__PREFIX)
+        else:
+            self.__expect(f',"{key}":')
+        self.__expect("[")
+        if self.__next_character() == "]":
+            self.__position += 1
+            return
+
+        while True:
+            self.__next_character()
+            try:
+                entry, self.__position = self.__decoder.raw_decode(self.__buffer, self.__position)
+            except json.JSONDecodeError:
+                #Every entry is an array, so it can only fail to decode here if it is cut off at the end of the buffer.
+                if not self.__read_chunk():
+                    raise
+                continue
+            yield entry
+
+            if self.__next_character() == "]":
+                self.__position += 1
+                return
+            self.__expect(",")
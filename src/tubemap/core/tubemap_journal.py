@@ -0,0 +1,194 @@
+from typing import Any, BinaryIO, Callable, Dict
+import json
+import os
+from .tubemap_graph import TubemapGraph
+from .tubemap_node import TubemapNode
+from .tubemap_edge import TubemapEdge
+
+"""
+* An append-only log of changes to a graph, kept next to the graph file so that a change can be saved without rewriting the whole graph.
+* Each change is one JSON object on its own line (an edge's weight and closed state, or a node or edge being added or removed),
+* and every record holds the absolute new state (e.g. closed = true rather than "toggle", and adding something that already exists does nothing),
+* so replaying a record that has already been applied (e.g. after a crash part way through compaction) does no harm.
+* The first line is a header holding the fingerprint of the graph the records were made against (see Graph.fingerprint),
+* if the graph file has been changed since (e.g. edited by hand) the records no longer describe it, so they are set aside rather than replayed.
+* If the program stops part way through writing a record, the incomplete line is dropped (and cut from the file) the next time the journal is replayed,
+* and so is a record that can be read but isn't a valid change, along with anything after it.
+* Compaction writes the current graph out (the program writes it to the snapshot, leaving the graph file alone) and then empties the journal.
+"""
+class TubemapJournal:
+    #The number of records after which compaction should be run.
+    COMPACTION_THRESHOLD = 1000
+    #Where a journal that doesn't match the graph is moved to, relative to the journal.
+    REJECTED_SUFFIX = ".rejected"
+    #The fields of each kind of record and their types (bool is checked separately as it is also an int).
+    __RECORD_FIELDS: Dict[str, Dict[str, type]] = {
+        "edge": {"id": int, "weight": int, "closed": bool},
+        "add_node": {"id": int, "label": str},
+        "remove_node": {"id": int},
+        "add_edge": {"id": int, "node1": int, "node2": int, "weight": int, "label": str, "closed": bool},
+        "remove_edge": {"id": int}
+    }
+
+    @property
+    def record_count(self) -> int:
+        """The number of records in the journal."""
+        return self.__record_count
+
+    @property
+    def warning(self) -> str | None:
+        """Why some or all of the journal couldn't be replayed the last time replay was called, or None if it was replayed in full."""
+        return self.__warning
+
+    def __init__(self, file_path: str, durable: bool = False) -> None:
+        """
+        If durable is set, every record is flushed to the disk (fsync) before the call returns rather than just to the OS.
+        replay must be called before anything is recorded, so that the journal knows which graph it belongs to.
+        """
+        self.__file_path: str = file_path
+        self.__durable: bool = durable
+        self.__file: BinaryIO | None = None
+        self.__record_count: int = 0
+        self.__base_fingerprint: int | None = None
+        self.__warning: str | None = None
+
+    def close(self) -> None:
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+    def __append(self, record: Dict[str, Any]) -> None:
+        if self.__base_fingerprint is None:
+            raise ValueError("The journal must be replayed onto its graph before anything can be recorded.")
+        if self.__file is None:
+            self.__file = open(self.__file_path, "ab")
+            if self.__file.tell() == 0:
+                self.__file.write(TubemapJournal.__encode({"op": "header", "base": self.__base_fingerprint}))
+        self.__file.write(TubemapJournal.__encode(record))
+        self.__file.flush()
+        if self.__durable:
+            os.fsync(self.__file.fileno())
+        self.__record_count += 1
+
+    @staticmethod
+    def __encode(record: Dict[str, Any]) -> bytes:
+        return json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n"
+
+    def record_edge(self, edge: TubemapEdge) -> None:
+        """Records the current weight and closed state of an edge (this covers closing, opening and time changes)."""
+        self.__append({"op": "edge", "id": edge.id, "weight": edge.weight, "closed": edge.closed})
+
+    def record_add_node(self, node: TubemapNode) -> None:
+        self.__append({"op": "add_node", "id": node.id, "label": node.label})
+
+    def record_remove_node(self, node: TubemapNode) -> None:
+        """Removing a node also removes its edges, so they don't need recording separately."""
+        self.__append({"op": "remove_node", "id": node.id})
+
+    def record_add_edge(self, node1: TubemapNode, node2: TubemapNode, edge: TubemapEdge) -> None:
+        self.__append({"op": "add_edge", "id": edge.id, "node1": node1.id, "node2": node2.id, "weight": edge.weight, "label": edge.label, "closed": edge.closed})
+
+    def record_remove_edge(self, edge: TubemapEdge) -> None:
+        self.__append({"op": "remove_edge", "id": edge.id})
+
+    @staticmethod
+    def __apply(graph: TubemapGraph, record: Dict[str, Any]) -> None:
+        """Raises KeyError, TypeError or ValueError (without changing the graph) if the record isn't a valid change."""
+        fields = TubemapJournal.__RECORD_FIELDS.get(record["op"])
+        if fields is None:
+            raise ValueError(f"Unknown journal operation '{record['op']}'.")
+        for name, field_type in fields.items():
+            value = record[name]
+            if not isinstance(value, field_type) or (field_type is int and isinstance(value, bool)):
+                raise TypeError(f"The record's {name} is the wrong type.")
+
+        op = record["op"]
+        if op == "edge":
+            if record["id"] in graph.edge_list:
+                edge = graph.edge_list[record["id"]][2]
+                edge.weight = record["weight"]
+                edge.closed = record["closed"]
+        elif op == "add_node":
+            if record["id"] not in graph.nodes:
+                graph.add_node(record["id"]).label = record["label"]
+        elif op == "remove_node":
+            if record["id"] in graph.nodes:
+                graph.remove_node(graph.nodes[record["id"]])
+        elif op == "add_edge":
+            if record["id"] not in graph.edge_list:
+                #The records are replayed in order, so the end points were added (and not yet removed) when the edge was recorded.
+                node1, node2 = graph.nodes[record["node1"]], graph.nodes[record["node2"]]
+                edge = graph.add_edge(node1, node2, record["weight"], record["id"])
+                edge.label = record["label"]
+                edge.closed = record["closed"]
+        elif op == "remove_edge":
+            if record["id"] in graph.edge_list:
+                graph.remove_edge(graph.edge_list[record["id"]][2])
+
+    def replay(self, graph: TubemapGraph, read_only: bool = False) -> int:
+        """
+        Applies every complete record in the journal to the graph and returns the number of records applied.
+        If the journal was made against a different graph nothing is applied and it is moved aside (see REJECTED_SUFFIX), warning says why.
+        If read_only is set the file is left exactly as it is (nothing is cut off or moved), the journal can't be recorded to after this.
+        """
+        self.close()
+        self.__record_count = 0
+        self.__warning = None
+        base_fingerprint = graph.fingerprint
+        self.__base_fingerprint = base_fingerprint if not read_only else None
+        if not os.path.exists(self.__file_path):
+            return 0
+
+        valid_length = 0
+        with open(self.__file_path, "rb") as file:
+            header_line = file.readline()
+            #A header that was cut off part way through writing has nothing after it, so the journal is just emptied.
+            if header_line.endswith(b"\n"):
+                try:
+                    header = json.loads(header_line)
+                except ValueError:
+                    header = None
+                if not isinstance(header, dict) or header.get("op") != "header" or header.get("base") != base_fingerprint:
+                    self.__warning = "The journal was not made against the current graph file, so it was not replayed."
+                    if not read_only:
+                        file.close()
+                        os.replace(self.__file_path, self.__file_path + TubemapJournal.REJECTED_SUFFIX)
+                        self.__warning = f"{self.__warning[:-1]} (it has been moved to {self.__file_path + TubemapJournal.REJECTED_SUFFIX})."
+                    return 0
+                valid_length = len(header_line)
+
+            for line in file:
+                #A line without a newline at the end (or one that can't be read) was cut off part way through writing, so it and anything after it is ignored.
+                if not line.endswith(b"\n"):
+                    self.__warning = "The last change in the journal was only partly written, so it was not replayed."
+                    break
+                try:
+                    TubemapJournal.__apply(graph, json.loads(line))
+                except (KeyError, TypeError, ValueError):
+                    self.__warning = f"Change {self.__record_count + 1} in the journal is not valid, so it and any changes after it were not replayed."
+                    break
+                valid_length += len(line)
+                self.__record_count += 1
+
+        if read_only:
+            return self.__record_count
+
+        #Cut off any incomplete record so that new records are appended after the last complete one.
+        if valid_length != os.path.getsize(self.__file_path):
+            with open(self.__file_path, "r+b") as file:
+                file.truncate(valid_length)
+
+        return self.__record_count
+
+    def compact(self, graph: TubemapGraph, write_graph: Callable[[], None]) -> None:
+        """
+        Writes the graph out with the given callback and then empties the journal, which is then based on the graph as it is now.
+        If the callback raises, the journal is left exactly as it was (and can still be recorded to).
+        """
+        #The graph must be fully written before the journal is emptied, if this is interrupted the journal no longer matches the written graph and is set aside when it is next replayed.
+        write_graph()
+        self.close()
+        with open(self.__file_path, "wb"):
+            pass
+        self.__record_count = 0
+        self.__base_fingerprint = graph.fingerprint
@@ -0,0 +1,274 @@
+from typing import Callable, Dict, Iterator, List, Mapping, Tuple
+from itertools import count
+from threading import Lock
+from weakref import WeakKeyDictionary
+from .tubemap_graph import TubemapGraph
+from .tubemap_node import TubemapNode
+from .tubemap_edge import TubemapEdge
+
+class _EdgeIndex:
+    """Gives every edge of a graph a bit in the closed edge bitset, edges added later are given the next free bit."""
+    def __init__(self) -> None:
+        self.indices: Dict[int, int] = {}
+        self.__next_index = count()
+
+    def get(self, edge_id: int) -> int:
+        index = self.indices.get(edge_id)
+        if index is None:
+            #next() on a count is atomic, so threads adding the same edge at once can only waste a bit, not share one.
+            index = self.indices.setdefault(edge_id, next(self.__next_index))
+        return index
+
+class _ScenarioEdge:
+    """An edge as seen through a scenario, the weight and closed state are read from (and written to) the scenario rather than the graph."""
+    __slots__ = ("__edge", "__scenario")
+
+    @property
+    def id(self) -> int:
+        return self.__edge.id
+
+    @property
+    def label(self) -> str:
+        return self.__edge.label
+
+    @property
+    def weight(self) -> int:
+        return self.__scenario.get_weight(self.__edge)
+    @weight.setter
+    def weight(self, value: int) -> None:
+        self.__scenario.set_weight(self.__edge, value)
+
+    @property
+    def closed(self) -> bool:
+        return self.__scenario.is_closed(self.__edge)
+    @closed.setter
+    def closed(self, value: bool) -> None:
+        self.__scenario.set_closed(self.__edge, value)
+
+    def __init__(self, edge: TubemapEdge, scenario: "TubemapScenario") -> None:
+        self.__edge: TubemapEdge = edge
+        self.__scenario: TubemapScenario = scenario
+
+    def _get_fingerprint_values(self) -> Tuple[int, ...]:
+        return (self.weight, int(self.closed))
+
+class _ScenarioNode:
+    """A node as seen through a scenario, its adjacency dict holds the scenario's view of each edge."""
+    __slots__ = ("__node", "__scenario")
+
+    @property
+    def id(self) -> int:
+        return self.__node.id
+
+    @property
+    def label(self) -> str:
+        return self.__node.label
+
+    @property
+    def adjacency_dict(self) -> Dict[int, Dict[int, _ScenarioEdge]]:
+        #This is built when it is asked for rather than stored, as it is only a few entries per station.
+        get_edge = self.__scenario._get_edge
+        return {neighbour_id: {edge_id: get_edge(edge) for edge_id, edge in edges.items()} for neighbour_id, edges in self.__node.adjacency_dict.items()}
+
+    def __init__(self, node: TubemapNode, scenario: "TubemapScenario") -> None:
+        self.__node: TubemapNode = node
+        self.__scenario: TubemapScenario = scenario
+
+class _ScenarioNodes(Mapping):
+    def __init__(self, graph: TubemapGraph, scenario: "TubemapScenario") -> None:
+        self.__nodes = graph.nodes
+        self.__scenario = scenario
+
+    def __getitem__(self, node_id: int) -> _ScenarioNode:
+        return self.__scenario._get_node(self.__nodes[node_id])
+
+    def __contains__(self, node_id: object) -> bool:
+        return node_id in self.__nodes
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.__nodes)
+
+    def __len__(self) -> int:
+        return len(self.__nodes)
+
+class _ScenarioEdgeList(Mapping):
+    def __init__(self, graph: TubemapGraph, scenario: "TubemapScenario") -> None:
+        self.__edge_list = graph.edge_list
+        self.__scenario = scenario
+
+    def __getitem__(self, edge_id: int) -> Tuple[_ScenarioNode, _ScenarioNode, _ScenarioEdge]:
+        node1, node2, edge = self.__edge_list[edge_id]
+        return self.__scenario._get_node(node1), self.__scenario._get_node(node2), self.__scenario._get_edge(edge)
+
+    def __contains__(self, edge_id: object) -> bool:
+        return edge_id in self.__edge_list
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.__edge_list)
+
+    def __len__(self) -> int:
+        return len(self.__edge_list)
+
+class _ScenarioGraph(TubemapGraph):
+    """A read-only view of a graph through a scenario, which can be passed to any of the algorithms in place of the graph."""
+    @property
+    def nodes(self) -> Mapping[int, _ScenarioNode]:
+        return self.__nodes
+
+    @property
+    def edge_list(self) -> Mapping[int, Tuple[_ScenarioNode, _ScenarioNode, _ScenarioEdge]]:
+        return self.__edge_list
+
+    @property
+    def fingerprint(self) -> int:
+        #The edges are views that can't tell the graph when they change, so the scenario is hashed in full every time.
+        return self._calculate_fingerprint()
+
+    def __init__(self, graph: TubemapGraph, scenario: "TubemapScenario") -> None:
+        super().__init__()
+        self.__nodes = _ScenarioNodes(graph, scenario)
+        self.__edge_list = _ScenarioEdgeList(graph, scenario)
+
+    def add_node(self, id: int | None = None) -> TubemapNode:
+        raise TypeError("Stations can't be added to a scenario.")
+
+    def remove_node(self, node: TubemapNode) -> None:
+        raise TypeError("Stations can't be removed from a scenario.")
+
+    def add_edge(self, node1: TubemapNode, node2: TubemapNode, weight: int, id: int | None = None) -> TubemapEdge:
+        raise TypeError("Lines can't be added to a scenario.")
+
+    def remove_edge(self, edge: TubemapEdge) -> None:
+        raise TypeError("Lines can't be removed from a scenario, close them instead.")
+
+"""
+* A scenario is a "what if" set of closures and journey times laid over a graph, without changing the graph itself.
+* The closed state of every edge is held in a bitset (a Python int, one bit per edge) and the journey times in a dict, both captured from the graph when the scenario is made
+* so later changes to the graph don't leak into it, and journey times changed in the scenario are held in a dict of overrides on top of the captured ones.
+* As ints are immutable, forking a scenario just shares the bitset, and each change makes a new int (copy on write), the captured journey times are never changed so they are shared too.
+* scenario.graph can be given to any algorithm in place of the graph, and as nothing is shared between scenarios except the (unchanged) graph,
+* many scenarios can be searched on different threads at once without any locking.
+* Making a scenario and promoting one (writing its state back to the graph) are the only operations that lock,
+* so a scenario is always made from a graph that is entirely before or after a promotion.
+"""
+class TubemapScenario:
+    #One lock and edge index per graph, shared by all of its scenarios.
+    __promotion_locks: "WeakKeyDictionary[TubemapGraph, Lock]" = WeakKeyDictionary()
+    __edge_indices: "WeakKeyDictionary[TubemapGraph, _EdgeIndex]" = WeakKeyDictionary()
+    __setup_lock = Lock()
+
+    @property
+    def base_graph(self) -> TubemapGraph:
+        return self.__base_graph
+
+    @property
+    def graph(self) -> TubemapGraph:
+        """The graph as seen through this scenario, for passing to the algorithms."""
+        return self.__graph
+
+    def __init__(self, graph: TubemapGraph, parent: "TubemapScenario | None" = None) -> None:
+        """Makes a scenario from the current state of the graph, or a copy of a parent scenario (see fork)."""
+        self.__base_graph: TubemapGraph = graph
+        with TubemapScenario.__setup_lock:
+            if graph not in TubemapScenario.__edge_indices:
+                TubemapScenario.__edge_indices[graph] = _EdgeIndex()
+                TubemapScenario.__promotion_locks[graph] = Lock()
+        self.__edge_index: _EdgeIndex = TubemapScenario.__edge_indices[graph]
+        self.__promotion_lock: Lock = TubemapScenario.__promotion_locks[graph]
+        self.__graph: TubemapGraph = _ScenarioGraph(graph, self)
+        self.__nodes: Dict[int, _ScenarioNode] = {}
+        self.__edges: Dict[int, _ScenarioEdge] = {}
+
+        if parent is not None:
+            self.__closed_bits: int = parent.__closed_bits
+            self.__known_bits: int = parent.__known_bits
+            self.__base_weights: Dict[int, int] = parent.__base_weights
+            self.__weights: Dict[int, int] = dict(parent.__weights)
+            return
+
+        with self.__promotion_lock:
+            edges = [edge for _, _, edge in graph.edge_list.values()]
+            indices = [self.__edge_index.get(edge.id) for edge in edges]
+            #Built as bytes and converted once, as setting bits on an int one at a time copies the int every time.
+            closed_bytes = bytearray((max(indices, default=0) >> 3) + 1)
+            known_bytes = bytearray(len(closed_bytes))
+            for edge, index in zip(edges, indices):
+                known_bytes[index >> 3] |= 1 << (index & 7)
+                if edge.closed:
+                    closed_bytes[index >> 3] |= 1 << (index & 7)
+            self.__closed_bits = int.from_bytes(closed_bytes, "little")
+            #Bits of the edges that were captured, an edge added to the graph after this is read from the graph.
+            self.__known_bits = int.from_bytes(known_bytes, "little")
+            self.__base_weights = {edge.id: edge.weight for edge in edges}
+            self.__weights = {}
+
+    def fork(self) -> "TubemapScenario":
+        """A new scenario starting from this one's state, changes to either don't affect the other."""
+        return TubemapScenario(self.__base_graph, self)
+
+    def _get_node(self, node: TubemapNode) -> _ScenarioNode:
+        scenario_node = self.__nodes.get(node.id)
+        if scenario_node is None:
+            scenario_node = self.__nodes.setdefault(node.id, _ScenarioNode(node, self))
+        return scenario_node
+
+    def _get_edge(self, edge: TubemapEdge) -> _ScenarioEdge:
+        scenario_edge = self.__edges.get(edge.id)
+        if scenario_edge is None:
+            scenario_edge = self.__edges.setdefault(edge.id, _ScenarioEdge(edge, self))
+        return scenario_edge
+
+    def is_closed(self, edge: TubemapEdge) -> bool:
+        index = self.__edge_index.get(edge.id)
+        if (self.__known_bits >> index) & 1 == 0:
+            return edge.closed
+        return (self.__closed_bits >> index) & 1 == 1
+
+    def set_closed(self, edge: TubemapEdge, closed: bool) -> None:
+        index = self.__edge_index.get(edge.id)
+        self.__known_bits |= 1 << index
+        if closed:
+            self.__closed_bits |= 1 << index
+        else:
+            self.__closed_bits &= ~(1 << index)
+
+    def get_weight(self, edge: TubemapEdge) -> int:
+        weight = self.__weights.get(edge.id)
+        if weight is None:
+            weight = self.__base_weights.get(edge.id, edge.weight)
+        return weight
+
+    def set_weight(self, edge: TubemapEdge, weight: int) -> None:
+        self.__weights[edge.id] = weight
+
+    def to_graph(self) -> TubemapGraph:
+        """A standalone copy of the graph with this scenario's closures and journey times, e.g. to send to another process (a scenario can't be pickled)."""
+        graph = TubemapGraph()
+        for node in self.__base_graph.nodes.values():
+            graph.add_node(node.id).label = node.label
+        for node1, node2, edge in self.__base_graph.edge_list.values():
+            edge_copy = graph.add_edge(graph.nodes[node1.id], graph.nodes[node2.id], self.get_weight(edge), edge.id)
+            edge_copy.label = edge.label
+            edge_copy.closed = self.is_closed(edge)
+        return graph
+
+    def get_changes(self) -> List[TubemapEdge]:
+        """The edges of the graph whose closed state or weight is different in this scenario."""
+        return [edge for _, _, edge in self.__base_graph.edge_list.values() if self.is_closed(edge) != edge.closed or self.get_weight(edge) != edge.weight]
+
+    def promote(self, on_edge_changed: Callable[[TubemapEdge], None] | None = None) -> List[TubemapEdge]:
+        """
+        Writes this scenario's closures and weights to the graph and returns the edges that changed.
+        This holds the graph's lock, so every scenario made from the graph sees either none or all of the changes.
+        on_edge_changed is called for each changed edge once they have all been written (e.g. to update caches).
+        """
+        with self.__promotion_lock:
+            changes = [(edge, self.is_closed(edge), self.get_weight(edge)) for edge in self.get_changes()]
+            for edge, closed, weight in changes:
+                edge.closed = closed
+                edge.weight = weight
+
+        if on_edge_changed is not None:
+            for edge, _, _ in changes:
+                on_edge_changed(edge)
+        return [edge for edge, _, _ in changes]
@@ -0,0 +1,133 @@
+from typing import Tuple
+from multiprocessing import shared_memory
+from threading import Lock
+import struct
+from .tubemap_graph import TubemapGraph
+from .tubemap_snapshot import TubemapSnapshot
+
+#sequence number, snapshot size, then the name of the block holding the snapshot.
+_CONTROL = struct.Struct("=QQ64s")
+_SEQUENCE = struct.Struct("=Q")
+
+"""
+* Publishes a graph to shared memory as a TubemapSnapshot, so that worker processes can search it in place instead of each being sent a pickled copy.
+* A small control block holds the generation number and the name of the block holding the current snapshot, workers are only given the name of the control block.
+* Publishing again (e.g. after closures) writes a whole new block and then switches the control block over to it,
+* so a snapshot never changes while a worker is reading it, and workers pick up the new generation the next time they check (see TubemapSharedGraphReader).
+* The control block is written like a seqlock, the sequence number is odd while it is being written, so a reader that sees an odd or changed sequence number reads it again.
+* The generation is half of the sequence number.
+* A replaced block is unlinked straight away, the OS frees its memory once the last worker attached to it has moved on.
+"""
+class TubemapSharedGraph:
+    @property
+    def name(self) -> str:
+        """The name of the control block, which is all a worker needs to attach (see TubemapSharedGraphReader)."""
+        return self.__control.name
+
+    @property
+    def generation(self) -> int:
+        return self.__generation
+
+    def __init__(self, graph: TubemapGraph) -> None:
+        """Publishes the graph as generation 1, use close when it is no longer needed."""
+        self.__graph: TubemapGraph = graph
+        self.__lock = Lock()
+        self.__generation = 0
+        self.__block: shared_memory.SharedMemory | None = None
+        self.__control = shared_memory.SharedMemory(create=True, size=_CONTROL.size)
+        _CONTROL.pack_into(self.__control.buf, 0, 0, 0, b"")
+        self.publish()
+
+    def publish(self) -> int:
+        """Publishes the current state of the graph as a new generation and returns its number."""
+        data = TubemapSnapshot.to_bytes(self.__graph)
+        with self.__lock:
+            block = shared_memory.SharedMemory(create=True, size=len(data))
+            block.buf[:len(data)] = data
+
+            sequence = self.__generation * 2
+            _CONTROL.pack_into(self.__control.buf, 0, sequence + 1, len(data), block.name.encode("ascii"))
+            _SEQUENCE.pack_into(self.__control.buf, 0, sequence + 2)
+            self.__generation += 1
+
+            if self.__block is not None:
+                self.__block.close()
+                self.__block.unlink()
+            self.__block = block
+            return self.__generation
+
+    def close(self) -> None:
+        with self.__lock:
+            if self.__block is not None:
+                self.__block.close()
+                self.__block.unlink()
+                self.__block = None
+            self.__control.close()
+            self.__control.unlink()
+
+    def __enter__(self) -> "TubemapSharedGraph":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+class TubemapSharedGraphReader:
+    """Attaches to a TubemapSharedGraph by the name of its control block, usually from a worker process."""
+    @property
+    def generation(self) -> int:
+        return self.__sequence // 2
+
+    def __init__(self, name: str) -> None:
+        self.__control = shared_memory.SharedMemory(name)
+        self.__sequence = 0
+        self.__block: shared_memory.SharedMemory | None = None
+        self.__snapshot: TubemapSnapshot | None = None
+
+    def __read_control(self) -> Tuple[int, int, str]:
+        while True:
+            sequence, size, name = _CONTROL.unpack_from(self.__control.buf, 0)
+            if sequence & 1 == 0 and _SEQUENCE.unpack_from(self.__control.buf, 0)[0] == sequence:
+                return sequence, size, name.rstrip(b"\0").decode("ascii")
+
+    def get_snapshot(self) -> TubemapSnapshot:
+        """
+        Gets the snapshot of the current generation, attaching to it first if the graph has been published again since the last call.
+        The snapshot from the previous call is closed when that happens, so its views must not be held on to between calls.
+        """
+        #The common case is a single read of the sequence number.
+        if self.__snapshot is not None and _SEQUENCE.unpack_from(self.__control.buf, 0)[0] == self.__sequence:
+            return self.__snapshot
+
+        while True:
+            sequence, size, name = self.__read_control()
+            try:
+                block = shared_memory.SharedMemory(name)
+                break
+            except FileNotFoundError:
+                #The publisher replaced (and unlinked) the block between reading its name and attaching to it, so read the new name.
+                continue
+
+        self.__detach()
+        self.__block = block
+        #The OS may round the block up to a whole page, so only the snapshot's own bytes are given to it.
+        self.__snapshot = TubemapSnapshot(buffer=block.buf[:size])
+        self.__sequence = sequence
+        return self.__snapshot
+
+    def __detach(self) -> None:
+        if self.__snapshot is not None:
+            self.__snapshot.close()
+            self.__snapshot = None
+        if self.__block is not None:
+            self.__block.close()
+            self.__block = None
+
+    def close(self) -> None:
+        self.__detach()
+        self.__control.close()
+
+    def __enter__(self) -> "TubemapSharedGraphReader":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
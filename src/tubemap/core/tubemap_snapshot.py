@@ -0,0 +1,251 @@
+from typing import Any, Dict, List, Tuple
+from array import array
+import mmap
+import os
+import struct
+from .tubemap_graph import TubemapGraph, pause_garbage_collector
+from .tubemap_node import TubemapNode
+from .tubemap_edge import TubemapEdge
+
+"""
+* A binary snapshot of a TubemapGraph that can be memory mapped and read without parsing anything per edge.
+* Every section is a flat array aligned to 8 bytes, so it can be read with memoryview.cast (or numpy.frombuffer) directly from the mapped file,
+* and multiple processes that map the same file share the same pages (see TubemapSharedGraph for sharing one without a file).
+* Layout:
+#   Header: magic, version, byte order mark, node/edge/string counts, the graph's fingerprint, the source fingerprint and the offset of every section (all in native byte order, the mark detects a mismatch).
+#   String table: (string count + 1) u32 offsets into a UTF-8 blob, holding the station and line labels.
+#   Nodes: i64 IDs and u32 label indices.
+#   Edges: i64 IDs, u32 end point indices (x2), u32 weights and u32 label indices.
+#   Adjacency (CSR): (node count + 1) u32 row offsets, then u32 neighbour indices and u32 edge indices for every row.
+#   Closed edges: a bitmap with one bit per edge.
+"""
+class TubemapSnapshot:
+    MAGIC = b"TUBESNAP"
+    VERSION = 3
+    BYTE_ORDER_MARK = 0x01020304
+    #magic, version, byte order mark, node count, edge count, string count, fingerprint, source fingerprint, then the offsets of the 14 sections.
+    __HEADER = struct.Struct("=8sIIIIIQQ" + "Q" * 14)
+    __SECTIONS = [
+        ("string_offsets", "I"),
+        ("string_data", "B"),
+        ("node_ids", "q"),
+        ("node_labels", "I"),
+        ("edge_ids", "q"),
+        ("edge_node1", "I"),
+        ("edge_node2", "I"),
+        ("edge_weights", "I"),
+        ("edge_labels", "I"),
+        ("row_offsets", "I"),
+        ("neighbours", "I"),
+        ("neighbour_edges", "I"),
+        ("closed_bitmap", "B"),
+        ("end", "B")
+    ]
+
+    def __init__(self, file_path: str | None = None, buffer: Any = None) -> None:
+        """
+        Maps a snapshot file, or reads a snapshot from a buffer that is already in memory (e.g. shared memory) without copying it.
+        Use close when it is no longer needed, the buffer itself is left for the caller to close.
+        A ValueError is raised if it isn't a snapshot this version can read, or its sections don't fit in it (e.g. the file was cut short).
+        """
+        if (file_path is None) == (buffer is None):
+            raise ValueError("Either a file path or a buffer must be given.")
+        self.__file = None
+        self.__mapping = None
+        if file_path is not None:
+            self.__file = open(file_path, "rb")
+            self.__mapping = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+            buffer = self.__mapping
+        self.__buffer = memoryview(buffer)
+        self.__views: Dict[str, memoryview] = {}
+
+        if len(self.__buffer) < TubemapSnapshot.__HEADER.size:
+            self.close()
+            raise ValueError(f"'{file_path or 'The buffer'}' is too short to be a tubemap snapshot.")
+        header = TubemapSnapshot.__HEADER.unpack_from(self.__buffer, 0)
+        magic, version, byte_order_mark, self.node_count, self.edge_count, self.string_count = header[:6]
+        #The fingerprint of the graph the snapshot was written from, so it can be checked against a graph without reading the rest of the snapshot.
+        self.fingerprint: int = header[6]
+        #The fingerprint of the file the graph was loaded from (e.g. tubemap.json), this differs from fingerprint once changes have been compacted into the snapshot.
+        self.source_fingerprint: int = header[7]
+        if magic != TubemapSnapshot.MAGIC:
+            self.close()
+            raise ValueError(f"'{file_path or 'The buffer'}' is not a tubemap snapshot.")
+        elif version != TubemapSnapshot.VERSION:
+            self.close()
+            raise ValueError(f"Unsupported tubemap snapshot version {version} (expected {TubemapSnapshot.VERSION}).")
+        elif byte_order_mark != TubemapSnapshot.BYTE_ORDER_MARK:
+            self.close()
+            raise ValueError("The tubemap snapshot was written on a machine with a different byte order.")
+
+        #Each section runs up to the start of the next one, the alignment padding is trimmed using the item counts below.
+        offsets = header[8:]
+        lengths = {
+            "string_offsets": self.string_count + 1,
+            "node_ids": self.node_count,
+            "node_labels": self.node_count,
+            "edge_ids": self.edge_count,
+            "edge_node1": self.edge_count,
+            "edge_node2": self.edge_count,
+            "edge_weights": self.edge_count,
+            "edge_labels": self.edge_count,
+            "row_offsets": self.node_count + 1,
+            "neighbours": self.edge_count * 2,
+            "neighbour_edges": self.edge_count * 2,
+            "closed_bitmap": (self.edge_count + 7) // 8
+        }
+        #Every section must be aligned, in order and hold its items, reading past the end of one would otherwise only fail (or give nonsense) part way through to_graph.
+        if offsets[0] < TubemapSnapshot.__HEADER.size or offsets[-1] > len(self.__buffer) or any(offset & 7 != 0 for offset in offsets):
+            self.close()
+            raise ValueError("The tubemap snapshot's sections don't fit in it (it may have been cut short).")
+        for i, (name, type_code) in enumerate(TubemapSnapshot.__SECTIONS[:-1]):
+            if offsets[i + 1] - offsets[i] < lengths.get(name, 0) * struct.calcsize(type_code):
+                self.close()
+                raise ValueError(f"The tubemap snapshot's {name} section is shorter than its item count.")
+
+        for i, (name, type_code) in enumerate(TubemapSnapshot.__SECTIONS[:-1]):
+            view = self.__buffer[offsets[i]:offsets[i + 1]].cast(type_code)
+            self.__views[name] = view[:lengths[name]] if name in lengths else view
+
+    def close(self) -> None:
+        for view in self.__views.values():
+            view.release()
+        self.__views.clear()
+        self.__buffer.release()
+        if self.__mapping is not None:
+            self.__mapping.close()
+            self.__file.close()
+
+    def __enter__(self) -> "TubemapSnapshot":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def view(self, name: str) -> memoryview:
+        """Gets one of the section arrays (e.g. 'row_offsets' or 'edge_weights'), this is only valid until the snapshot is closed."""
+        return self.__views[name]
+
+    def string(self, index: int) -> str:
+        string_offsets = self.__views["string_offsets"]
+        return bytes(self.__views["string_data"][string_offsets[index]:string_offsets[index + 1]]).decode("utf-8")
+
+    def is_closed(self, edge_index: int) -> bool:
+        return (self.__views["closed_bitmap"][edge_index >> 3] >> (edge_index & 7)) & 1 == 1
+
+    def to_graph(self) -> TubemapGraph:
+        """Builds a TubemapGraph from the snapshot, its fingerprint is taken from the header rather than hashing the graph again."""
+        graph = TubemapGraph()
+        nodes = graph.nodes
+        edge_list = graph.edge_list
+        labels = [self.string(i) for i in range(self.string_count)]
+        node_ids = self.__views["node_ids"].tolist()
+        node_labels = self.__views["node_labels"]
+        edge_ids = self.__views["edge_ids"].tolist()
+        edge_node1 = self.__views["edge_node1"]
+        edge_node2 = self.__views["edge_node2"]
+        edge_weights = self.__views["edge_weights"]
+        edge_labels = self.__views["edge_labels"]
+        closed_bitmap = self.__views["closed_bitmap"]
+
+        with pause_garbage_collector():
+            node_array: List[TubemapNode] = []
+            adjacency_dicts = []
+            for i in range(self.node_count):
+                node = TubemapNode(node_ids[i])
+                node.label = labels[node_labels[i]]
+                nodes[node.id] = node
+                node_array.append(node)
+                adjacency_dicts.append(node.adjacency_dict)
+
+            for i in range(self.edge_count):
+                edge = TubemapEdge(edge_ids[i], edge_weights[i])
+                edge.label = labels[edge_labels[i]]
+                if (closed_bitmap[i >> 3] >> (i & 7)) & 1:
+                    edge.closed = True
+                node1_index = edge_node1[i]
+                node2_index = edge_node2[i]
+                node1 = node_array[node1_index]
+                node2 = node_array[node2_index]
+                edge_list[edge.id] = (node1, node2, edge)
+                adjacency_dicts[node1_index].setdefault(node2.id, {})[edge.id] = edge
+                adjacency_dicts[node2_index].setdefault(node1.id, {})[edge.id] = edge
+
+        graph._set_fingerprint(self.fingerprint)
+        return graph
+
+    @staticmethod
+    def write(graph: TubemapGraph, file_path: str, source_fingerprint: int | None = None) -> None:
+        """Writes a snapshot of the graph to a file, source_fingerprint is that of the file the graph was loaded from (the graph's own fingerprint if not given)."""
+        #Write to a temporary file first so that a reader never sees a half written snapshot.
+        temp_file_path = f"{file_path}.tmp"
+        with open(temp_file_path, "wb") as file:
+            file.write(TubemapSnapshot.to_bytes(graph, source_fingerprint))
+        os.replace(temp_file_path, file_path)
+
+    @staticmethod
+    def to_bytes(graph: TubemapGraph, source_fingerprint: int | None = None) -> bytearray:
+        """Builds a snapshot of the graph in memory (see write)."""
+        string_indices: Dict[str, int] = {}
+        def string_index(string: str) -> int:
+            if string not in string_indices:
+                string_indices[string] = len(string_indices)
+            return string_indices[string]
+
+        node_indices: Dict[int, int] = {}
+        node_ids = array("q")
+        node_labels = array("I")
+        for i, node in enumerate(graph.nodes.values()):
+            node_indices[node.id] = i
+            node_ids.append(node.id)
+            node_labels.append(string_index(node.label))
+
+        edge_ids = array("q")
+        edge_node1 = array("I")
+        edge_node2 = array("I")
+        edge_weights = array("I")
+        edge_labels = array("I")
+        closed_bitmap = bytearray((len(graph.edge_list) + 7) // 8)
+        rows: List[List[Tuple[int, int]]] = [[] for _ in range(len(node_ids))]
+        for i, (node1, node2, edge) in enumerate(graph.edge_list.values()):
+            edge_ids.append(edge.id)
+            edge_node1.append(node_indices[node1.id])
+            edge_node2.append(node_indices[node2.id])
+            edge_weights.append(edge.weight)
+            edge_labels.append(string_index(edge.label))
+            if edge.closed:
+                closed_bitmap[i >> 3] |= 1 << (i & 7)
+            rows[node_indices[node1.id]].append((node_indices[node2.id], i))
+            rows[node_indices[node2.id]].append((node_indices[node1.id], i))
+
+        row_offsets = array("I", [0])
+        neighbours = array("I")
+        neighbour_edges = array("I")
+        for row in rows:
+            for neighbour_index, edge_index in row:
+                neighbours.append(neighbour_index)
+                neighbour_edges.append(edge_index)
+            row_offsets.append(len(neighbours))
+
+        string_offsets = array("I", [0])
+        string_data = bytearray()
+        for string in string_indices.keys():
+            string_data += string.encode("utf-8")
+            string_offsets.append(len(string_data))
+
+        sections = [string_offsets, string_data, node_ids, node_labels, edge_ids, edge_node1, edge_node2, edge_weights, edge_labels, row_offsets, neighbours, neighbour_edges, closed_bitmap]
+
+        offsets: List[int] = []
+        position = TubemapSnapshot.__HEADER.size
+        for section in sections:
+            position = (position + 7) & ~7
+            offsets.append(position)
+            position += len(section) * (section.itemsize if isinstance(section, array) else 1)
+        offsets.append((position + 7) & ~7)
+
+        data = bytearray(offsets[-1])
+        TubemapSnapshot.__HEADER.pack_into(data, 0, TubemapSnapshot.MAGIC, TubemapSnapshot.VERSION, TubemapSnapshot.BYTE_ORDER_MARK, len(node_ids), len(edge_ids), len(string_indices), graph.fingerprint, graph.fingerprint if source_fingerprint is None else source_fingerprint, *offsets)
+        for offset, section in zip(offsets, sections):
+            section_bytes = section.tobytes() if isinstance(section, array) else section
+            data[offset:offset + len(section_bytes)] = section_bytes
+        return data
@@ -0,0 +1,187 @@
+from typing import Any, Callable, Dict, Generator, List, Tuple
+from threading import Condition, Thread
+from types import GeneratorType
+from itertools import count
+import heapq
+
+class _WarmupTask:
+    WAITING = "waiting"
+    RUNNING = "running"
+    READY = "ready"
+    CANCELLED = "cancelled"
+    FAILED = "failed"
+
+    def __init__(self, name: str, priority: int, build: Callable[[], Any]) -> None:
+        self.name: str = name
+        self.priority: int = priority
+        self.build: Callable[[], Any] = build
+        self.state: str = _WarmupTask.WAITING
+        #The fingerprint of the graph the result was built from, and of the graph the build in progress started from.
+        self.fingerprint: int | None = None
+        self.build_fingerprint: int | None = None
+        self.result: Any = None
+        self.error: Exception | None = None
+        self.progress: Tuple[int, int] = (0, 0)
+        #The build generator of a task that has been started but not finished.
+        self.builder: Generator[Tuple[int, int], None, Any] | None = None
+
+"""
+* Builds indexes in the background while the program is otherwise idle (e.g. while the user is typing at the prompt).
+* A task's build function either returns the index, or returns a generator that yields (done, total) progress and returns the index at the end,
+* in which case the task is run a step (one yield) at a time so that it can be paused or cancelled part way through.
+* Tasks are run one at a time in order of priority (lowest first) on a single daemon thread.
+* Foreground work must be wrapped in pause/resume, pause waits for the current step to finish so foreground work never runs alongside a build
+* (which means nothing needs a lock, e.g. a build never sees a half applied closure).
+* Each result is stored with the fingerprint of the graph it was built from, get only returns results that match the current fingerprint
+* and resume queues any task whose result has gone stale, so callers fall back to a direct search until the new index is ready.
+"""
+class TubemapWarmupScheduler:
+    def __init__(self, get_fingerprint: Callable[[], int]) -> None:
+        self.__get_fingerprint: Callable[[], int] = get_fingerprint
+        self.__tasks: Dict[str, _WarmupTask] = {}
+        #(priority, order added, name) of the tasks waiting to run.
+        self.__queue: List[Tuple[int, int, str]] = []
+        self.__order = count()
+        self.__condition = Condition()
+        #Set without the lock so that the worker sees it before its next step, see pause.
+        self.__paused: bool = True
+        self.__stopped: bool = False
+        self.__thread: Thread | None = None
+
+    def add_task(self, name: str, priority: int, build: Callable[[], Any]) -> None:
+        with self.__condition:
+            self.__tasks[name] = _WarmupTask(name, priority, build)
+            self.__restart(self.__tasks[name])
+
+    def __restart(self, task: _WarmupTask) -> None:
+        """Queues the task to be built from scratch, throwing away any build that was part way through."""
+        if task.builder is not None:
+            task.builder.close()
+            task.builder = None
+        task.state = _WarmupTask.WAITING
+        task.progress = (0, 0)
+        if all(name != task.name for _, _, name in self.__queue):
+            heapq.heappush(self.__queue, (task.priority, next(self.__order), task.name))
+        self.__condition.notify()
+
+    def start(self) -> None:
+        """Starts the worker thread, tasks only run while the scheduler is resumed."""
+        self.__thread = Thread(target=self.__run, name="warmup", daemon=True)
+        self.__thread.start()
+
+    def stop(self) -> None:
+        """Cancels every task and stops the worker thread."""
+        self.__paused = True
+        with self.__condition:
+            self.__stopped = True
+            for task in self.__tasks.values():
+                if task.state in (_WarmupTask.WAITING, _WarmupTask.RUNNING):
+                    self.__cancel(task)
+            self.__condition.notify()
+        if self.__thread is not None:
+            self.__thread.join()
+
+    def pause(self) -> None:
+        """Stops running tasks until resume is called, this waits for the current step to finish."""
+        self.__paused = True
+        with self.__condition:
+            pass
+
+    def resume(self) -> None:
+        """Requeues any task whose result no longer matches the graph, then lets the tasks run again."""
+        with self.__condition:
+            self.__restart_stale()
+            self.__paused = False
+            self.__condition.notify()
+
+    def run_pending(self) -> None:
+        """
+        Builds every task that is waiting (after requeuing any whose result no longer matches the graph) on the calling thread and returns once they are all ready.
+        This is for when there is no idle time to build them in (e.g. a batch of commands), in which case start is never called.
+        """
+        with self.__condition:
+            self.__restart_stale()
+            while len(self.__queue) > 0:
+                self.__step(self.__tasks[self.__queue[0][2]])
+
+    def __restart_stale(self) -> None:
+        fingerprint = self.__get_fingerprint()
+        for task in self.__tasks.values():
+            if task.state == _WarmupTask.RUNNING and task.build_fingerprint != fingerprint:
+                self.__restart(task)
+            elif task.state in (_WarmupTask.READY, _WarmupTask.FAILED) and task.fingerprint != fingerprint:
+                self.__restart(task)
+
+    def cancel(self, name: str) -> bool:
+        """Stops a task from being built (or rebuilt), a result that is already built can still be used until the graph changes. Returns False if the task wasn't waiting or running."""
+        with self.__condition:
+            task = self.__tasks[name]
+            if task.state not in (_WarmupTask.WAITING, _WarmupTask.RUNNING):
+                return False
+            self.__cancel(task)
+            return True
+
+    def __cancel(self, task: _WarmupTask) -> None:
+        if task.builder is not None:
+            task.builder.close()
+            task.builder = None
+        self.__queue = [entry for entry in self.__queue if entry[2] != task.name]
+        heapq.heapify(self.__queue)
+        task.state = _WarmupTask.CANCELLED
+
+    def get(self, name: str) -> Any:
+        """The task's result if it has been built for the graph as it is now, otherwise None (so the caller should search directly instead)."""
+        task = self.__tasks.get(name)
+        if task is None or task.fingerprint is None or task.fingerprint != self.__get_fingerprint():
+            return None
+        return task.result
+
+    def get_status(self) -> List[Tuple[str, str, int, int]]:
+        """(name, state, done, total) of every task in order of priority."""
+        with self.__condition:
+            return [(task.name, task.state, *task.progress) for task in sorted(self.__tasks.values(), key=lambda task: task.priority)]
+
+    def is_idle(self) -> bool:
+        """True once there is nothing left to build."""
+        with self.__condition:
+            return len(self.__queue) == 0 and all(task.state != _WarmupTask.RUNNING for task in self.__tasks.values())
+
+    def __run(self) -> None:
+        while True:
+            with self.__condition:
+                while not self.__stopped and (self.__paused or len(self.__queue) == 0):
+                    self.__condition.wait()
+                if self.__stopped:
+                    return
+                #The step is run while holding the lock, which is what lets pause wait for it to finish.
+                self.__step(self.__tasks[self.__queue[0][2]])
+
+    def __step(self, task: _WarmupTask) -> None:
+        try:
+            if task.builder is None:
+                task.state = _WarmupTask.RUNNING
+                task.build_fingerprint = self.__get_fingerprint()
+                result = task.build()
+                if not isinstance(result, GeneratorType):
+                    self.__finish(task, result)
+                    return
+                task.builder = result
+            task.progress = next(task.builder)
+        except StopIteration as stop:
+            task.builder = None
+            self.__finish(task, stop.value)
+        except Exception as error:
+            task.builder = None
+            task.state = _WarmupTask.FAILED
+            #Recorded so that it isn't retried until the graph changes.
+            task.fingerprint = task.build_fingerprint
+            task.result = None
+            task.error = error
+            heapq.heappop(self.__queue)
+
+    def __finish(self, task: _WarmupTask, result: Any) -> None:
+        heapq.heappop(self.__queue)
+        task.result = result
+        task.fingerprint = task.build_fingerprint
+        task.state = _WarmupTask.READY
+        task.progress = (task.progress[1], task.progress[1]) if task.progress[1] > 0 else (1, 1)
@@ -1,10 +1,108 @@
-from typing import Callable, Any
-from http.server import BaseHTTPRequestHandler, HTTPServer
-from http.client import HTTPConnection
-from threading import Thread, Event
-from time import sleep
+from typing import Callable, Any, Dict, Hashable, List, Tuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Thread, Event, Lock
+from urllib.parse import urlsplit, unquote, parse_qsl
+import hashlib
+import gzip
+import json
 import os
+import selectors
+import socket
+from tubemap.core.tubemap_graph import TubemapGraph
+from tubemap.core.tubemap_node import TubemapNode
+from tubemap.core.tubemap_scenario import TubemapScenario
+from tubemap.algorithms.tubemap_dijkstras_algorithm import TubemapDijkstrasAlgorithm
+from tubemap.algorithms.tubemap_bellman_fords_algorithm_dp import TubemapBellmanFordsAlgorithmDP
+from tubemap.algorithms.tubemap_interchange_dijkstras_algorithm import TubemapInterchangeDijkstrasAlgorithm
+from tubemap.algorithms.tubemap_isochrone_searcher import TubemapIsochroneSearcher
+from tubemap.algorithms.tubemap_dynamic_shortest_paths import TubemapDynamicShortestPaths
+from tubemap.algorithms.tubemap_connectivity import TubemapComponentIndex
+from tubemap.algorithms.tubemap_algorithm_step import TubemapAlgorithmStep
+from tubemap.core.tubemap_shared_graph import TubemapSharedGraph
+from tubemap.algorithms.tubemap_shared_route_pool import TubemapSharedRoutePool
 
+class _CachedAsset:
+    """A file from the www folder held in memory, along with its gzip compressed copy (if compressing it helps)."""
+    def __init__(self, content: bytes, mime_type: str, modified_time: float) -> None:
+        self.content: bytes = content
+        self.mime_type: str = mime_type
+        #Used to notice when the file on disk has been changed.
+        self.modified_time: float = modified_time
+        self.etag: str = f'"{hashlib.sha1(content).hexdigest()}"'
+        self.gzip_content: bytes | None = None
+        if mime_type != "image/png":
+            gzip_content = gzip.compress(content, 6)
+            if len(gzip_content) < len(content):
+                self.gzip_content = gzip_content
+
+class _APIError(Exception):
+    """An error that is sent back to the client as {"error": message} with the given HTTP status."""
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status: int = status
+
+class _GraphSnapshot:
+    """
+    A copy of the live graph that API queries are answered from, so that a query never sees the graph part way through a change.
+    It is copied through a scenario, which is made either entirely before or after a promotion (see TubemapScenario.promote).
+    As the copy never changes, the indexes built from it stay valid for as long as it is used: which stations can reach each other,
+    and the shortest path tree of every station that has been routed from (each tree is built once, whole, before it is shared, so the threads don't need to lock).
+    """
+    def __init__(self, live_graph: TubemapGraph) -> None:
+        self.graph: TubemapGraph = TubemapScenario(live_graph).to_graph()
+        self.fingerprint: int = self.graph.fingerprint
+        self.components: TubemapComponentIndex = TubemapComponentIndex.build(self.graph)
+        self.shortest_paths: TubemapDynamicShortestPaths = TubemapDynamicShortestPaths(self.graph)
+
+class _RequestCoalescer:
+    """
+    Runs API work on a fixed pool of threads, identical requests that arrive while one is already running share its result rather than running again.
+    Nothing is cached once a request completes, so results always reflect the current state of the graph (e.g. closures).
+    """
+    def __init__(self, workers: int) -> None:
+        self.__pool = ThreadPoolExecutor(workers, "api-worker")
+        self.__lock = Lock()
+        self.__in_flight: Dict[Hashable, Future] = {}
+
+    def submit(self, key: Hashable, work: Callable[[], Any]) -> Future:
+        with self.__lock:
+            future = self.__in_flight.get(key)
+            if future is not None:
+                return future
+            future = self.__pool.submit(work)
+            self.__in_flight[key] = future
+        #This is added outside of the lock as it runs straight away (on this thread) if the work has already finished.
+        future.add_done_callback(lambda _: self.__remove(key, future))
+        return future
+
+    def __remove(self, key: Hashable, future: Future) -> None:
+        with self.__lock:
+            if self.__in_flight.get(key) is future:
+                del self.__in_flight[key]
+
+    def shutdown(self) -> None:
+        self.__pool.shutdown(wait=False, cancel_futures=True)
+
+"""
+* The static files are read from disk and compressed once, then served from memory (a file is reloaded if it is changed on disk).
+* Each connection is handled on its own thread and is kept alive (HTTP/1.1) so that the browser can reuse it for the next request,
+* and clients that already have the current version of a file (matching ETag) are sent a 304 with no body.
+* If a graph is given to run, the routing API is also served, answering queries with the Python engines.
+* Queries are answered from a snapshot of the graph (see _GraphSnapshot), which is taken again the first time it is needed after the graph changes:
+#   GET /api/route?from=<station>&to=<station>[&algorithm=dijkstra|bellman-ford|interchange]
+#       {"duration":minutes,"stations":[...],"lines":[...]}, where lines[i] is the line taken from stations[i] to stations[i+1].
+#   GET /api/reach?from=<station>&minutes=<minutes>
+#       {"stations":[[station,minutes],...]} in order of arrival time.
+#   POST /api/batch with a JSON array of {"type":"route"|"reach", ...the query parameters above}
+#       An array of the results in the same order, a query that fails gives {"error":message} in its place.
+#       If the server was started with route processes, the batch's Dijkstra routes are all sent to a TubemapSharedRoutePool at once instead,
+#       which searches the graph published to shared memory (see publish_graph) on that many processes.
+#   GET /api/trace?from=<station>&to=<station>[&algorithm=dijkstra|bellman-ford][&format=ndjson|sse]
+#       Every step of the search (see TubemapAlgorithmStep) as newline delimited JSON, or as Server-Sent Events.
+#       The steps are generated as the response is written, so a slow client slows the search down rather than it being buffered in memory.
+* Stations can be given by name (in any case) or ID, and a HEAD request to any GET endpoint gets the same status and headers without the body.
+"""
 #Modified from: https://pythonbasics.org/webserver/
 class Webserver(BaseHTTPRequestHandler):
     HOSTNAME = "localhost"
@@ -14,79 +112,433 @@ class Webserver(BaseHTTPRequestHandler):
         "css": "text/css",
         "js": "application/javascript",
         "json": "application/json",
+        "png": "image/png",
     }
+    #HTTP/1.1 keeps the connection open between requests, which needs a Content-Length on every response.
+    protocol_version = "HTTP/1.1"
+    #Idle keep-alive connections are closed after this many seconds.
+    timeout = 30
+    #The headers and body are written separately, so without this each response can be held up waiting for the client to acknowledge the headers.
+    disable_nagle_algorithm = True
 
-    def do_GET(self) -> None:
-        """Handles GET requests."""
-        #Get the request path.
-        path = self.path
-        if path.endswith("/"):
-            path += "index.html"
-        path = path[1:]
-        local_path = os.path.join(os.getcwd(), "www", path)
+    API_ALGORITHMS = {
+        "dijkstra": TubemapDijkstrasAlgorithm,
+        "bellman-ford": TubemapBellmanFordsAlgorithmDP,
+        "interchange": TubemapInterchangeDijkstrasAlgorithm
+    }
+    TRACE_ALGORITHMS = {
+        "dijkstra": TubemapDijkstrasAlgorithm,
+        "bellman-ford": TubemapBellmanFordsAlgorithmDP
+    }
+    #Trace steps are collected into chunks of about this many bytes before being sent.
+    TRACE_CHUNK_SIZE = 1 << 14
+    #The largest number of queries that can be sent in a single batch, and the largest request body that is read.
+    MAX_BATCH_SIZE = 1000
+    MAX_BODY_SIZE = 1 << 20
 
-        #Get the file extension and match it to a known MIME type.
-        extension = path.split(".")[-1]
-        mime_type = self.MIME_TYPES.get(extension, "text/plain")
+    __asset_cache: Dict[str, _CachedAsset] = {}
+    __asset_cache_lock = Lock()
+    __graph: TubemapGraph | None = None
+    #Station names in lower case to their nodes, so that a query doesn't have to search every station by name.
+    __station_index: Dict[str, TubemapNode] = {}
+    __coalescer: _RequestCoalescer | None = None
+    __snapshot: _GraphSnapshot | None = None
+    __snapshot_lock = Lock()
+    __shared_graph: TubemapSharedGraph | None = None
+    __route_pool: TubemapSharedRoutePool | None = None
+    #The pool is given one batch at a time, and publishing mustn't happen part way through building the shared graph.
+    __route_pool_lock = Lock()
+
+    @staticmethod
+    def __get_asset(local_path: str) -> _CachedAsset | None:
+        """Gets a file from the cache, (re)loading it if it isn't cached or has changed on disk."""
+        try:
+            modified_time = os.path.getmtime(local_path)
+        except OSError:
+            return None
+
+        asset = Webserver.__asset_cache.get(local_path)
+        if asset is not None and asset.modified_time == modified_time:
+            return asset
 
-        #Try to get the requested file's content.
         try:
             with open(local_path, "rb") as file:
                 content = file.read()
-        except FileNotFoundError:
+        except (FileNotFoundError, IsADirectoryError, PermissionError):
+            return None
+
+        #Get the file extension and match it to a known MIME type.
+        extension = local_path.split(".")[-1]
+        asset = _CachedAsset(content, Webserver.MIME_TYPES.get(extension, "text/plain"), modified_time)
+        with Webserver.__asset_cache_lock:
+            Webserver.__asset_cache[local_path] = asset
+        return asset
+
+    def __get_local_path(self) -> str | None:
+        """Maps the request path to a file in the www folder, or None if it is outside of it."""
+        root_path = os.path.join(os.getcwd(), "www")
+        path = unquote(urlsplit(self.path).path)
+        if path.endswith("/"):
+            path += "index.html"
+        local_path = os.path.normpath(os.path.join(root_path, path.lstrip("/")))
+        if os.path.commonpath([local_path, root_path]) != root_path:
+            return None
+        return local_path
+
+    def __send_asset(self, include_body: bool) -> None:
+        local_path = self.__get_local_path()
+        asset = Webserver.__get_asset(local_path) if local_path is not None else None
+        if asset is None:
             self.send_error(404)
             return
 
+        #The browser already has this version of the file.
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None and (if_none_match.strip() == "*" or asset.etag in [etag.strip() for etag in if_none_match.split(",")]):
+            self.send_response(304)
+            self.send_header("ETag", asset.etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        content = asset.content
+        use_gzip = asset.gzip_content is not None and "gzip" in self.headers.get("Accept-Encoding", "")
+        if use_gzip:
+            content = asset.gzip_content
+
         #Send the response.
         self.send_response(200)
-        self.send_header("Content-Type", mime_type)
+        self.send_header("Content-Type", asset.mime_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("ETag", asset.etag)
+        self.send_header("Cache-Control", "no-cache")
+        if asset.gzip_content is not None:
+            self.send_header("Vary", "Accept-Encoding")
+        if use_gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        if include_body:
+            self.wfile.write(content)
+
+    #region API
+    @staticmethod
+    def __get_snapshot() -> _GraphSnapshot:
+        """The snapshot to answer a query from, taken again if the live graph has changed since (e.g. a closure)."""
+        snapshot = Webserver.__snapshot
+        if snapshot is None or snapshot.fingerprint != Webserver.__graph.fingerprint:
+            #Only one thread takes the new snapshot, any others that notice the change at the same time wait for it.
+            with Webserver.__snapshot_lock:
+                snapshot = Webserver.__snapshot
+                if snapshot is None or snapshot.fingerprint != Webserver.__graph.fingerprint:
+                    snapshot = _GraphSnapshot(Webserver.__graph)
+                    Webserver.__snapshot = snapshot
+        return snapshot
+
+    @staticmethod
+    def __get_station(name: str | int | None) -> TubemapNode:
+        #A batch query is JSON, so it can give an ID as a number.
+        if isinstance(name, int):
+            name = str(name)
+        if not isinstance(name, str) or name.strip() == "":
+            raise _APIError(400, "A station must be given.")
+        node = Webserver.__station_index.get(name.strip().lower())
+        if node is None and name.strip().isdigit():
+            node = Webserver.__graph.nodes.get(int(name))
+        if node is None:
+            raise _APIError(404, f"Station '{name}' not found.")
+        return node
+
+    @staticmethod
+    def __route(start_node: TubemapNode, end_node: TubemapNode, algorithm: str) -> Dict[str, Any]:
+        snapshot = Webserver.__get_snapshot()
+        graph = snapshot.graph
+        start_node, end_node = graph.nodes[start_node.id], graph.nodes[end_node.id]
+        if not snapshot.components.is_path_available(start_node, end_node):
+            raise _APIError(404, f"There is no route from '{start_node.label}' to '{end_node.label}'.")
+        #Dijkstra is answered from the snapshot's cached shortest path trees, so only the first route from each station runs a search.
+        if algorithm == "dijkstra":
+            path_part_array = snapshot.shortest_paths.find_shortest_path(graph, start_node, end_node)
+        else:
+            path_part_array = Webserver.API_ALGORITHMS[algorithm].find_shortest_path(graph, start_node, end_node)
+        return {
+            "duration": sum(path_part.edge.weight for path_part in path_part_array[:-1]),
+            "stations": [path_part.node.label for path_part in path_part_array],
+            "lines": [path_part.edge.label for path_part in path_part_array[:-1]]
+        }
+
+    @staticmethod
+    def __reach(start_node: TubemapNode, minutes: int) -> Dict[str, Any]:
+        graph = Webserver.__get_snapshot().graph
+        return {"stations": [[node.label, arrival_time] for node, arrival_time in TubemapIsochroneSearcher.iterate_reachable(graph, graph.nodes[start_node.id], minutes)]}
+
+    @staticmethod
+    def __find_pool_routes(pairs: List[Tuple[TubemapNode, TubemapNode]]) -> List[Dict[str, Any]]:
+        """Finds every route with the shared route pool, in the same form as __route."""
+        with Webserver.__route_pool_lock:
+            route_results = Webserver.__route_pool.find_shortest_paths([(start_node.id, end_node.id) for start_node, end_node in pairs])
+        edge_list = Webserver.__graph.edge_list
+        results: List[Dict[str, Any]] = []
+        for (start_node, end_node), route_result in zip(pairs, route_results):
+            if route_result is None:
+                results.append({"error": f"There is no route from '{start_node.label}' to '{end_node.label}'."})
+                continue
+            path_weight, path = route_result
+            results.append({
+                "duration": path_weight,
+                "stations": [Webserver.__graph.nodes[node_id].label for node_id, _ in path],
+                "lines": [edge_list[edge_id][2].label for _, edge_id in path[:-1]]
+            })
+        return results
+
+    @staticmethod
+    def publish_graph() -> None:
+        """Publishes the live graph to the shared route pool again (if there is one), this must be called after every change to it (e.g. a closure)."""
+        with Webserver.__route_pool_lock:
+            if Webserver.__shared_graph is not None:
+                Webserver.__shared_graph.publish()
+
+    @staticmethod
+    def __submit_query(query_type: str | None, query: Dict[str, Any]) -> Future:
+        """Validates a query and hands it to the worker pool, the key used to coalesce it is built from the resolved stations so that e.g. 'Bank' and 'bank' match."""
+        if query_type == "route":
+            start_node = Webserver.__get_station(query.get("from"))
+            end_node = Webserver.__get_station(query.get("to"))
+            algorithm = str(query.get("algorithm", "dijkstra")).lower()
+            if algorithm not in Webserver.API_ALGORITHMS:
+                raise _APIError(400, f"Unknown algorithm '{algorithm}', expected one of: {', '.join(Webserver.API_ALGORITHMS.keys())}.")
+            return Webserver.__coalescer.submit(("route", start_node.id, end_node.id, algorithm), lambda: Webserver.__route(start_node, end_node, algorithm))
+        elif query_type == "reach":
+            start_node = Webserver.__get_station(query.get("from"))
+            minutes = str(query.get("minutes", ""))
+            if not minutes.isdigit():
+                raise _APIError(400, "A whole number of minutes must be given.")
+            return Webserver.__coalescer.submit(("reach", start_node.id, int(minutes)), lambda: Webserver.__reach(start_node, int(minutes)))
+        raise _APIError(404, f"Unknown query type '{query_type}'.")
+
+    @staticmethod
+    def __get_result(future: Future) -> Dict[str, Any]:
+        """Waits for a query and returns its result, or {"error": message} if it failed."""
+        try:
+            return future.result()
+        except _APIError as error:
+            return {"error": str(error)}
+        except Exception:
+            return {"error": "The query failed."}
+
+    def __send_json(self, status: int, obj: Any) -> None:
+        content = json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(content)
+
+    def __send_trace(self, query: Dict[str, str]) -> None:
+        start_node = Webserver.__get_station(query.get("from"))
+        end_node = Webserver.__get_station(query.get("to"))
+        algorithm = query.get("algorithm", "dijkstra").lower()
+        if algorithm not in Webserver.TRACE_ALGORITHMS:
+            raise _APIError(400, f"Unknown algorithm '{algorithm}', expected one of: {', '.join(Webserver.TRACE_ALGORITHMS.keys())}.")
+        use_sse = query.get("format", "sse" if "text/event-stream" in self.headers.get("Accept", "") else "ndjson").lower() == "sse"
+        snapshot = Webserver.__get_snapshot()
+        graph = snapshot.graph
+        start_node, end_node = graph.nodes[start_node.id], graph.nodes[end_node.id]
+        if not snapshot.components.is_path_available(start_node, end_node):
+            raise _APIError(404, f"There is no route from '{start_node.label}' to '{end_node.label}'.")
+
+        #The length isn't known up front, so the response is sent in chunks (which still lets the connection be kept alive).
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream" if use_sse else "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Cache-Control", "no-store")
         self.end_headers()
-        self.wfile.write(content)
+        if self.command == "HEAD":
+            return
+
+        def write_chunk(data: bytes) -> None:
+            #The socket writes block while the client is behind, which in turn pauses the generator below.
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+
+        steps = Webserver.TRACE_ALGORITHMS[algorithm].iterate_steps(graph, start_node, end_node)
+        buffer: List[bytes] = []
+        buffer_size = 0
+        try:
+            try:
+                for step in steps:
+                    line = json.dumps(step.to_obj(), separators=(",", ":")).encode("utf-8")
+                    line = b"data: " + line + b"\n\n" if use_sse else line + b"\n"
+                    buffer.append(line)
+                    buffer_size += len(line)
+                    if buffer_size >= Webserver.TRACE_CHUNK_SIZE:
+                        write_chunk(b"".join(buffer))
+                        buffer.clear()
+                        buffer_size = 0
+            except (ConnectionError, TimeoutError):
+                raise
+            except Exception:
+                #The status has already been sent, so the error can only be reported as the last step.
+                line = json.dumps({"type": "error", "error": "The trace failed."}, separators=(",", ":")).encode("utf-8")
+                buffer.append(b"data: " + line + b"\n\n" if use_sse else line + b"\n")
+            if len(buffer) > 0:
+                write_chunk(b"".join(buffer))
+            self.wfile.write(b"0\r\n\r\n")
+        except (ConnectionError, TimeoutError):
+            #The client has gone away, there is nothing left to send it.
+            self.close_connection = True
+        finally:
+            steps.close()
+
+    def __handle_api(self, path: str, query_string: str) -> None:
+        try:
+            if Webserver.__graph is None:
+                raise _APIError(503, "No graph is loaded.")
+
+            if path == "/api/batch":
+                if self.command != "POST":
+                    raise _APIError(405, "Batches must be sent with POST.")
+                content_length = self.headers.get("Content-Length", "0").strip()
+                if not content_length.isdigit():
+                    #Where the body ends can't be known, so nothing more can be read from the connection.
+                    self.close_connection = True
+                    raise _APIError(400, "The Content-Length header must be a whole number.")
+                content_length = int(content_length)
+                if content_length > Webserver.MAX_BODY_SIZE:
+                    raise _APIError(413, "The request body is too large.")
+                try:
+                    queries = json.loads(self.rfile.read(content_length))
+                except ValueError:
+                    raise _APIError(400, "The request body is not valid JSON.")
+                if not isinstance(queries, list) or any(not isinstance(query, dict) for query in queries):
+                    raise _APIError(400, "A batch must be a JSON array of query objects.")
+                if len(queries) > Webserver.MAX_BATCH_SIZE:
+                    raise _APIError(413, f"A batch can have at most {Webserver.MAX_BATCH_SIZE} queries.")
+
+                #Every query is submitted before waiting on any of them, so the pool works through the batch in parallel.
+                #Routes for the shared route pool are collected and stand in the list as their index into pool_pairs.
+                futures: List[Future | _APIError | int] = []
+                pool_pairs: List[Tuple[TubemapNode, TubemapNode]] = []
+                for query in queries:
+                    try:
+                        if Webserver.__route_pool is not None and query.get("type") == "route" and str(query.get("algorithm", "dijkstra")).lower() == "dijkstra":
+                            start_node, end_node = Webserver.__get_station(query.get("from")), Webserver.__get_station(query.get("to"))
+                            futures.append(len(pool_pairs))
+                            pool_pairs.append((start_node, end_node))
+                        else:
+                            futures.append(Webserver.__submit_query(query.get("type"), query))
+                    except _APIError as error:
+                        futures.append(error)
+                pool_results = Webserver.__find_pool_routes(pool_pairs) if len(pool_pairs) > 0 else []
+                self.__send_json(200, [{"error": str(future)} if isinstance(future, _APIError) else pool_results[future] if isinstance(future, int) else Webserver.__get_result(future) for future in futures])
+            elif path == "/api/trace":
+                if self.command not in ["GET", "HEAD"]:
+                    raise _APIError(405, "Traces must be requested with GET.")
+                self.__send_trace(dict(parse_qsl(query_string)))
+            elif path in ["/api/route", "/api/reach"]:
+                if self.command not in ["GET", "HEAD"]:
+                    raise _APIError(405, "Queries must be sent with GET.")
+                future = Webserver.__submit_query(path[len("/api/"):], dict(parse_qsl(query_string)))
+                self.__send_json(200, future.result())
+            else:
+                raise _APIError(404, f"Unknown API endpoint '{path}'.")
+        except _APIError as error:
+            self.__send_json(error.status, {"error": str(error)})
+        except Exception:
+            self.__send_json(500, {"error": "The query failed."})
+    #endregion
+
+    def do_GET(self) -> None:
+        """Handles GET requests."""
+        url = urlsplit(self.path)
+        if url.path.startswith("/api/"):
+            self.__handle_api(url.path, url.query)
+        else:
+            self.__send_asset(True)
+
+    def do_POST(self) -> None:
+        url = urlsplit(self.path)
+        if url.path.startswith("/api/"):
+            self.__handle_api(url.path, url.query)
+        else:
+            self.send_error(405)
+
+    def do_HEAD(self) -> None:
+        """Handles HEAD requests, which get the same headers as a GET but no body."""
+        url = urlsplit(self.path)
+        if url.path.startswith("/api/"):
+            self.__handle_api(url.path, url.query)
+        else:
+            self.__send_asset(False)
 
     def log_message(self, format: str, *args: Any) -> None:
         #Only log debug messages if this is the main file.
         if __name__ == "__main__":
             super().log_message(format, *args)
 
-    #Below is a very messy "async/awaiter" implementation that I can use to start and stop the webserver.
     @staticmethod
-    def run() -> Callable[[], None]:
-        reset_event = Event()
-        end_event = Event()
-        webserver_thread = Thread(target=Webserver.__start, args=(reset_event,end_event))
+    def run(graph: TubemapGraph | None = None, api_workers: int | None = None, port: int | None = None, route_processes: int | None = None) -> Callable[[], None]:
+        """
+        Starts the webserver on a background thread and returns a function that stops it (an OSError is raised if the port can't be used).
+        If a graph is given, the routing API answers queries against it using a pool of api_workers threads (by default one per CPU).
+        If route_processes is also given, batches of routes are answered by that many processes instead (see publish_graph). The port defaults to PORT.
+        """
+        webserver = ThreadingHTTPServer((Webserver.HOSTNAME, port or Webserver.PORT), Webserver)
+        Webserver.__graph = graph
+        Webserver.__snapshot = None
+        Webserver.__station_index = {node.label.lower(): node for node in graph.nodes.values()} if graph is not None else {}
+        Webserver.__coalescer = _RequestCoalescer(api_workers or os.cpu_count() or 1)
+        Webserver.__shared_graph = None
+        Webserver.__route_pool = None
+        if graph is not None and route_processes is not None:
+            try:
+                Webserver.__shared_graph = TubemapSharedGraph(graph)
+                Webserver.__route_pool = TubemapSharedRoutePool(Webserver.__shared_graph, route_processes)
+            except BaseException:
+                webserver.server_close()
+                if Webserver.__shared_graph is not None:
+                    Webserver.__shared_graph.close()
+                    Webserver.__shared_graph = None
+                raise
+        #Connection threads may be waiting on an idle keep-alive connection, they shouldn't hold up stopping the server or exiting the program.
+        webserver.daemon_threads = True
+        webserver.block_on_close = False
+        #Writing to this socket pair wakes up the server loop straight away when it is time to stop, rather than it polling for a flag.
+        wakeup_reader, wakeup_writer = socket.socketpair()
+        stop_event = Event()
+        webserver_thread = Thread(target=Webserver.__serve, args=(webserver, wakeup_reader, stop_event), daemon=True)
         webserver_thread.start()
-        return lambda: Webserver.__stop(reset_event, end_event)
 
-    @staticmethod
-    def __start(reset_event: Event, end_event: Event) -> Event:
-        # try:
-        webserver = HTTPServer((Webserver.HOSTNAME, Webserver.PORT), Webserver)
-        #We have to assign the event below to a discard variable to keep the instance in scope, otherwise GC will collect it and dispose of it early.
-        end_watchdog = Thread(target=Webserver.__end_watchdog, args=(reset_event,))
-        end_watchdog.start()
-        while not reset_event.is_set():
-            webserver.handle_request()
-        webserver.server_close()
-        # finally:
-        end_event.set()
+        coalescer = Webserver.__coalescer
+        def stop() -> None:
+            stop_event.set()
+            wakeup_writer.send(b"\0")
+            webserver_thread.join()
+            wakeup_writer.close()
+            coalescer.shutdown()
+            with Webserver.__route_pool_lock:
+                if Webserver.__route_pool is not None:
+                    Webserver.__route_pool.close()
+                    Webserver.__route_pool = None
+                if Webserver.__shared_graph is not None:
+                    Webserver.__shared_graph.close()
+                    Webserver.__shared_graph = None
+        return stop
 
     @staticmethod
-    def __end_watchdog(reset_event: Event) -> None:
-        while not reset_event.is_set():
-            sleep(1)
-        #The webserver handle_request will wait for a request, meaning once we want to stop the webserver, we have to send a request to unblock the handle_request.
+    def __serve(webserver: ThreadingHTTPServer, wakeup_reader: socket.socket, stop_event: Event) -> None:
         try:
-            connection = HTTPConnection(Webserver.HOSTNAME, Webserver.PORT)
-            connection.request("GET", "/")
-            connection.getresponse()
-        except ConnectionRefusedError:
-            pass
-
-    @staticmethod
-    def __stop(reset_event: Event, end_event: Event) -> None:
-        reset_event.set()
-        while not end_event.is_set():
-            sleep(1)
+            with selectors.DefaultSelector() as selector:
+                selector.register(webserver, selectors.EVENT_READ)
+                selector.register(wakeup_reader, selectors.EVENT_READ)
+                while not stop_event.is_set():
+                    for key, _ in selector.select():
+                        #The listening socket is ready, so this accepts the connection without blocking and hands it to a new thread.
+                        if key.fileobj is webserver and not stop_event.is_set():
+                            webserver.handle_request()
+        finally:
+            webserver.server_close()
+            wakeup_reader.close()
 
 if __name__ == "__main__":
     os.chdir(os.path.join(os.getcwd(), "src"))